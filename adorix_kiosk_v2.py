@@ -8,14 +8,17 @@ import os
 import time
 import json
 import cv2
+import queue
 import threading
 import asyncio
 import numpy as np
 from typing import Set
+from collections import OrderedDict, deque
 
 # --- Services ---
 from services.vision.detector import AgeGenderDetector
 from services.ad_engine.selector import AdSelector
+from services.ad_engine.transcoder import AdTranscoder
 from services.avatar_interaction.wakeword import WakeWordService
 from services.avatar_interaction.stt import listen_one_phrase
 from services.avatar_interaction.tts import speak
@@ -149,70 +152,457 @@ def start_websocket_thread():
     time.sleep(1)
 
 # ============ VIDEO PLAYER ============
+PLAYER_QUEUE_SIZE = 8          # Decoded frames buffered ahead of presentation
+PLAYER_FALLBACK_FPS = 30.0     # Used when the container does not report an fps
+PLAYER_RESYNC_SECONDS = 0.5    # Re-anchor the clock instead of fast-forwarding after a stall
+PLAYER_CACHE_BUDGET_MB = 512   # Decoded-clip cache size; 0 disables the cache
+PLAYER_MAX_WIDTH = 0           # Downscale frames wider than this (0 keeps the source size)
+
+class DecodedClipCache:
+    """
+    LRU of fully decoded clips, bounded by a byte budget.
+    A clip enters the cache after one complete pass; later loops and replays
+    of the same ad are served from memory without touching the decoder.
+    """
+    def __init__(self, budget_bytes):
+        self.budget = budget_bytes
+        self.clips = OrderedDict()   # key -> (fps, [(pts, frame), ...], nbytes)
+        self.bytes_used = 0
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key_for(path):
+        st = os.stat(path)
+        return (path, st.st_size, st.st_mtime)
+
+    def get(self, key):
+        with self.lock:
+            clip = self.clips.get(key)
+            if clip is None:
+                self.misses += 1
+                return None
+            self.clips.move_to_end(key)
+            self.hits += 1
+            return clip
+
+    def put(self, key, fps, frames):
+        nbytes = sum(frame.nbytes for _, frame in frames)
+        if nbytes > self.budget: return False
+        with self.lock:
+            if key in self.clips:
+                self.bytes_used -= self.clips.pop(key)[2]
+            while self.clips and self.bytes_used + nbytes > self.budget:
+                _, (_, _, evicted) = self.clips.popitem(last=False)
+                self.bytes_used -= evicted
+                self.evictions += 1
+            self.clips[key] = (fps, frames, nbytes)
+            self.bytes_used += nbytes
+        return True
+
+    def stats(self):
+        with self.lock:
+            return {
+                "clips": len(self.clips),
+                "mb_used": self.bytes_used / 1e6,
+                "mb_budget": self.budget / 1e6,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+clip_cache = DecodedClipCache(PLAYER_CACHE_BUDGET_MB * 1024 * 1024) if PLAYER_CACHE_BUDGET_MB > 0 else None
+
+class FrameDecoder:
+    """
+    Decodes a single ad on its own thread into a bounded queue of (pts, frame).
+    Timestamps keep increasing across loops so the player clock never rewinds.
+    With a clip cache, the first full pass is recorded and every later loop
+    replays the recorded frames instead of seeking and decoding again.
+    """
+    def __init__(self, path, queue_size=PLAYER_QUEUE_SIZE, cache=None, max_width=PLAYER_MAX_WIDTH):
+        self.path = path
+        self.cache = cache
+        self.max_width = max_width
+        self.cache_key = DecodedClipCache.key_for(path) if cache else None
+        self.frames = queue.Queue(maxsize=queue_size)
+        self.running = False
+        self.thread = None
+
+        cached = cache.get(self.cache_key) if cache else None
+        if cached:
+            self.cap = None
+            self.fps, self.recorded, _ = cached
+        else:
+            self.cap = cv2.VideoCapture(path)
+            fps = self.cap.get(cv2.CAP_PROP_FPS)
+            self.fps = fps if fps and fps > 1 else PLAYER_FALLBACK_FPS
+            self.recorded = None
+        self.from_cache = cached is not None
+
+        # Counters (written by the decode thread only)
+        self.decoded_frames = 0
+        self.replayed_frames = 0
+        self.loops = 0
+        self.decode_time_total = 0.0
+        self.decode_time_max = 0.0
+
+    def is_opened(self):
+        return self.recorded is not None or (self.cap is not None and self.cap.isOpened())
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._loop, daemon=True)
+        self.thread.start()
+        return self
+
+    def _emit(self, pts, frame):
+        # Block while the queue is full, but wake up regularly to honour stop()
+        while self.running:
+            try:
+                self.frames.put((pts, frame), timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _scale(self, frame):
+        h, w = frame.shape[:2]
+        if not self.max_width or w <= self.max_width: return frame
+        return cv2.resize(frame, (self.max_width, int(h * self.max_width / w)), interpolation=cv2.INTER_AREA)
+
+    def _loop(self):
+        if self.recorded is not None:
+            self._replay(0.0)
+            return
+
+        loop_offset = 0.0   # Seconds added to container PTS for the current pass
+        last_pts = 0.0
+        pass_frames = 0
+        recording = [] if self.cache else None
+        recording_bytes = 0
+
+        while self.running:
+            t0 = time.perf_counter()
+            ret, frame = self.cap.read()
+            if ret: frame = self._scale(frame)
+            elapsed = time.perf_counter() - t0
+
+            if not ret:
+                if pass_frames == 0:
+                    print(f"⚠️  Decoder: no frames in {os.path.basename(self.path)}")
+                    break
+                loop_offset = last_pts + 1.0 / self.fps
+                self.loops += 1
+                # First pass complete -> keep it in memory and stop decoding
+                if recording is not None and self.cache.put(self.cache_key, self.fps, recording):
+                    self.recorded = recording
+                    self.cap.release()
+                    self._replay(loop_offset)
+                    return
+                recording = None
+                # EOF -> rewind and continue the timeline one frame after the last one
+                self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                pass_frames = 0
+                continue
+
+            # Prefer the container timestamp; fall back to frame index / fps
+            pos_ms = self.cap.get(cv2.CAP_PROP_POS_MSEC)
+            local_pts = pos_ms / 1000.0 if pos_ms > 0 else pass_frames / self.fps
+            pts = loop_offset + local_pts
+            if pts <= last_pts and self.decoded_frames:
+                pts = last_pts + 1.0 / self.fps
+                local_pts = pts - loop_offset
+            last_pts = pts
+            pass_frames += 1
+
+            self.decoded_frames += 1
+            self.decode_time_total += elapsed
+            self.decode_time_max = max(self.decode_time_max, elapsed)
+
+            if recording is not None:
+                recording_bytes += frame.nbytes
+                if recording_bytes > self.cache.budget: recording = None   # Clip too big to cache
+                else: recording.append((local_pts, frame))
+
+            if not self._emit(pts, frame): break
+
+    def _replay(self, loop_offset):
+        """Loops the recorded clip from memory, continuing the timeline at loop_offset."""
+        frames = self.recorded
+        clip_length = frames[-1][0] + 1.0 / self.fps
+        while self.running:
+            for local_pts, frame in frames:
+                if not self._emit(loop_offset + local_pts, frame): return
+                self.replayed_frames += 1
+            loop_offset += clip_length
+            self.loops += 1
+
+    def stop(self):
+        self.running = False
+        if self.thread and self.thread is not threading.current_thread():
+            self.thread.join(timeout=1.0)
+        if self.cap:
+            self.cap.release()
+
 class VideoPlayer:
-    def __init__(self, window_name):
+    """
+    Presents ad frames on a wall clock paced by the video's own timestamps.
+    Decoding happens in a FrameDecoder thread, so update() never touches the capture.
+
+    A second "standby" slot holds a pre-opened, pre-rolled decoder for the ad we
+    expect to play next; play() on that ad is then just a swap of the two slots.
+    """
+    def __init__(self, window_name, resolve_path=None):
         self.window_name = window_name
-        self.cap = None
+        self.resolve_path = resolve_path or (lambda filename: os.path.join(ADS_DIR, filename))
+        self.decoder = None
         self.current_file = None
         self.lock = threading.Lock()
-    
+
+        # Standby slot (filled speculatively by prefetch())
+        self.standby = None
+        self.standby_file = None
+        self.standby_loading = None
+
+        # Presentation state
+        self.clock_origin = None   # perf_counter() value that corresponds to pts 0
+        self.pending = None        # Next (pts, frame) that is not yet due
+        self.current_frame = None
+        self.switch_started = None # perf_counter() of the last play() awaiting its first frame
+
+        # Counters
+        self.presented_frames = 0
+        self.dropped_frames = 0
+        self.stalls = 0
+        self.prefetch_hits = 0
+        self.prefetch_misses = 0
+        self.switch_latencies = deque(maxlen=50)
+        self.last_switch_ms = 0.0
+
+    def _open_decoder(self, filename):
+        path = self.resolve_path(filename)
+        if not os.path.exists(path):
+            print(f"⚠️  Video not found: {filename}")
+            return None
+        return FrameDecoder(path, cache=clip_cache).start()
+
+    def prefetch(self, filename):
+        """Opens and pre-rolls `filename` in the standby slot without blocking the caller."""
+        with self.lock:
+            if not filename or filename in (self.current_file, self.standby_file, self.standby_loading): return
+            if self.standby_loading: return   # One speculative open at a time
+            self.standby_loading = filename
+        threading.Thread(target=self._fill_standby, args=(filename,), daemon=True).start()
+
+    def _fill_standby(self, filename):
+        decoder = self._open_decoder(filename)
+        stale = None
+        with self.lock:
+            self.standby_loading = None
+            if decoder is None: return
+            if filename == self.current_file:
+                stale = decoder   # play() got there first
+            else:
+                stale = self.standby
+                self.standby, self.standby_file = decoder, filename
+        if stale: stale.stop()
+
     def play(self, filename):
         with self.lock:
-            if self.current_file == filename and self.cap and self.cap.isOpened(): return
-            if self.cap: self.cap.release()
-            
-            path = os.path.join(ADS_DIR, filename)
-            if os.path.exists(path):
-                self.cap = cv2.VideoCapture(path)
-                self.current_file = filename
-                print(f"▶️  Playing: {filename}")
-                # Load context
-                data_path = os.path.join(DATA_DIR, filename.replace(".mp4", ".json"))
-                if os.path.exists(data_path):
-                    with open(data_path, "r") as f:
-                        kiosk.product_data = json.load(f)
-                else: kiosk.product_data = {}
-            else: print(f"⚠️  Video not found: {filename}")
+            if self.current_file == filename and self.decoder and self.decoder.is_opened(): return
+            self.switch_started = time.perf_counter()
+
+            if self.standby_file == filename and self.standby and self.standby.is_opened():
+                # Atomic swap: the standby decoder already has its first frames queued
+                decoder = self.standby
+                self.standby, self.standby_file = None, None
+                self.prefetch_hits += 1
+                self._switch_to(decoder, filename, "prefetched")
+                return
+
+        # Cold miss: open outside the lock so update() keeps rendering the old ad meanwhile
+        decoder = self._open_decoder(filename)
+        if decoder is None:
+            with self.lock: self.switch_started = None
+            return
+        with self.lock:
+            if self.current_file == filename and self.decoder and self.decoder.is_opened():
+                stale = decoder   # A concurrent play() of the same ad got there first
+            else:
+                stale = None
+                self.prefetch_misses += 1
+                self._switch_to(decoder, filename, "cache" if decoder.from_cache else "decode")
+        if stale: threading.Thread(target=stale.stop, daemon=True).start()
+
+    def _switch_to(self, decoder, filename, source):
+        """Makes `decoder` current. Caller holds self.lock."""
+        retired = self.decoder
+        self.decoder = decoder
+        self.current_file = filename
+        self.clock_origin = None
+        self.pending = None
+        print(f"▶️  Playing: {filename} ({decoder.fps:.1f} fps, {source})")
+        self._load_product_data(filename)
+        # Joining the old decoder thread can take a moment; keep it off the render path
+        if retired: threading.Thread(target=retired.stop, daemon=True).start()
+
+    def _load_product_data(self, filename):
+        data_path = os.path.join(DATA_DIR, filename.replace(".mp4", ".json"))
+        if os.path.exists(data_path):
+            with open(data_path, "r") as f:
+                kiosk.product_data = json.load(f)
+        else: kiosk.product_data = {}
 
     def update(self):
+        """Returns the frame due at the current presentation time (never blocks on decode)."""
+        with self.lock:
+            if not self.decoder: return None
+            now = time.perf_counter()
+            due_frame = None
+
+            while True:
+                if self.pending is None:
+                    try:
+                        self.pending = self.decoder.frames.get_nowait()
+                    except queue.Empty:
+                        break
+
+                pts, frame = self.pending
+                if self.clock_origin is None:
+                    self.clock_origin = now - pts
+                elif (now - self.clock_origin) - pts > PLAYER_RESYNC_SECONDS:
+                    # Decoder fell far behind: re-anchor instead of dropping a burst
+                    self.clock_origin = now - pts
+                    self.stalls += 1
+
+                if pts > now - self.clock_origin: break
+                if due_frame is not None: self.dropped_frames += 1
+                due_frame = frame
+                self.pending = None
+
+            if due_frame is not None:
+                self.current_frame = due_frame
+                self.presented_frames += 1
+                if self.switch_started is not None:
+                    self.last_switch_ms = (now - self.switch_started) * 1000.0
+                    self.switch_latencies.append(self.last_switch_ms)
+                    self.switch_started = None
+            # Until the new ad's first frame arrives we keep showing the old one
+            return self.current_frame
+
+    def stats(self):
         with self.lock:
-            if self.cap and self.cap.isOpened():
-                ret, frame = self.cap.read()
-                if ret: return frame
-                else: self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
-        return None
+            dec = self.decoder
+            decoded = dec.decoded_frames if dec else 0
+            switches = list(self.switch_latencies)
+            return {
+                "file": self.current_file,
+                "standby": self.standby_file,
+                "fps": dec.fps if dec else 0.0,
+                "decoded_frames": decoded,
+                "replayed_frames": dec.replayed_frames if dec else 0,
+                "presented_frames": self.presented_frames,
+                "dropped_frames": self.dropped_frames,
+                "stalls": self.stalls,
+                "queue_depth": dec.frames.qsize() if dec else 0,
+                "decode_ms_avg": (dec.decode_time_total / decoded * 1000.0) if decoded else 0.0,
+                "decode_ms_max": dec.decode_time_max * 1000.0 if dec else 0.0,
+                "prefetch_hits": self.prefetch_hits,
+                "prefetch_misses": self.prefetch_misses,
+                "switch_ms_last": self.last_switch_ms,
+                "switch_ms_avg": sum(switches) / len(switches) if switches else 0.0,
+                "switch_ms_max": max(switches) if switches else 0.0,
+                "cache": clip_cache.stats() if clip_cache else None,
+            }
 
     def stop(self):
         with self.lock:
-            if self.cap: self.cap.release()
+            for decoder in (self.decoder, self.standby):
+                if decoder: decoder.stop()
+            self.decoder, self.standby = None, None
+            self.current_file, self.standby_file = None, None
+            self.clock_origin = None
+            self.pending = None
+            self.current_frame = None
 
-# ============ MAIN LOOP ============
-def main_loop():
-    print("📹 Initializing Vision system...")
-    detector = AgeGenderDetector().start()
-    selector = AdSelector(RULES_PATH, ADS_DIR)
-    
-    global wake_word_service
-    wake_word_service = WakeWordService(callback_function=on_wake_word)
-    threading.Thread(target=wake_word_service.start, daemon=True).start()
+# ============ PIPELINE ============
+DISPLAY_FPS = 60               # Render pacing; match the kiosk monitor's refresh rate
+STATS_EVERY_SECONDS = 30       # How often per-stage timings are printed
 
-    WIN_NAME = "ADORIX KIOSK"
-    cv2.namedWindow(WIN_NAME, cv2.WINDOW_NORMAL)
-    player = VideoPlayer(WIN_NAME)
-    
-    last_user_ts = 0
-    kiosk.mode = "LOOP"
+class LatestValue:
+    """Single-slot handoff between stages: writers overwrite, readers never wait."""
+    def __init__(self, value=None):
+        self.lock = threading.Lock()
+        self.value = value
+        self.version = 0
 
-    print("✅ System Ready (3-Stage Workflow)")
+    def set(self, value):
+        with self.lock:
+            self.value = value
+            self.version += 1
 
-    try:
-        while True:
+    def get(self):
+        with self.lock:
+            return self.value, self.version
+
+class StageTimer:
+    """Rolling timing window for one pipeline stage."""
+    def __init__(self, window=240):
+        self.lock = threading.Lock()
+        self.samples = deque(maxlen=window)
+        self.ticks = deque(maxlen=window)
+
+    def record(self, seconds):
+        with self.lock:
+            self.samples.append(seconds * 1000.0)
+            self.ticks.append(time.perf_counter())
+
+    def snapshot(self):
+        with self.lock:
+            samples = sorted(self.samples)
+            ticks = list(self.ticks)
+        if not samples: return {"avg_ms": 0.0, "p95_ms": 0.0, "max_ms": 0.0, "hz": 0.0}
+        span = ticks[-1] - ticks[0]
+        return {
+            "avg_ms": sum(samples) / len(samples),
+            "p95_ms": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+            "max_ms": samples[-1],
+            "hz": (len(ticks) - 1) / span if span > 0 else 0.0,
+        }
+
+stage_timers = {name: StageTimer() for name in ("infer", "logic", "render", "present")}
+
+def pipeline_stats():
+    return {name: timer.snapshot() for name, timer in stage_timers.items()}
+
+# ============ MAIN LOOP ============
+def vision_stage(detector, selector, player, vision_out, running):
+    """
+    Infer + state machine, on its own thread.
+    Publishes (camera frame, committed users) for the render stage; a slow
+    inference only delays this stage, never the frames the display presents.
+    """
+    last_user_ts = 0
+    while running.is_set():
+        t0 = time.perf_counter()
+        try:
             frame = detector.update()
-            if frame is None: time.sleep(0.01); continue
+        except Exception as e:
+            print(f"!!! [Vision] Update error: {e}")
+            frame = None
+        if frame is None: time.sleep(0.005); continue
+        t1 = time.perf_counter()
+        stage_timers["infer"].record(t1 - t0)
 
+        # Anything below (selector, player, broadcast) may fail; the vision thread must not die with it
+        try:
             now_ts = time.time()
             users = detector.get_committed_people(now_ts)
-            
+        
             # --- State Machine ---
             if kiosk.mode == "LOOP":
                 if users:
@@ -228,7 +618,7 @@ def main_loop():
                     if not kiosk.current_ad:
                         kiosk.current_ad = selector.choose_ad_filename({"status": "IDLE"})
                         player.play(kiosk.current_ad)
-            
+        
             elif kiosk.mode == "PERSONALIZED":
                 if not users:
                     if now_ts - last_user_ts > 5.0:
@@ -240,23 +630,90 @@ def main_loop():
                 else:
                     last_user_ts = now_ts
 
-            # --- Render ---
+            # --- Speculative prefetch: warm the standby slot with the likely next ad ---
+            if kiosk.mode == "LOOP":
+                leader = detector.get_leading_person()
+                if leader: player.prefetch(selector.ad_for_person(leader))
+            elif kiosk.mode == "PERSONALIZED":
+                player.prefetch(selector.peek_next_idle())
+
+            vision_out.set((frame, users))
+            stage_timers["logic"].record(time.perf_counter() - t1)
+        except Exception as e:
+            print(f"!!! [Vision] Stage error: {e}")
+            time.sleep(0.05)
+
+def main_loop():
+    print("📹 Initializing Vision system...")
+    detector = AgeGenderDetector().start()
+    # All HighGUI calls stay on the render thread; the detector runs elsewhere now
+    detector.DRAW_DEBUG_WINDOW = False
+    selector = AdSelector(RULES_PATH, ADS_DIR, transcoder=AdTranscoder())
+    
+    global wake_word_service
+    wake_word_service = WakeWordService(callback_function=on_wake_word)
+    threading.Thread(target=wake_word_service.start, daemon=True).start()
+
+    WIN_NAME = "ADORIX KIOSK"
+    cv2.namedWindow(WIN_NAME, cv2.WINDOW_NORMAL)
+    player = VideoPlayer(WIN_NAME, resolve_path=selector.ad_path)
+    
+    kiosk.mode = "LOOP"
+    vision_out = LatestValue((None, []))
+    running = threading.Event()
+    running.set()
+    threading.Thread(target=vision_stage, args=(detector, selector, player, vision_out, running), daemon=True).start()
+
+    print("✅ System Ready (3-Stage Workflow)")
+
+    # --- Render stage (main thread), paced to the display refresh ---
+    period = 1.0 / DISPLAY_FPS
+    next_tick = time.perf_counter()
+    last_present = None
+    last_stats = time.time()
+
+    try:
+        while True:
+            t0 = time.perf_counter()
+            frame, users = vision_out.get()[0]
+
             display_frame = None
             if kiosk.mode == "INTERACTION":
-                display_frame = frame.copy()
-                cv2.putText(display_frame, "INTERACTION MODE", (50, 50), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
+                if frame is not None:
+                    display_frame = frame.copy()
+                    cv2.putText(display_frame, "INTERACTION MODE", (50, 50), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
             else:
                 video_frame = player.update()
                 display_frame = video_frame if video_frame is not None else frame
-                if users:
+                if display_frame is not None and users:
+                    # The player keeps re-presenting its current frame, so draw on a copy
+                    display_frame = display_frame.copy()
                     cv2.putText(display_frame, f"Detected: {len(users)}", (30, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 255), 2)
 
-            cv2.imshow(WIN_NAME, display_frame)
+            if display_frame is not None:
+                cv2.imshow(WIN_NAME, display_frame)
             if cv2.waitKey(1) & 0xFF == ord('q'): break
-            time.sleep(0.01)
+
+            now = time.perf_counter()
+            stage_timers["render"].record(now - t0)
+            if last_present is not None: stage_timers["present"].record(now - last_present)
+            last_present = now
+
+            if time.time() - last_stats > STATS_EVERY_SECONDS:
+                last_stats = time.time()
+                print(f"📊 Pipeline: " + ", ".join(f"{k}={v['avg_ms']:.1f}ms@{v['hz']:.0f}Hz" for k, v in pipeline_stats().items()))
+
+            # Sleep to the next display tick; if we fell behind, don't try to catch up
+            next_tick += period
+            delay = next_tick - time.perf_counter()
+            if delay > 0: time.sleep(delay)
+            else: next_tick = time.perf_counter()
 
     except KeyboardInterrupt: pass
     finally:
+        running.clear()
+        print(f"📊 Pipeline stats: {pipeline_stats()}")
+        print(f"📊 Player stats: {player.stats()}")
         detector.stop()
         player.stop()
         if wake_word_service: wake_word_service.stop()
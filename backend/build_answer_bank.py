@@ -0,0 +1,108 @@
+"""
+Answer Bank Builder
+Precomputes answers to the predictable questions about every product in
+modules/ad_engine/data (price, colors, features, each FAQ, ...) and writes
+them to the answer bank the QA router matches at runtime (settings.yaml answer_bank:).
+
+Every field gets a set of paraphrased questions (modules/qa/answer_bank.py).
+The LLM answers each field's canonical question, one batch per product, and
+every paraphrase maps to that answer. Only products whose JSON changed since
+the last build are regenerated; products that were removed are dropped.
+
+With --no-llm (or when the model cannot be loaded) the fast-path index
+answers are banked instead, so the paraphrases still get matched. The kiosk
+does the same for products changed by a content sync (QARouter.refresh_bank);
+a build with the LLM upgrades every index-banked product.
+
+Usage: python build_answer_bank.py [--force] [--no-llm] [--batch-size N]
+"""
+
+import os
+import sys
+import time
+import argparse
+
+backend_dir = os.path.dirname(os.path.abspath(__file__))
+if backend_dir not in sys.path:
+    sys.path.append(backend_dir)
+
+from product_qa_engine import ProductQAEngine
+from modules.qa import AnswerBank, product_questions, index_entries
+from modules.settings import load_settings
+
+DEFAULT_BANK_SETTINGS = {"enabled": True, "path": ".answer_bank/bank.json"}
+
+
+def bank_path():
+    path = load_settings("answer_bank", DEFAULT_BANK_SETTINGS)["path"]
+    return path if os.path.isabs(path) else os.path.join(backend_dir, path)
+
+
+def load_brain():
+    try:
+        from modules.llm import BrainEngine
+        return BrainEngine()
+    except Exception as e:
+        print(f"!!! [AnswerBank] LLM unavailable ({e}). Banking index answers instead.")
+        return None
+
+
+def build_product(engine, brain, product, batch_size):
+    """Bank entries for one product: [{field, answer, questions}]."""
+    if brain is None:
+        return index_entries(engine, product)
+    groups = product_questions(engine.product_data[product])
+    canonical = [questions[0] for _, questions in groups]
+    context = brain.load_context_from_json(product)
+    answers = brain.generate_batch(canonical, context, batch_size=batch_size)
+
+    entries = []
+    for (field, questions), answer in zip(groups, answers):
+        if answer:
+            entries.append({"field": field, "answer": answer, "questions": questions})
+    return entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the offline answer bank")
+    parser.add_argument("--force", action="store_true", help="Rebuild every product, changed or not")
+    parser.add_argument("--no-llm", action="store_true", help="Bank index answers instead of LLM answers")
+    parser.add_argument("--batch-size", type=int, default=8, help="Prompts per LLM forward pass")
+    args = parser.parse_args()
+
+    engine = ProductQAEngine()
+    bank = AnswerBank(bank_path())
+    versions = {product: engine.product_version(product) for product in engine.product_data}
+
+    for product in set(bank.products) - set(versions):
+        print(f">>> [AnswerBank] Dropping removed product {product}")
+        bank.remove(product)
+
+    if args.force:
+        todo = sorted(versions)
+    else:
+        todo = set(bank.outdated(versions))
+        if not args.no_llm:
+            todo.update(p for p in versions if bank.generator(p) == "index")
+        todo = sorted(todo)
+    print(f">>> [AnswerBank] {len(todo)} of {len(versions)} products to build")
+    if not todo:
+        bank.save()
+        return
+
+    brain = None if args.no_llm else load_brain()
+    generator = "llm" if brain is not None else "index"
+    total = time.perf_counter()
+    for product in todo:
+        start = time.perf_counter()
+        entries = build_product(engine, brain, product, args.batch_size)
+        bank.update(product, versions[product], entries, generator)
+        bank.save()  # After every product, so an interrupted build keeps its progress
+        print(f"✓ {product}: {len(entries)} answers, {sum(len(e['questions']) for e in entries)} questions "
+              f"in {time.perf_counter() - start:.1f}s")
+
+    print(f"\n>>> [AnswerBank] Built {len(todo)} products in {time.perf_counter() - total:.1f}s -> {bank.path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,365 @@
+"""
+Content Sync Client
+Pulls ads and product data from a local content server:
+- Fetches a signed manifest (HMAC-SHA256) listing every file with its hash
+- Downloads only blobs whose hash changed, resuming interrupted transfers
+- Stages and verifies everything before swapping files into place
+- Notifies running consumers (AdSelector, ProductQAEngine, ...) to hot-reload
+
+Server layout (see `serve()` below for a stand-in):
+  GET {url}/manifest.json   -> {"manifest": {...}, "signature": "<hex>"}
+  GET {url}/blobs/<sha256>  -> file bytes (Range supported)
+"""
+
+import os
+import sys
+import json
+import time
+import hmac
+import shutil
+import hashlib
+import threading
+import urllib.request
+import urllib.error
+
+HASH_CHUNK = 1024 * 1024
+
+
+class ContentSyncError(Exception):
+    pass
+
+
+def sha256_file(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def canonical_json(obj):
+    return json.dumps(obj, sort_keys=True, separators=(",", ":")).encode("utf-8")
+
+
+def sign_manifest(manifest, key):
+    return hmac.new(key.encode("utf-8"), canonical_json(manifest), hashlib.sha256).hexdigest()
+
+
+def build_manifest(roots, version=None):
+    """
+    Builds a manifest for {"ads": "/path/to/ads", "data": "/path/to/data", ...}.
+    Paths in the manifest are "<root>/<relative path>" with forward slashes.
+    """
+    files = []
+    for root_name, root_dir in sorted(roots.items()):
+        for dirpath, dirnames, filenames in os.walk(root_dir):
+            dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+            for filename in sorted(filenames):
+                if filename.startswith("."):
+                    continue
+                full = os.path.join(dirpath, filename)
+                rel = os.path.relpath(full, root_dir).replace(os.sep, "/")
+                files.append({
+                    "path": f"{root_name}/{rel}",
+                    "sha256": sha256_file(full),
+                    "size": os.path.getsize(full),
+                })
+    return {"version": version if version is not None else int(time.time()), "files": files}
+
+
+class ContentSyncClient:
+    """
+    Delta sync of local content directories against a content server.
+
+    `targets` maps manifest roots to local directories, e.g.
+    {"ads": backend/ads, "data": backend/modules/ad_engine/data}. Consumers
+    register a callback with `on_update()`; it runs after every sync that
+    changed files, with the list of changed manifest paths.
+    """
+
+    def __init__(self, base_url, key, targets, staging_dir, interval=300, timeout=15, prune=False):
+        self.base_url = base_url.rstrip("/")
+        self.key = key
+        self.targets = dict(targets)
+        self.staging_dir = staging_dir
+        self.interval = interval
+        self.timeout = timeout
+        self.prune = prune
+
+        self.callbacks = []
+        self.running = False
+        self.thread = None
+        self.lock = threading.Lock()   # One sync at a time
+        self._hash_cache = {}          # local path -> ((size, mtime), sha256)
+
+        self.last_version = None
+        self.stats = {"syncs": 0, "files_updated": 0, "bytes_downloaded": 0, "bytes_resumed": 0, "errors": 0}
+
+    def on_update(self, callback):
+        self.callbacks.append(callback)
+
+    # ---------- manifest ----------
+    def fetch_manifest(self):
+        with urllib.request.urlopen(f"{self.base_url}/manifest.json", timeout=self.timeout) as resp:
+            envelope = json.loads(resp.read().decode("utf-8"))
+
+        if not self.key:
+            raise ContentSyncError("No sync key configured; refusing unsigned manifests")
+        manifest = envelope.get("manifest")
+        signature = envelope.get("signature", "")
+        if not isinstance(manifest, dict) or not hmac.compare_digest(sign_manifest(manifest, self.key), signature):
+            raise ContentSyncError("Manifest signature mismatch")
+        return manifest
+
+    def local_path(self, manifest_path):
+        """Maps "ads/foo.mp4" to the local target; refuses anything escaping the target dir."""
+        root_name, _, rel = manifest_path.partition("/")
+        root_dir = self.targets.get(root_name)
+        if root_dir is None or not rel:
+            return None
+        root_dir = os.path.abspath(root_dir)
+        full = os.path.abspath(os.path.join(root_dir, *rel.split("/")))
+        if os.path.commonpath([root_dir, full]) != root_dir:
+            raise ContentSyncError(f"Unsafe path in manifest: {manifest_path}")
+        return full
+
+    def _local_hash(self, path):
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        stamp = (st.st_size, st.st_mtime)
+        cached = self._hash_cache.get(path)
+        if cached and cached[0] == stamp:
+            return cached[1]
+        digest = sha256_file(path)
+        self._hash_cache[path] = (stamp, digest)
+        return digest
+
+    def plan(self, manifest):
+        """Entries whose local copy is missing or differs from the manifest."""
+        changed = []
+        for entry in manifest.get("files", []):
+            target = self.local_path(entry["path"])
+            if target is None:
+                continue
+            if self._local_hash(target) != entry["sha256"]:
+                changed.append((entry, target))
+        return changed
+
+    def stale_files(self, manifest):
+        """Local files under the sync targets that the manifest no longer lists."""
+        listed = {self.local_path(e["path"]) for e in manifest.get("files", [])}
+        stale = []
+        for root_dir in self.targets.values():
+            if not os.path.isdir(root_dir):
+                continue
+            for dirpath, dirnames, filenames in os.walk(root_dir):
+                dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+                for filename in filenames:
+                    full = os.path.abspath(os.path.join(dirpath, filename))
+                    if not filename.startswith(".") and full not in listed:
+                        stale.append(full)
+        return stale
+
+    # ---------- transfer ----------
+    def download(self, entry):
+        """
+        Downloads one blob into the staging dir and verifies it.
+        A leftover .part file from an interrupted run is resumed with a Range request.
+        """
+        digest = entry["sha256"]
+        os.makedirs(self.staging_dir, exist_ok=True)
+        final = os.path.join(self.staging_dir, digest)
+        if os.path.exists(final) and sha256_file(final) == digest:
+            return final
+
+        partial = final + ".part"
+        offset = os.path.getsize(partial) if os.path.exists(partial) else 0
+        if offset > entry.get("size", offset):
+            os.remove(partial)
+            offset = 0
+
+        if offset < entry.get("size", offset + 1):
+            self._fetch(digest, partial, offset)
+        # else: the .part file already holds every byte (interrupted before the rename); just verify it
+
+        if sha256_file(partial) != digest:
+            os.remove(partial)
+            raise ContentSyncError(f"Hash mismatch for {entry['path']}")
+        os.replace(partial, final)
+        return final
+
+    def _fetch(self, digest, partial, offset):
+        request = urllib.request.Request(f"{self.base_url}/blobs/{digest}")
+        if offset:
+            request.add_header("Range", f"bytes={offset}-")
+        try:
+            resp = urllib.request.urlopen(request, timeout=self.timeout)
+        except urllib.error.HTTPError as e:
+            if e.code == 416 and offset:
+                return   # Nothing left past `offset`: the .part file is complete, verification decides
+            raise
+
+        with resp:
+            resumed = offset and resp.status == 206
+            mode = "ab" if resumed else "wb"
+            if resumed:
+                self.stats["bytes_resumed"] += offset
+            with open(partial, mode) as f:
+                while True:
+                    chunk = resp.read(HASH_CHUNK)
+                    if not chunk:
+                        break
+                    f.write(chunk)
+                    self.stats["bytes_downloaded"] += len(chunk)
+
+    def _swap_in(self, staged, target):
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp = target + ".sync-tmp"
+        shutil.copyfile(staged, tmp)
+        # Windows refuses to replace a file another process has open (e.g. a playing ad)
+        for attempt in range(5):
+            try:
+                os.replace(tmp, target)
+                return True
+            except PermissionError:
+                time.sleep(0.2 * (attempt + 1))
+        os.remove(tmp)
+        return False
+
+    # ---------- sync ----------
+    def sync_once(self):
+        """Runs one full sync. Returns a summary dict; raises nothing on network errors."""
+        with self.lock:
+            summary = {"version": None, "changed": [], "deferred": [], "removed": [], "error": None}
+            try:
+                manifest = self.fetch_manifest()
+                summary["version"] = manifest.get("version")
+                changed = self.plan(manifest)
+
+                # 1. Stage everything first; nothing on disk changes until all blobs verify
+                staged = [(entry, target, self.download(entry)) for entry, target in changed]
+
+                # 2. Swap each file in with an atomic rename
+                kept = set()
+                for entry, target, blob in staged:
+                    if self._swap_in(blob, target):
+                        summary["changed"].append(entry["path"])
+                    else:
+                        summary["deferred"].append(entry["path"])
+                        kept.add(blob)   # Reused by the next sync
+                # Identical files share one blob, so it goes only after every swap
+                for blob in {b for _, _, b in staged} - kept:
+                    os.remove(blob)
+
+                if self.prune:
+                    for path in self.stale_files(manifest):
+                        os.remove(path)
+                        summary["removed"].append(path)
+
+                self.last_version = manifest.get("version")
+                self.stats["syncs"] += 1
+                self.stats["files_updated"] += len(summary["changed"])
+            except (urllib.error.URLError, OSError, ValueError, ContentSyncError) as e:
+                self.stats["errors"] += 1
+                summary["error"] = str(e)
+                print(f"!!! [ContentSync] Sync failed: {e}")
+                return summary
+
+        if summary["changed"] or summary["removed"]:
+            print(f">>> [ContentSync] v{summary['version']}: {len(summary['changed'])} updated, "
+                  f"{len(summary['removed'])} removed, {len(summary['deferred'])} deferred")
+            for callback in self.callbacks:
+                try:
+                    callback(summary["changed"] + summary["removed"])
+                except Exception as e:
+                    print(f"!!! [ContentSync] Reload callback failed: {e}")
+        return summary
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._loop, daemon=True)
+        self.thread.start()
+        return self
+
+    def _loop(self):
+        while self.running:
+            self.sync_once()
+            for _ in range(int(self.interval * 10)):
+                if not self.running:
+                    return
+                time.sleep(0.1)
+
+    def stop(self):
+        self.running = False
+
+
+# ---------- Stand-in content server (for local testing) ----------
+def serve(roots, key, host="127.0.0.1", port=8090):
+    """
+    Minimal content server: signs a manifest of `roots` on every request and
+    serves blobs by hash with Range support. Returns the running HTTPServer.
+    """
+    from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            if self.path == "/manifest.json":
+                manifest = build_manifest(roots)
+                body = json.dumps({"manifest": manifest, "signature": sign_manifest(manifest, key)}).encode("utf-8")
+                self._send(200, body, "application/json")
+                return
+
+            if self.path.startswith("/blobs/"):
+                digest = self.path[len("/blobs/"):]
+                for entry in build_manifest(roots)["files"]:
+                    if entry["sha256"] == digest:
+                        root_name, _, rel = entry["path"].partition("/")
+                        with open(os.path.join(roots[root_name], *rel.split("/")), "rb") as f:
+                            data = f.read()
+                        start = 0
+                        range_header = self.headers.get("Range", "")
+                        if range_header.startswith("bytes="):
+                            start = int(range_header[6:].split("-")[0] or 0)
+                        if start >= len(data) > 0:
+                            self._send(416, b"", "text/plain", {"Content-Range": f"bytes */{len(data)}"})
+                        elif start:
+                            self._send(206, data[start:], "application/octet-stream",
+                                       {"Content-Range": f"bytes {start}-{len(data) - 1}/{len(data)}"})
+                        else:
+                            self._send(200, data, "application/octet-stream")
+                        return
+            self._send(404, b"not found", "text/plain")
+
+        def _send(self, status, body, content_type, extra=None):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("Accept-Ranges", "bytes")
+            for k, v in (extra or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f">>> [ContentSync] Stand-in server on http://{host}:{port} serving {list(roots)}")
+    return server
+
+
+if __name__ == "__main__":
+    # python content_sync.py serve <ads_dir> <data_dir> [port]
+    if len(sys.argv) >= 4 and sys.argv[1] == "serve":
+        port = int(sys.argv[4]) if len(sys.argv) > 4 else 8090
+        serve({"ads": sys.argv[2], "data": sys.argv[3]}, os.environ.get("ADORIX_SYNC_KEY", "adorix-dev"), port=port)
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+    else:
+        print("Usage: python content_sync.py serve <ads_dir> <data_dir> [port]")
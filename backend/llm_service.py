@@ -0,0 +1,134 @@
+"""
+Shared LLM Service
+Loads the brain ONCE and answers questions for every kiosk backend on the box.
+Concurrent questions share forward passes (continuous batching, see
+modules/llm/batching.py), so adding a screen costs throughput, not another
+copy of the model.
+
+Kiosks use it by setting brain: service_url in settings.yaml; get_brain() then
+returns a BrainClient (modules/llm/client.py) instead of loading a model.
+
+  POST /v1/answer        {"id", "question", "context"} -> NDJSON lines {"text"} then {"done", "cache"}
+  POST /v1/cancel/{id}   stops a running answer at its next token
+  POST /v1/prefill       {"context"} warms the prompt prefix for a product
+  GET  /v1/stats         brain + batching stats
+
+Usage: python llm_service.py [--host 127.0.0.1] [--port 8100] [--max-batch 8]
+"""
+
+import os
+import sys
+import json
+import asyncio
+import argparse
+import threading
+from contextlib import asynccontextmanager
+
+backend_dir = os.path.dirname(os.path.abspath(__file__))
+if backend_dir not in sys.path:
+    sys.path.append(backend_dir)
+
+from fastapi import FastAPI, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+
+from modules.llm import BrainEngine, CacheRelay, DEFAULT_BRAIN_SETTINGS
+from modules.settings import load_settings
+
+DEFAULT_SERVICE_SETTINGS = {"host": "127.0.0.1", "port": 8100, "max_batch": 8}
+
+brain = None
+cancels = {}   # request id -> Event, for answers in progress
+
+
+def load_brain(max_batch):
+    """The service's BrainEngine, with continuous batching on and a relay instead of an answer cache."""
+    config = load_settings("brain", DEFAULT_BRAIN_SETTINGS)
+    engine = BrainEngine(config)
+    engine.backend.enable_batching(max_batch)
+    engine.cache = CacheRelay()   # Each kiosk caches in its own AnswerCache
+    return engine
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global brain
+    if brain is None:
+        settings = load_settings("llm_service", DEFAULT_SERVICE_SETTINGS)
+        brain = await run_in_threadpool(load_brain, settings["max_batch"])
+    yield
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+@app.post("/v1/answer")
+async def answer(request: Request):
+    body = await request.json()
+    rid, question, context = body.get("id"), body["question"], body["context"]
+    cancel = threading.Event()
+    if rid:
+        cancels[rid] = cancel
+    loop = asyncio.get_running_loop()
+    pieces = asyncio.Queue()
+
+    def produce():
+        # Blocking generator on its own thread; the batcher interleaves it with the other requests
+        try:
+            for piece in brain.stream_answer(question, context, cancel=cancel):
+                loop.call_soon_threadsafe(pieces.put_nowait, {"text": piece})
+            cached = brain.cache.take(context, question)
+            loop.call_soon_threadsafe(pieces.put_nowait, {"done": True, "cancelled": cancel.is_set(), "cache": cached})
+        except Exception as e:
+            print(f"!!! [LLM Service] Answer failed: {e}")
+            loop.call_soon_threadsafe(pieces.put_nowait, {"done": True, "error": str(e)})
+
+    async def lines():
+        threading.Thread(target=produce, daemon=True).start()
+        try:
+            while True:
+                message = await pieces.get()
+                yield json.dumps(message) + "\n"
+                if message.get("done"):
+                    return
+        finally:
+            cancel.set()   # Client went away: stop generating
+            cancels.pop(rid, None)
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@app.post("/v1/cancel/{rid}")
+async def cancel_answer(rid: str):
+    cancel = cancels.get(rid)
+    if cancel is not None:
+        cancel.set()
+    return {"cancelled": cancel is not None}
+
+
+@app.post("/v1/prefill")
+async def prefill(request: Request):
+    body = await request.json()
+    await run_in_threadpool(brain.prepare_prefix, body.get("context"))
+    return {"status": "ok"}
+
+
+@app.get("/v1/stats")
+async def stats():
+    report = await run_in_threadpool(brain.stats)
+    report["in_flight"] = len(cancels)
+    return report
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    settings = load_settings("llm_service", DEFAULT_SERVICE_SETTINGS)
+    parser = argparse.ArgumentParser(description="Shared LLM service for the kiosks on this box")
+    parser.add_argument("--host", default=settings["host"])
+    parser.add_argument("--port", type=int, default=settings["port"])
+    parser.add_argument("--max-batch", type=int, default=settings["max_batch"], help="Requests decoded together")
+    args = parser.parse_args()
+
+    brain = load_brain(args.max_batch)
+    uvicorn.run(app, host=args.host, port=args.port)
@@ -1,5 +1,6 @@
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse
 from fastapi.staticfiles import StaticFiles
 from contextlib import asynccontextmanager
 import json
@@ -8,6 +9,7 @@ import threading
 import time
 import os
 import sys
+from collections import deque
 
 # Add the backend and modules directories to the path
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -19,8 +21,16 @@ if modules_dir not in sys.path:
 
 # Local modules
 from wake_word import WakeWordService
-from interaction.interaction_manager import start_interaction_loop
+from interaction.interaction_manager import start_interaction_loop, prepare_for_ad, engines, speech_metrics
 from vision_service import AdorixVision
+from ad_engine import AdManifest, AdTranscoder
+from settings import load_settings
+from content_sync import ContentSyncClient
+from modules.resources import get_resources
+
+ADS_DIR = os.path.join(current_dir, "ads")
+DATA_DIR = os.path.join(modules_dir, "ad_engine", "data")
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
 
 # --- Global System State ---
 class SystemState:
@@ -34,11 +44,72 @@ class SystemState:
         # Thread locks
         self.lock = threading.Lock()
 
+class PrefetchTracker:
+    """
+    Hit/miss accounting for the PREFETCH hints sent ahead of a personalized ad.
+    A hint is a hit when the ad finally chosen for the session was hinted; the
+    latency it saved is the lead time, capped by how long the frontend actually
+    needed to buffer the clip (reported back via PREFETCH_READY).
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.hinted = {}               # ad_url -> time the hint was sent (current session)
+        self.buffer_ms = {}            # ad_url -> frontend buffering time for the hint
+        self.hints_sent = 0
+        self.hits = 0
+        self.misses = 0
+        self.wasted = 0                # Hints whose ad was never played
+        self.saved_ms = deque(maxlen=100)
+
+    def hint_sent(self, ad_url):
+        with self.lock:
+            self.hinted[ad_url] = time.time()
+            self.hints_sent += 1
+
+    def mark_ready(self, ad_url, buffer_ms):
+        with self.lock:
+            if ad_url in self.hinted:
+                self.buffer_ms[ad_url] = float(buffer_ms)
+
+    def resolve(self, ad_url):
+        """Called on Loop -> Personalized with the ad that is actually going to play."""
+        with self.lock:
+            sent_at = self.hinted.pop(ad_url, None)
+            if sent_at is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                lead_ms = (time.time() - sent_at) * 1000.0
+                # Still buffering at switch time -> the whole lead time was useful
+                self.saved_ms.append(min(lead_ms, self.buffer_ms.get(ad_url, lead_ms)))
+            self.wasted += len(self.hinted)
+            self.hinted.clear()
+            self.buffer_ms.clear()
+
+    def snapshot(self):
+        with self.lock:
+            saved = list(self.saved_ms)
+            resolved = self.hits + self.misses
+            return {
+                "hints_sent": self.hints_sent,
+                "hits": self.hits,
+                "misses": self.misses,
+                "wasted_hints": self.wasted,
+                "hit_rate": self.hits / resolved if resolved else 0.0,
+                "saved_ms_avg": sum(saved) / len(saved) if saved else 0.0,
+                "saved_ms_total": sum(saved),
+            }
+
 state = SystemState()
+prefetch_tracker = PrefetchTracker()
+ad_transcoder = AdTranscoder(**load_settings("transcode"))
+ad_manifest = AdManifest(ADS_DIR, resolve_path=ad_transcoder.best_path)
+resources = get_resources()   # Core sets / thread counts / priorities per subsystem
 connected_clients = []
 main_loop = None 
 wake_word_service = None
 vision_service = None
+content_sync = None
   
 # --- Hardware Services Reset Helpers ---
 def restart_wake_word_service():
@@ -53,7 +124,7 @@ def restart_wake_word_service():
             
     print(">>> [System] Starting Wake Word Service...")
     wake_word_service = WakeWordService(callback_function=on_wake_word)
-    threading.Thread(target=wake_word_service.start, daemon=True).start()
+    threading.Thread(target=resources.run, args=("audio", wake_word_service.start), daemon=True).start()
 
 def stop_wake_word_service():
     global wake_word_service
@@ -86,12 +157,81 @@ async def broadcast_state():
 
 def sync_broadcast():
     global main_loop
+    # Every state change ends in a broadcast, so the CPU plan follows system_id from here
+    resources.set_mode(state.system_id)
     if main_loop:
         try:
             asyncio.run_coroutine_threadsafe(broadcast_state(), main_loop)
         except Exception as e:
             print(f"!!! [Broadcast] Error: {e}")
 
+async def broadcast_message(payload):
+    """Sends a one-off message (not part of SYSTEM_UPDATE) to every client."""
+    if not connected_clients: return
+    message = json.dumps(payload)
+    tasks = [client.send_text(message) for client in connected_clients]
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+def on_engines_changed(snapshot):
+    """Tells the frontend which engines are loaded (runs on the loader thread)."""
+    if snapshot["brain"]["state"] == "ready" and "llm" not in resources.processes:
+        resources.attach_brain(engines.get("brain"))
+    if main_loop:
+        asyncio.run_coroutine_threadsafe(broadcast_message({"type": "ENGINE_STATUS", "engines": snapshot}), main_loop)
+
+def send_prefetch_hint(ad_url, demographics=None):
+    """
+    Low-priority hint so the frontend can start buffering a likely personalized ad.
+    Only sent while in Loop mode; once the switch has happened the hint is useless.
+    """
+    if not ad_url or not main_loop: return
+    with state.lock:
+        if state.system_id != 1: return
+    prefetch_tracker.hint_sent(ad_url)
+    payload = {"type": "PREFETCH", "ad_url": ad_url, "demographics": demographics or []}
+    try:
+        asyncio.run_coroutine_threadsafe(broadcast_message(payload), main_loop)
+    except Exception as e:
+        print(f"!!! [Prefetch] Error: {e}")
+
+# --- Content Sync ---
+def reload_content(changed_paths):
+    """Hot-reloads every consumer of the synced directories. Runs on the sync thread."""
+    if any(p.startswith("ads/") for p in changed_paths):
+        if vision_service:
+            vision_service.selector.reload()
+        ad_manifest.refresh()
+    if any(p.startswith("data/") for p in changed_paths):
+        qa_router = engines.get("qa")
+        if qa_router:
+            qa_router.qa_engine.reload()
+            qa_router.refresh_bank()
+
+    # Let the frontend re-read the ad manifest so changed clips get their new URLs
+    if main_loop:
+        asyncio.run_coroutine_threadsafe(broadcast_message({"type": "CONTENT_UPDATED"}), main_loop)
+
+def start_content_sync():
+    global content_sync
+    cfg = load_settings("content_sync", {"enabled": False, "url": "http://127.0.0.1:8090", "interval": 300})
+    if not cfg["enabled"]:
+        return
+    key = os.environ.get("ADORIX_SYNC_KEY") or cfg.get("key") or ""
+    if not key:
+        # An empty HMAC key would accept manifests signed by anyone who can reach the sync URL
+        print("!!! [System] Content sync disabled: set ADORIX_SYNC_KEY (or content_sync.key)")
+        return
+    content_sync = ContentSyncClient(
+        cfg["url"],
+        key,
+        targets={"ads": ADS_DIR, "data": DATA_DIR},
+        staging_dir=os.path.join(current_dir, ".sync_staging"),
+        interval=cfg["interval"],
+    )
+    content_sync.on_update(reload_content)
+    content_sync.start()
+    print(f">>> [System] Content sync enabled ({cfg['url']}, every {cfg['interval']}s)")
+
 # --- Callbacks ---
 def interaction_state_callback(avatar_state=None, subtitle=None):
     with state.lock:
@@ -107,6 +247,10 @@ def on_vision_update(data):
       Personalized(2) -> Loop(1) [Triggered by frontend AD_LOOP_TIMEOUT after 2 loops]
       Interaction(3) -> Loop(1)  [If face lost - Immediately, aborts Interaction Thread]
     """
+    if data.get("type") == "PREFETCH":
+        send_prefetch_hint(data.get("ad_url", ""), data.get("demographics"))
+        return
+
     new_id = data.get("system_id")
     ad_url = data.get("ad_url", "")
     
@@ -119,6 +263,10 @@ def on_vision_update(data):
             state.system_id = 2
             state.ad_url = ad_url
             sync_broadcast()
+            prefetch_tracker.resolve(ad_url)
+            print(f">>> [Prefetch] {prefetch_tracker.snapshot()}")
+            # Prefill the LLM prompt prefix for this product while the ad plays
+            prepare_for_ad(ad_url)
             
         # 3 -> 1: Transition back to Loop Mode (Face Lost)
         # Note: Personalized(2) ignores Face Lost; it waits for frontend AD_LOOP_TIMEOUT after 2 loops.
@@ -158,7 +306,7 @@ def on_wake_word():
     stop_wake_word_service()
     
     # Spawn the LLM/QA Interaction loop in a separate thread so vision stays non-blocking
-    threading.Thread(target=handle_interaction, args=(current_ad,), daemon=True).start()
+    threading.Thread(target=resources.run, args=("audio", handle_interaction, current_ad), daemon=True).start()
 
 def handle_interaction(ad_url):
     """
@@ -201,23 +349,40 @@ async def lifespan(app: FastAPI):
     global main_loop, vision_service
     # Capture the main asyncio event loop so threads can broadcast safely
     main_loop = asyncio.get_running_loop()
+    resources.attach("display")  # The event loop serves the frontend: websocket state and ad files
     
     print("\n" + "="*50)
     print("🚀 ADORIX INTEGRATED SYSTEM INITIALIZING")
     print("="*50)
+
+    # 0. Load QA, TTS and the LLM in the background; the server is usable meanwhile
+    engines.on_change(on_engines_changed)
+    engines.start()
     
     # 1. Start Wake Word listener
     restart_wake_word_service()
     
     # 2. Start Vision camera thread
-    vision_service = AdorixVision(broadcast_callback=on_vision_update)
-    threading.Thread(target=vision_service.start, daemon=True).start()
+    # (Its AdSelector queues display-matched renditions of the ads in the background)
+    vision_service = AdorixVision(broadcast_callback=on_vision_update, transcoder=ad_transcoder)
+    threading.Thread(target=resources.run, args=("vision", vision_service.start), daemon=True).start()
+
+    # 3. Hash the ads once up front so the first manifest request is instant
+    threading.Thread(target=ad_manifest.refresh, daemon=True).start()
+
+    # 4. Pull content updates in the background (disabled unless configured)
+    start_content_sync()
     
     yield
     
     # Cleanup on shutdown
     print(">>> [Cleanup] Shutting down Adorix gracefully...")
     stop_wake_word_service()
+    if content_sync:
+        content_sync.stop()
+    brain = engines.get("brain")
+    if hasattr(brain, "stop"):
+        brain.stop()  # Isolated brain: end the worker process
 
 app = FastAPI(lifespan=lifespan)
 
@@ -229,8 +394,56 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-if os.path.exists("backend/ads"):
-    app.mount("/ads", StaticFiles(directory="backend/ads"), name="ads")
+# --- Ad assets ---
+# Hashed URLs from the manifest never change content, so browsers may cache them
+# forever; the plain /ads mount below stays for older clients.
+@app.get("/ads/manifest")
+async def ads_manifest():
+    await asyncio.to_thread(ad_manifest.refresh)
+    return ad_manifest.to_dict()
+
+@app.get("/ads/h/{digest}/{name}")
+async def hashed_ad(digest: str, name: str):
+    path = ad_manifest.resolve(digest, name)
+    if path is None:
+        # Unknown or outdated hash, or the file changed since the last refresh: the client should re-read the manifest
+        raise HTTPException(status_code=404, detail="Unknown ad version")
+    return FileResponse(
+        path,
+        media_type="video/mp4",
+        headers={"Cache-Control": IMMUTABLE_CACHE, "ETag": f'"{digest}"'},
+    )
+
+if os.path.exists(ADS_DIR):
+    app.mount("/ads", StaticFiles(directory=ADS_DIR), name="ads")
+
+@app.get("/stats/transcode")
+async def transcode_stats():
+    return ad_transcoder.report()
+
+@app.get("/stats/prefetch")
+async def prefetch_stats():
+    return prefetch_tracker.snapshot()
+
+@app.get("/stats/engines")
+async def engine_stats():
+    return engines.snapshot()
+
+@app.get("/stats/qa")
+async def qa_stats():
+    qa_router = engines.get("qa")
+    stats = qa_router.stats() if qa_router else {"state": engines.snapshot()["qa"]["state"]}
+    stats["speech"] = speech_metrics.snapshot()
+    return stats
+
+@app.get("/stats/resources")
+async def resource_stats():
+    return resources.snapshot()
+
+@app.get("/stats/brain")
+async def brain_stats():
+    brain = engines.get("brain")
+    return brain.stats() if brain else engines.snapshot()["brain"]
 
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
@@ -248,6 +461,7 @@ async def websocket_endpoint(websocket: WebSocket):
                 "ad_url": state.ad_url
             }
         await websocket.send_text(json.dumps(init_payload))
+        await websocket.send_text(json.dumps({"type": "ENGINE_STATUS", "engines": engines.snapshot()}))
         
         while True:
             data = await websocket.receive_text()
@@ -264,6 +478,9 @@ async def websocket_endpoint(websocket: WebSocket):
                             state.subtitle = ""
                             state.ad_url = ""
                     sync_broadcast()
+                # PREFETCH_READY from frontend: a hinted ad finished buffering
+                elif msg.get("type") == "PREFETCH_READY":
+                    prefetch_tracker.mark_ready(msg.get("ad_url", ""), msg.get("buffer_ms", 0))
             except Exception as e:
                 print(f"!!! [WS] Error parsing message: {e}")
     except WebSocketDisconnect:
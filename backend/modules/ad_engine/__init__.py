@@ -1 +1,3 @@
 from .selector import AdSelector
+from .manifest import AdManifest
+from .transcoder import AdTranscoder
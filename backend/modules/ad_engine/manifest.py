@@ -0,0 +1,118 @@
+import os
+import time
+import hashlib
+import threading
+
+try:
+    import cv2
+except ImportError:  # Duration is optional metadata
+    cv2 = None
+
+HASH_CHUNK = 1024 * 1024
+HASH_LENGTH = 16  # Hex chars kept in URLs; plenty to tell ad versions apart
+
+
+def file_digest(path: str) -> str:
+    """Streams a file through SHA-256 and returns the shortened hex digest."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()[:HASH_LENGTH]
+
+
+def video_duration(path: str):
+    """Duration in seconds from the container header, or None if unknown."""
+    if cv2 is None:
+        return None
+    cap = cv2.VideoCapture(path)
+    try:
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        frames = cap.get(cv2.CAP_PROP_FRAME_COUNT)
+        if fps and fps > 0 and frames and frames > 0:
+            return round(frames / fps, 3)
+        return None
+    finally:
+        cap.release()
+
+
+class AdManifest:
+    """
+    Content-addressed view of the ads directory.
+    Each ad gets a URL containing its content hash, so the URL can be cached
+    forever: a content update produces a new hash and therefore a new URL.
+    Hashes are only recomputed for files whose size or mtime changed.
+
+    `resolve_path` maps an ad's original path to the file actually served
+    (e.g. AdTranscoder.best_path), so a finished rendition gets its own hash.
+    """
+
+    def __init__(self, ads_dir: str, url_prefix: str = "/ads/h", resolve_path=None):
+        self.ads_dir = ads_dir
+        self.url_prefix = url_prefix.rstrip("/")
+        self.resolve_path = resolve_path or (lambda path: path)
+        self.entries = {}   # filename -> entry dict
+        self._stamps = {}   # filename -> (served path, size, mtime) the entry was built from
+        self.lock = threading.Lock()
+        self.generated_at = 0.0
+
+    def refresh(self):
+        """Rescans the ads directory. Cheap when nothing changed."""
+        try:
+            names = sorted(f for f in os.listdir(self.ads_dir)
+                           if f.endswith(".mp4") and os.path.isfile(os.path.join(self.ads_dir, f)))
+        except FileNotFoundError:
+            names = []
+
+        entries, stamps = {}, {}
+        for name in names:
+            path = self.resolve_path(os.path.join(self.ads_dir, name))
+            st = os.stat(path)
+            stamp = (path, st.st_size, st.st_mtime)
+            with self.lock:
+                previous = self.entries.get(name) if self._stamps.get(name) == stamp else None
+            if previous is None:
+                digest = file_digest(path)
+                previous = {
+                    "name": name,
+                    "hash": digest,
+                    "size": st.st_size,
+                    "duration": video_duration(path),
+                    "url": f"{self.url_prefix}/{digest}/{name}",
+                }
+            entries[name] = previous
+            stamps[name] = stamp
+
+        with self.lock:
+            changed = entries != self.entries
+            self.entries, self._stamps = entries, stamps
+            if changed or not self.generated_at:
+                self.generated_at = time.time()
+        return changed
+
+    def to_dict(self):
+        with self.lock:
+            return {
+                "generated_at": self.generated_at,
+                "ads": list(self.entries.values()),
+            }
+
+    def resolve(self, digest: str, name: str):
+        """
+        Path for a hashed URL, or None if that exact content is not (or no longer) served.
+        The file is stat'ed again: one that changed since the last refresh would
+        otherwise go out as immutable under its old hash.
+        """
+        with self.lock:
+            entry = self.entries.get(name)
+            stamp = self._stamps.get(name)
+        if entry is None or entry["hash"] != digest:
+            return None
+        path = stamp[0]
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        if (path, st.st_size, st.st_mtime) != stamp:
+            return None   # The client re-reads the manifest, which rehashes it
+        return path
@@ -3,9 +3,10 @@ import json
 import random
 
 class AdSelector:
-    def __init__(self, rules_path: str, ads_dir: str):
+    def __init__(self, rules_path: str, ads_dir: str, transcoder=None):
         self.rules_path = rules_path
         self.ads_dir = ads_dir
+        self.transcoder = transcoder  # Optional AdTranscoder; renditions are built on load
         self.rules = self._load()
         self.idle_ads = self._load_ads()
         self.idle_index = 0
@@ -18,6 +19,8 @@ class AdSelector:
     def _load_ads(self):
         try:
             files = [f for f in sorted(os.listdir(self.ads_dir)) if os.path.isfile(os.path.join(self.ads_dir, f))]
+            if self.transcoder:
+                self.transcoder.submit_dir(self.ads_dir, files)
             # If rules request shuffling, shuffle once on load
             if self.rules.get("SHUFFLE_IDLE"):
                 random.shuffle(files)
@@ -25,6 +28,21 @@ class AdSelector:
         except Exception:
             return []
 
+    def reload(self):
+        """Re-reads rules and the ads directory (after a content sync) without blocking readers."""
+        rules = self._load()
+        previous_rules, self.rules = self.rules, rules
+        try:
+            idle_ads = self._load_ads()
+        except Exception:
+            self.rules = previous_rules
+            raise
+        # Swap the new list in one assignment; keep the rotation position in range
+        self.idle_index = self.idle_index % len(idle_ads) if idle_ads else 0
+        self.idle_ads = idle_ads
+        if self.current_idle not in idle_ads:
+            self.current_idle = None
+
     def reshuffle_idle_ads(self):
         """Reshuffle the current idle ads list (call after a full cycle).
 
@@ -48,13 +66,22 @@ class AdSelector:
         # not idle: clear current idle holder so rotation resumes correctly later
         self.current_idle = None
 
-        primary = payload.get("primary")
+        return self.ad_for_person(payload.get("primary"))
+
+    def ad_for_person(self, primary: dict) -> str:
+        """Maps a person dict ({"gender", "age"}) to an ad filename without touching idle rotation."""
         if not primary:
             return self.rules.get("DEFAULT", "generic_ad.mp4")
 
         key = f"{primary.get('gender')}_{primary.get('age')}"
         return self.rules.get(key, self.rules.get("DEFAULT", "generic_ad.mp4"))
 
+    def peek_next_idle(self) -> str:
+        """Returns the idle ad the next rotation step would pick, without advancing it."""
+        if not self.idle_ads:
+            return self.rules.get("IDLE", "idle_loop.mp4")
+        return self.idle_ads[self.idle_index]
+
     def get_personalized_ad(self, demographic_key: str) -> str:
         """Takes a demographic string (e.g., '10-15_male') and returns the ad filename."""
         if not demographic_key:
@@ -70,4 +97,8 @@ class AdSelector:
         return self.rules.get(demographic_key, self.rules.get("DEFAULT", "generic_ad.mp4"))
 
     def ad_path(self, filename: str) -> str:
-        return os.path.join(self.ads_dir, filename)
+        """Path to play for `filename`: the display-matched rendition when one is ready."""
+        path = os.path.join(self.ads_dir, filename)
+        if self.transcoder:
+            return self.transcoder.best_path(path)
+        return path
@@ -0,0 +1,237 @@
+import os
+import sys
+import queue
+import shutil
+import threading
+import subprocess
+
+from .manifest import file_digest
+
+try:
+    import cv2
+except ImportError:
+    cv2 = None
+
+RENDITIONS_DIRNAME = ".renditions"
+
+
+def fit_within(src_w, src_h, max_w, max_h):
+    """Largest even-sized (w, h) with the source aspect ratio that fits the box. Never upscales."""
+    scale = min(1.0, max_w / float(src_w), max_h / float(src_h))
+    w = max(2, int(src_w * scale) // 2 * 2)
+    h = max(2, int(src_h * scale) // 2 * 2)
+    return w, h
+
+
+# Runs in a child process: time.process_time() there counts only the decoder (and its threads),
+# not the vision and LLM threads of the backend
+_MEASURE_SCRIPT = """
+import sys, time, cv2
+cap = cv2.VideoCapture(sys.argv[1])
+limit, frames = int(sys.argv[2]), 0
+start = time.process_time()
+while frames < limit:
+    ok, _ = cap.read()
+    if not ok:
+        break
+    frames += 1
+print(time.process_time() - start, frames)
+cap.release()
+"""
+
+
+def measure_decode_cpu(path, max_frames=300):
+    """
+    CPU seconds per decoded frame, measured in a separate process so decoder threads count
+    and the rest of the backend does not. Returns None when OpenCV is missing or the file
+    cannot be decoded.
+    """
+    if cv2 is None:
+        return None
+    try:
+        result = subprocess.run([sys.executable, "-c", _MEASURE_SCRIPT, path, str(max_frames)],
+                                capture_output=True, text=True, timeout=300)
+        cpu, frames = result.stdout.split()[-2:]
+        cpu, frames = float(cpu), int(frames)
+    except (OSError, ValueError, subprocess.TimeoutExpired):
+        return None
+    return cpu / frames if frames else None
+
+
+def _stamp(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime
+
+
+class AdTranscoder:
+    """
+    Offline transcoding of ads into a rendition matched to the kiosk display.
+    Renditions are H.264 baseline tuned for fast decode, scaled down to the
+    display and capped in fps. They are keyed by the source content hash plus
+    the profile, so an unchanged ad is never transcoded twice.
+
+    Work runs on a single background thread. Until a rendition exists, or when
+    ffmpeg is missing or fails, best_path() returns the original file.
+    """
+
+    def __init__(self, width=720, height=1280, fps=30, crf=26, preset="veryfast",
+                 ffmpeg="ffmpeg", enabled=True, measure_frames=300):
+        self.width = int(width)
+        self.height = int(height)
+        self.fps = int(fps)
+        self.crf = int(crf)
+        self.preset = preset
+        self.measure_frames = int(measure_frames)
+        self.ffmpeg = shutil.which(ffmpeg) if enabled else None
+        if enabled and not self.ffmpeg:
+            print(f"!!! [Transcode] '{ffmpeg}' not found. Ads will play in their original encoding.")
+
+        self.lock = threading.Lock()
+        self.ready = {}       # source path -> (rendition path, source (size, mtime) it was made from)
+        self.failed = set()   # (source path, digest) that ffmpeg could not convert
+        self.reports = {}     # source filename -> decode CPU before/after
+        self.jobs = queue.Queue()
+        self.pending = set()
+        self.worker = None
+
+    @property
+    def profile_key(self):
+        return f"{self.width}x{self.height}_{self.fps}fps_crf{self.crf}_{self.preset}"
+
+    def rendition_path(self, source_path, digest):
+        rend_dir = os.path.join(os.path.dirname(source_path), RENDITIONS_DIRNAME)
+        name = os.path.splitext(os.path.basename(source_path))[0]
+        return os.path.join(rend_dir, f"{name}.{digest}.{self.profile_key}.mp4")
+
+    # ---------- public API ----------
+    def submit_dir(self, ads_dir, filenames):
+        """Queues every .mp4 in `filenames` (called when AdSelector loads the ads directory)."""
+        if not self.ffmpeg:
+            return
+        for filename in filenames:
+            if filename.endswith(".mp4"):
+                self.submit(os.path.join(ads_dir, filename))
+
+    def submit(self, source_path):
+        stamp = _stamp(source_path)
+        with self.lock:
+            if source_path in self.ready and self.ready[source_path][1] != stamp:
+                # Source replaced (e.g. by content sync): stop serving the old ad's rendition
+                del self.ready[source_path]
+            if source_path in self.pending:
+                return
+            self.pending.add(source_path)
+            if self.worker is None or not self.worker.is_alive():
+                self.worker = threading.Thread(target=self._run, daemon=True)
+                self.worker.start()
+        self.jobs.put(source_path)
+
+    def best_path(self, source_path):
+        """Rendition if one is ready for the current content, otherwise the original."""
+        with self.lock:
+            rendition, stamp = self.ready.get(source_path, (None, None))
+        if rendition and stamp == _stamp(source_path) and os.path.exists(rendition):
+            return rendition
+        return source_path
+
+    def report(self):
+        with self.lock:
+            return dict(self.reports)
+
+    # ---------- worker ----------
+    def _run(self):
+        while True:
+            try:
+                source_path = self.jobs.get(timeout=5.0)
+            except queue.Empty:
+                return
+            try:
+                self._process(source_path)
+            except Exception as e:
+                print(f"!!! [Transcode] {os.path.basename(source_path)}: {e}")
+            finally:
+                with self.lock:
+                    self.pending.discard(source_path)
+
+    def _process(self, source_path):
+        if not os.path.isfile(source_path):
+            return
+        stamp = _stamp(source_path)   # Before hashing: a change during the hash shows up as a stale stamp
+        digest = file_digest(source_path)
+        target = self.rendition_path(source_path, digest)
+        name = os.path.basename(source_path)
+
+        with self.lock:
+            if (source_path, digest) in self.failed:
+                return
+        if not os.path.exists(target):
+            if not self._transcode(source_path, target):
+                with self.lock:
+                    self.failed.add((source_path, digest))
+                return
+            self._prune(source_path, keep=target)
+
+        before = measure_decode_cpu(source_path, self.measure_frames)
+        after = measure_decode_cpu(target, self.measure_frames)
+        with self.lock:
+            self.ready[source_path] = (target, stamp)
+            self.reports[name] = {
+                "rendition": os.path.basename(target),
+                "size_before": os.path.getsize(source_path),
+                "size_after": os.path.getsize(target),
+                "decode_cpu_ms_per_frame_before": before * 1000.0 if before else None,
+                "decode_cpu_ms_per_frame_after": after * 1000.0 if after else None,
+            }
+        if before and after:
+            print(f">>> [Transcode] {name}: decode CPU {before * 1000.0:.2f} -> {after * 1000.0:.2f} ms/frame")
+
+    def _transcode(self, source_path, target):
+        src_w, src_h, src_fps = self.width, self.height, 0.0
+        if cv2 is not None:
+            cap = cv2.VideoCapture(source_path)
+            src_w = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)) or src_w
+            src_h = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)) or src_h
+            src_fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+            cap.release()
+        w, h = fit_within(src_w, src_h, self.width, self.height)
+        filters = f"scale={w}:{h}"
+        if src_fps > self.fps:
+            filters += f",fps={self.fps}"  # Only ever drop frames, never duplicate them
+
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        partial = target + ".part.mp4"
+        cmd = [
+            self.ffmpeg, "-y", "-loglevel", "error", "-i", source_path,
+            "-vf", filters,
+            "-c:v", "libx264", "-profile:v", "baseline", "-tune", "fastdecode",
+            "-preset", self.preset, "-crf", str(self.crf), "-pix_fmt", "yuv420p",
+            "-c:a", "copy", "-movflags", "+faststart", partial,
+        ]
+        print(f">>> [Transcode] {os.path.basename(source_path)} -> {w}x{h}@{self.fps}")
+        try:
+            result = subprocess.run(cmd, capture_output=True, text=True)
+        except OSError as e:
+            print(f"!!! [Transcode] Could not run ffmpeg: {e}")
+            return False
+        if result.returncode != 0 or not os.path.exists(partial):
+            print(f"!!! [Transcode] ffmpeg failed for {os.path.basename(source_path)}: {result.stderr.strip()[-300:]}")
+            if os.path.exists(partial):
+                os.remove(partial)
+            return False
+        os.replace(partial, target)
+        return True
+
+    def _prune(self, source_path, keep):
+        """Removes renditions of older versions of the same ad."""
+        rend_dir = os.path.dirname(keep)
+        prefix = os.path.splitext(os.path.basename(source_path))[0] + "."
+        for f in os.listdir(rend_dir):
+            path = os.path.join(rend_dir, f)
+            if f.startswith(prefix) and path != keep:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
@@ -1,145 +1,39 @@
 import json
 import os
-import torch
-from transformers import pipeline
+import threading
 
-class BrainEngine:
-    def __init__(self):
-        """
-        Initializes the AI Brain using TinyLlama for RAG.
-        """
-        print("🧠 [Brain] Loading AI Engine (TinyLlama)...")
-        # Initialize the text-generation pipeline
-        # We use float16 and low_cpu_mem_usage for faster loading and less memory
-        self.pipe = pipeline(
-            "text-generation",
-            model="TinyLlama/TinyLlama-1.1B-Chat-v1.0",
-            model_kwargs={
-                "dtype": torch.float16,
-                "low_cpu_mem_usage": True,
-            },
-            device_map="auto"
-        )
-        print("✅ [Brain] AI Engine loaded successfully.")
+from modules.llm import BrainEngine, BrainProcess, BrainClient, DEFAULT_BRAIN_SETTINGS
+from modules.settings import load_settings
 
-    def load_context_from_json(self, json_filename):
-        """
-        Loads product details from ad_engine/data and builds context.
-        """
-        # Strip extension if provided (e.g., "ad_name.mp4" -> "ad_name")
-        json_filename = os.path.splitext(json_filename)[0]
-        json_filename += ".json"
-            
-        # Path: backend/modules/ad_engine/data/{json_filename}
-        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        json_path = os.path.join(base_dir, "ad_engine", "data", json_filename)
-        
-        try:
-            with open(json_path, 'r') as f:
-                data = json.load(f)
-                
-                # If there's a dedicated 'context' field, use it
-                if "context" in data:
-                    context = data["context"]
-                else:
-                    # Otherwise, build it from product_name, description, features, and faqs
-                    name = data.get("product_name", "this product")
-                    desc = data.get("description", "")
-                    features = ", ".join(data.get("key_features", []))
-                    
-                    faqs_list = []
-                    for q, a in data.get("faqs", {}).items():
-                        faqs_list.append(f"Q: {q.replace('_', ' ')}? A: {a}")
-                    faqs_str = " ".join(faqs_list)
-                    
-                    context = f"Product: {name}. Description: {desc}. Features: {features}. FAQs: {faqs_str}"
-
-                product_name = data.get("product_name", data.get("product", "this product"))
-                print(f">>> [Brain] Loaded knowledge for: {product_name}")
-                return context
-        except FileNotFoundError:
-            print(f"!!! [Brain] Error: Knowledge file {json_path} not found.")
-            return None
-        except Exception as e:
-            print(f"!!! [Brain] Error loading JSON: {e}")
-            return None
-
-    def generate_answer(self, user_question, context):
-        """
-        Generates a concise answer based ONLY on the provided context.
-        """
-        if not context:
-            return "I'm sorry, I don't have enough information about that right now."
-
-        import time
-        start_time = time.time()
-        
-        # Construct a strict prompt for RAG
-        messages = [
-            {
-                "role": "system",
-                "content": (
-                    "You are Adorix, a friendly AI kiosk assistant. "
-                    "Use ONLY the following context to answer the user's question. "
-                    "Keep your response very short (1-2 sentences), conversational, and informative. "
-                    "If the answer is not in the context, say 'I'm sorry, I don't have that information'."
-                )
-            },
-            {
-                "role": "user",
-                "content": f"Context: {context}\n\nQuestion: {user_question}"
-            }
-        ]
-
-        try:
-            # Use the chat template provided by the model tokenizer
-            prompt = self.pipe.tokenizer.apply_chat_template(
-                messages,
-                tokenize=False,
-                add_generation_prompt=True
-            )
-
-            # Generate response
-            outputs = self.pipe(
-                prompt,
-                max_new_tokens=80,
-                do_sample=True,
-                temperature=0.1, # Even lower for consistency
-                top_k=50,
-                top_p=0.9
-            )
+# Global instance, created on first use: loading the model takes a while
+adorix_brain = None
+_brain_lock = threading.Lock()
 
-            # Extract answer from generated text
-            full_text = outputs[0]["generated_text"]
-            
-            # TinyLlama implementation of apply_chat_template usually ends with <|assistant|>
-            if "<|assistant|>" in full_text:
-                answer = full_text.split("<|assistant|>")[-1].strip()
+def get_brain():
+    """
+    Returns the shared brain, loading the model on the first call.
+    brain: service_url in settings.yaml uses the shared LLM service (llm_service.py) instead;
+    with brain: isolate the model runs in a worker process (BrainProcess).
+    """
+    global adorix_brain
+    with _brain_lock:
+        if adorix_brain is None:
+            config = load_settings("brain", DEFAULT_BRAIN_SETTINGS)
+            if config.get("service_url"):
+                adorix_brain = BrainClient(config["service_url"], config.get("request_timeout_s", 20))
+            elif config.get("isolate"):
+                adorix_brain = BrainProcess(config)
             else:
-                # Fallback if template markers are missing
-                answer = full_text.split(user_question)[-1].strip()
-
-            # Remove common prefixes if they appear
-            for prefix in ["Answer:", "Response:", "Adorix:"]:
-                if answer.startswith(prefix):
-                    answer = answer[len(prefix):].strip()
-
-            end_time = time.time()
-            print(f">>> [Brain] Answer generated in {end_time - start_time:.2f}s")
-            return answer
-        except Exception as e:
-            print(f"!!! [Brain] Generation error: {e}")
-            return "I'm sorry, I encountered an error while thinking about your question."
-
-# Global instance
-adorix_brain = BrainEngine()
+                adorix_brain = BrainEngine(config)
+        return adorix_brain
 
 def get_answer_for_product(user_question, json_file):
     """
     Wrapper function called by the interaction manager.
     """
-    context = adorix_brain.load_context_from_json(json_file)
-    return adorix_brain.generate_answer(user_question, context)
+    brain = get_brain()
+    context = brain.load_context_from_json(json_file)
+    return brain.generate_answer(user_question, context)
 
 if __name__ == "__main__":
     # Test script: Create a dummy JSON first
@@ -155,4 +49,7 @@ if __name__ == "__main__":
         
     print("Testing Brain Engine...")
     ans = get_answer_for_product("How much does the kiosk cost?", "test_ad.json")
-    print(f"AI Answer: {ans}")
\ No newline at end of file
+    print(f"AI Answer: {ans}")
+
+    context = get_brain().load_context_from_json("16-29_male.json")
+    print(f"TTFT with/without prefix reuse: {get_brain().measure_ttft('Is it waterproof?', context)}")
\ No newline at end of file
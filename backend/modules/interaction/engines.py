@@ -0,0 +1,99 @@
+import time
+import threading
+
+# Readiness states, in the order an engine goes through them
+PENDING = "pending"
+LOADING = "loading"
+READY = "ready"
+FAILED = "failed"
+
+
+class EngineRegistry:
+    """
+    Loads the heavy engines (QA index, TTS, LLM) on a background thread so the
+    server can accept connections and show ads straight away.
+
+    Engines load one at a time in registration order (cheap ones first, so the
+    fast QA path is usable while the LLM is still loading). Callers use get()
+    for a non-blocking lookup or wait() when they can afford to block.
+    Listeners registered with on_change() get a snapshot() on every state change.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.loaders = {}     # name -> callable returning the engine
+        self.instances = {}
+        self.states = {}
+        self.errors = {}
+        self.load_s = {}
+        self.events = {}
+        self.listeners = []
+        self.thread = None
+
+    def register(self, name, loader):
+        with self.lock:
+            self.loaders[name] = loader
+            self.states[name] = PENDING
+            self.events[name] = threading.Event()
+
+    def on_change(self, callback):
+        self.listeners.append(callback)
+
+    def _set_state(self, name, state):
+        with self.lock:
+            self.states[name] = state
+        snapshot = self.snapshot()
+        for callback in self.listeners:
+            try:
+                callback(snapshot)
+            except Exception as e:
+                print(f"!!! [Engines] Listener error: {e}")
+
+    def _load(self, name):
+        self._set_state(name, LOADING)
+        start = time.perf_counter()
+        try:
+            instance = self.loaders[name]()
+        except Exception as e:
+            with self.lock:
+                self.errors[name] = str(e)
+                self.load_s[name] = time.perf_counter() - start
+            print(f"!!! [Engines] {name} failed to load: {e}")
+            self._set_state(name, FAILED)
+        else:
+            with self.lock:
+                self.instances[name] = instance
+                self.load_s[name] = time.perf_counter() - start
+            print(f"✅ [Engines] {name} ready in {self.load_s[name]:.2f}s")
+            self._set_state(name, READY)
+        self.events[name].set()
+
+    def start(self):
+        """Starts background loading (once). Returns immediately."""
+        with self.lock:
+            if self.thread is not None:
+                return
+            names = [n for n, state in self.states.items() if state == PENDING]
+            self.thread = threading.Thread(target=lambda: [self._load(n) for n in names], daemon=True)
+        self.thread.start()
+
+    def get(self, name):
+        """The loaded engine, or None while it is pending, loading or failed."""
+        with self.lock:
+            return self.instances.get(name)
+
+    def wait(self, name, timeout=None):
+        """Blocks until `name` has finished loading (or failed). Returns the engine or None."""
+        self.events[name].wait(timeout)
+        return self.get(name)
+
+    def is_ready(self, name):
+        with self.lock:
+            return self.states.get(name) == READY
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                name: {"state": state, "load_s": self.load_s.get(name), "error": self.errors.get(name)}
+                for name, state in self.states.items()
+            }
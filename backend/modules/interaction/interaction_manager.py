@@ -1,37 +1,121 @@
 import time
 import sys
 import os
+import threading
 
 # Add the backend directory to the path so modules can be found
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
-from .tts_engine import speak
+from .tts_engine import speak, get_tts
 from .stt_engine import listen_one_phrase
+from .streaming_stt import get_stt, DEFAULT_STT_SETTINGS
+from .speech_stream import speak_streaming
+from .engines import EngineRegistry
 
 # Load Both Engines
 from product_qa_engine import ProductQAEngine
-from modules.interaction.brain_engine import adorix_brain
+from modules.interaction.brain_engine import get_brain
+from modules.qa import QARouter, AnswerCache, AnswerBank, RouteMetrics
+from modules.settings import load_settings
 
-# Initialize globally so the JSON database loads only once
-qa_engine = ProductQAEngine()
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Answers shared by the router and the brain; the disk tier survives restarts
+_cache_cfg = load_settings("answer_cache", {"enabled": True, "directory": ".answer_cache"})
+_cache_dir = _cache_cfg.pop("directory", None)
+if _cache_dir and not os.path.isabs(_cache_dir):
+    _cache_dir = os.path.join(BACKEND_DIR, _cache_dir)
+answer_cache = AnswerCache(directory=_cache_dir, **_cache_cfg)
+
+def ask_brain(question: str, clean_ad_name: str) -> str:
+    """LLM route: TinyLlama answers from the product's JSON context."""
+    brain = engines.get("brain")
+    context = brain.load_context_from_json(f"{clean_ad_name}.json")
+    return brain.generate_answer(question, context)
+
+def ask_brain_stream(question: str, clean_ad_name: str, cancel=None):
+    """Streaming LLM route: yields answer text as TinyLlama generates it, until `cancel` is set."""
+    brain = engines.get("brain")
+    context = brain.load_context_from_json(f"{clean_ad_name}.json")
+    return brain.stream_answer(question, context, cancel=cancel)
+
+def _load_qa():
+    """The product index, the offline answer bank and the router in front of them."""
+    bank = None
+    bank_cfg = load_settings("answer_bank", {"enabled": True, "path": ".answer_bank/bank.json"})
+    if bank_cfg["enabled"]:
+        bank = AnswerBank(os.path.join(BACKEND_DIR, bank_cfg["path"]))
+    return QARouter(ProductQAEngine(), llm=ask_brain, llm_stream=ask_brain_stream, cache=answer_cache,
+                    llm_ready=lambda: engines.is_ready("brain"), bank=bank,
+                    **load_settings("qa", {"fast_confidence": 0.4, "llm_confidence": 0.25}))
+
+def _load_brain():
+    brain = get_brain()
+    brain.cache = answer_cache
+    return brain
+
+# Nothing heavy loads at import: main.py calls engines.start() once the server is up.
+# QA first (milliseconds) so the fast path works while TTS and the LLM are still loading.
+engines = EngineRegistry()
+engines.register("qa", _load_qa)
+engines.register("tts", get_tts)
+if load_settings("stt", DEFAULT_STT_SETTINGS)["engine"] == "whisper":
+    engines.register("stt", get_stt)
+engines.register("brain", _load_brain)
+
+# Time from the end of the visitor's question to the first spoken audio, and to the end of the answer
+speech_metrics = RouteMetrics()
+
+def prepare_for_ad(ad_name: str):
+    """
+    Warms the LLM for a personalized ad in the background: the product's prompt
+    prefix is prefilled so questions during the interaction skip that work.
+    """
+    clean_ad_name = os.path.splitext(ad_name)[0] if ad_name else ""
+    brain = engines.get("brain")
+    if not clean_ad_name or brain is None:
+        return
+
+    def _warm():
+        try:
+            brain.prepare_prefix(brain.load_context_from_json(f"{clean_ad_name}.json"))
+        except Exception as e:
+            print(f"!!! [Hybrid QA] Prefix warm-up failed: {e}")
+
+    threading.Thread(target=_warm, daemon=True).start()
 
 def get_hybrid_answer(question: str, clean_ad_name: str) -> str:
     """
     Tries the lightning-fast ProductQAEngine first.
-    If it fails to find a good match, falls back to BrainEngine (TinyLlama).
+    Confident index hits are answered directly, partial matches go to the
+    BrainEngine (TinyLlama) and unrelated questions get a canned reply.
+    The LLM starts speculatively alongside the lookups (settings.yaml qa.speculative).
     """
-    print(f">>> [Hybrid QA] Attempting EXACT MATCH for: '{question}'")
-    answer = qa_engine.get_answer(question, clean_ad_name)
-    
-    # If the QA Engine couldn't find an exact match, it returns its fallback string.
-    # We intercept that and use the BrainEngine instead.
-    if "I don't have that specific information" in answer or "I'm sorry, I don't have information about that product" in answer:
-        print(f">>> [Hybrid QA] Exact match failed. Falling back to LLM BrainEngine...")
-        # Load context specifically for the brain
-        context = adorix_brain.load_context_from_json(f"{clean_ad_name}.json")
-        answer = adorix_brain.generate_answer(question, context)
-        
-    return answer
+    print(f">>> [Hybrid QA] Routing: '{question}'")
+    route, pieces, _ = engines.wait("qa").answer_stream(question, clean_ad_name)
+    return "".join(pieces).strip()
+
+def listen_for_question(timeout, state_callback=None, is_active_callback=None):
+    """
+    One visitor phrase, or None on silence. Uses the offline streaming STT when it
+    is loaded (partial transcripts go to the subtitle as the visitor speaks),
+    otherwise the recognize_google path.
+    """
+    stt = engines.get("stt")
+    if stt is None:
+        return listen_one_phrase(timeout=timeout)
+    partial = (lambda text: state_callback(avatar_state="LISTEN", subtitle=f"{text}...")) if state_callback else None
+    try:
+        utterance = stt.listen_microphone(timeout=timeout, on_partial=partial, is_active=is_active_callback)
+    except Exception as e:
+        print(f"!!! [STT] Streaming STT failed, using recognize_google: {e}")
+        return listen_one_phrase(timeout=timeout)
+    if utterance is None:
+        print(">>> [STT] Silence detected (Timeout)")
+        return None
+    print(f">>> [STT] Final transcript {utterance.final_ms:.0f} ms after the endpoint "
+          f"({utterance.partials} partials)")
+    return utterance.text or None
 
 def start_interaction_loop(current_ad_name, state_callback=None, is_active_callback=None):
     """
@@ -40,6 +124,8 @@ def start_interaction_loop(current_ad_name, state_callback=None, is_active_callb
     """
     # Clean the ad name (remove .mp4 extension to match json structure)
     clean_ad_name = current_ad_name.replace(".mp4", "") if current_ad_name else "generic_ad"
+    # The index loads in milliseconds at startup; only an extremely early wake word waits here
+    qa_router = engines.wait("qa")
 
     # --- 1. Initial Greeting ---
     if is_active_callback and not is_active_callback(): return "ABORTED"
@@ -56,7 +142,7 @@ def start_interaction_loop(current_ad_name, state_callback=None, is_active_callb
 
         print("\n>>> [System] Listening for user STT input...")
         # STT Engine listens for exactly 7 seconds
-        user_question = listen_one_phrase(timeout=7)
+        user_question = listen_for_question(7, state_callback, is_active_callback)
         
         if is_active_callback and not is_active_callback(): return "ABORTED"
         
@@ -73,16 +159,18 @@ def start_interaction_loop(current_ad_name, state_callback=None, is_active_callb
         if state_callback:
             state_callback(avatar_state="THINK", subtitle=f"Processing: {user_question}")
         
-        # --- 5. Generate Hybrid Answer ---
-        answer = get_hybrid_answer(user_question, clean_ad_name)
+        # --- 5. Generate Hybrid Answer (streamed) ---
+        asked_at = time.perf_counter()
+        route, pieces, _ = qa_router.answer_stream(user_question, clean_ad_name)
         
         if is_active_callback and not is_active_callback(): return "ABORTED"
         
-        # --- 6. TTS Output ---
-        print(f">>> [System TTS Output] {answer}")
-        if state_callback:
-            state_callback(avatar_state="TALK", subtitle=answer)
-        speak(answer)
+        # --- 6. TTS Output: each sentence is spoken as soon as it is complete ---
+        subtitle = (lambda text: state_callback(avatar_state="TALK", subtitle=text)) if state_callback else None
+        answer, first_audio = speak_streaming(pieces, subtitle_callback=subtitle, is_active=is_active_callback,
+                                              started=asked_at, metrics=speech_metrics)
+        first_audio_text = f"{first_audio:.2f}s" if first_audio is not None else "n/a"
+        print(f">>> [System TTS Output] ({route}, first audio {first_audio_text}) {answer}")
         
         if is_active_callback and not is_active_callback(): return "ABORTED"
         if state_callback:
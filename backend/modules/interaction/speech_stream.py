@@ -0,0 +1,93 @@
+import time
+import queue
+import threading
+
+from .tts_engine import speak
+from modules.llm.brain import SENTENCE_END, strip_answer_prefix
+
+# Don't hand TTS fragments shorter than this; they sound choppy ("Yes." is fine, "Rs." is not)
+MIN_SENTENCE_CHARS = 4
+# Subtitles are re-broadcast at most this often while tokens stream in
+SUBTITLE_INTERVAL = 0.1
+
+
+def split_sentences(pieces):
+    """Re-chunks a stream of text pieces (tokens) into whole sentences."""
+    buffer = ""
+    for piece in pieces:
+        buffer += piece
+        parts = SENTENCE_END.split(buffer)
+        buffer = parts.pop()
+        carry = ""
+        for sentence in parts:
+            sentence = f"{carry} {sentence}".strip()
+            carry = ""
+            if len(sentence) < MIN_SENTENCE_CHARS:
+                carry = sentence  # Glue very short fragments onto the next sentence
+                continue
+            yield sentence
+        if carry:
+            buffer = f"{carry} {buffer}"
+    if buffer.strip():
+        yield buffer.strip()
+
+
+def speak_streaming(pieces, subtitle_callback=None, is_active=None, started=None, metrics=None):
+    """
+    Speaks a streamed answer sentence by sentence while the rest is still being
+    generated. A speaker thread runs TTS; this thread reads the stream, updates
+    the subtitle and queues finished sentences.
+
+    Returns (full answer text, seconds from `started` to the first audio or None).
+    `metrics` (a RouteMetrics) gets "first_audio" and "answer_done" samples.
+    """
+    started = started or time.perf_counter()
+    sentences = queue.Queue()
+    first_audio = []
+
+    def speaker():
+        while True:
+            sentence = sentences.get()
+            if sentence is None:
+                return
+            if is_active and not is_active():
+                continue  # Visitor left: drain without speaking
+            if not first_audio:
+                first_audio.append(time.perf_counter() - started)
+            speak(sentence)
+
+    worker = threading.Thread(target=speaker, daemon=True)
+    worker.start()
+
+    text = ""
+    last_subtitle = 0.0
+
+    def streamed():
+        nonlocal text, last_subtitle
+        for piece in pieces:
+            text = strip_answer_prefix(text + piece)
+            now = time.perf_counter()
+            if subtitle_callback and text.strip() and now - last_subtitle >= SUBTITLE_INTERVAL:
+                subtitle_callback(text.strip())
+                last_subtitle = now
+            yield piece
+            if is_active and not is_active():
+                return
+
+    try:
+        for i, sentence in enumerate(split_sentences(streamed())):
+            if i == 0:
+                sentence = strip_answer_prefix(sentence)
+            sentences.put(sentence)
+    finally:
+        sentences.put(None)
+        if subtitle_callback:
+            subtitle_callback(text.strip())
+        worker.join()
+
+    ttfa = first_audio[0] if first_audio else None
+    if metrics is not None:
+        if ttfa is not None:
+            metrics.record("first_audio", ttfa)
+        metrics.record("answer_done", time.perf_counter() - started)
+    return text.strip(), ttfa
@@ -0,0 +1,318 @@
+"""
+Offline streaming speech-to-text.
+Audio is read in 30 ms frames. An energy VAD finds the start and end of the
+visitor's phrase, and faster-whisper (CTranslate2, int8 on CPU) transcribes it
+on the kiosk, without the Google round trip.
+
+While the visitor speaks, the phrase so far is re-decoded in the background
+every `partial_interval_s` seconds. The interaction loop gets each result as a
+partial transcript. A decode is also started once the visitor has been silent
+for EARLY_FINAL_S. At the endpoint (`endpoint_ms` of silence), that decode
+already covers the whole phrase, so the final transcript usually needs no
+extra work.
+
+Frames come from the microphone (sounddevice) or from a WAV file
+(wav_frames), so the same path can be tested offline: python test_stt.py file.wav
+"""
+
+import time
+import wave
+import queue
+import threading
+from collections import deque, namedtuple
+
+import numpy as np
+
+from modules.settings import load_settings
+
+SAMPLE_RATE = 16000          # Whisper's input rate
+FRAME_MS = 30
+FRAME_SAMPLES = SAMPLE_RATE * FRAME_MS // 1000
+FRAME_S = FRAME_MS / 1000.0
+PREROLL_S = 0.3              # Audio kept from before the VAD fired (soft word onsets)
+EARLY_FINAL_S = 0.15         # Silence after which the "final" decode starts, before the endpoint is certain
+
+DEFAULT_STT_SETTINGS = {
+    "engine": "whisper",          # whisper (offline, streaming) | google (recognize_google, needs internet)
+    "model": "tiny.en",           # faster-whisper model name or local CTranslate2 model directory
+    "compute_type": "int8",
+    "cpu_threads": 2,
+    "beam_size": 1,
+    "partial_interval_s": 0.5,    # Re-decode the phrase so far this often while the visitor speaks
+    "endpoint_ms": 400,           # Trailing silence that ends the phrase
+    "min_speech_ms": 250,         # Shorter voiced bursts (door slam, cough) are ignored
+    "max_phrase_s": 15,
+    "vad_ratio": 3.0,             # Speech = frame RMS above noise floor * ratio ...
+    "vad_min_rms": 300,           # ... and above this absolute level (int16 samples)
+    "device": None,               # sounddevice input device; None = system default
+}
+
+# One recognised phrase. Times are seconds of audio; final_ms is the wall time from the endpoint to the text.
+Utterance = namedtuple("Utterance", "text speech_start_s speech_end_s endpoint_s final_ms partials")
+
+
+class EnergyVAD:
+    """
+    Frame-level voice activity from RMS energy over an adaptive noise floor.
+    The first frames calibrate the floor (like adjust_for_ambient_noise); after
+    that it follows slow changes in background noise during non-speech.
+    """
+
+    def __init__(self, ratio=3.0, min_rms=300.0, calibration_frames=10):
+        self.ratio = float(ratio)
+        self.min_rms = float(min_rms)
+        self.calibration_frames = calibration_frames
+        self.seen = 0
+        self.floor = 0.0
+
+    def threshold(self):
+        return max(self.min_rms, self.floor * self.ratio)
+
+    def is_speech(self, frame):
+        rms = float(np.sqrt(np.mean(np.square(frame.astype(np.float32))))) if len(frame) else 0.0
+        self.seen += 1
+        if self.seen <= self.calibration_frames:
+            self.floor += (rms - self.floor) / self.seen   # Running mean
+            return False
+        speech = rms > self.threshold()
+        if not speech:
+            self.floor = 0.95 * self.floor + 0.05 * rms
+        return speech
+
+
+# ---------- audio sources ----------
+def _to_frames(samples):
+    for start in range(0, len(samples) - FRAME_SAMPLES + 1, FRAME_SAMPLES):
+        yield samples[start:start + FRAME_SAMPLES]
+
+
+def read_wav(path):
+    """A 16-bit WAV file as 16 kHz mono int16 samples (other rates are resampled, channels averaged)."""
+    with wave.open(path, "rb") as wav:
+        if wav.getsampwidth() != 2:
+            raise ValueError(f"{path}: only 16-bit PCM WAV files are supported")
+        rate, channels = wav.getframerate(), wav.getnchannels()
+        samples = np.frombuffer(wav.readframes(wav.getnframes()), dtype=np.int16)
+    if channels > 1:
+        samples = samples.reshape(-1, channels).mean(axis=1)
+    if rate != SAMPLE_RATE and len(samples):
+        positions = np.arange(int(len(samples) * SAMPLE_RATE / rate)) * (rate / SAMPLE_RATE)
+        samples = np.interp(positions, np.arange(len(samples)), samples)
+    return samples.astype(np.int16)
+
+
+def wav_frames(path, realtime=False, tail_silence_s=1.0):
+    """
+    Frames of a WAV file, followed by `tail_silence_s` of silence so a phrase that
+    runs to the end of the file still reaches its endpoint. `realtime` paces the
+    frames like a microphone would; otherwise they are produced as fast as they are read.
+    """
+    samples = read_wav(path)
+    samples = np.concatenate([samples, np.zeros(int(tail_silence_s * SAMPLE_RATE), dtype=np.int16)])
+    started = time.perf_counter()
+    for i, frame in enumerate(_to_frames(samples)):
+        if realtime:
+            delay = started + i * FRAME_S - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        yield frame
+
+
+def microphone_frames(device=None):
+    """Live microphone frames. The input stream is closed when the generator is closed."""
+    import sounddevice as sd
+
+    frames = queue.Queue()
+
+    def _callback(data, count, time_info, status):
+        frames.put(np.frombuffer(data, dtype=np.int16).copy())
+
+    with sd.RawInputStream(samplerate=SAMPLE_RATE, channels=1, dtype="int16", blocksize=FRAME_SAMPLES,
+                           device=device, callback=_callback):
+        while True:
+            yield frames.get()
+
+
+# ---------- decoding ----------
+class _PhraseDecoder:
+    """
+    Decodes the phrase so far on its own thread, one job at a time, so reading audio
+    never waits for the model. Submissions made while a decode is running are
+    dropped; the next interval brings a longer buffer anyway.
+    """
+
+    def __init__(self, decode, on_partial=None):
+        self.decode = decode
+        self.on_partial = on_partial
+        self.cond = threading.Condition()
+        self.job = None          # (audio, covers_s)
+        self.busy = False
+        self.latest = None       # (covers_s, text) of the last finished decode
+        self.partials = 0
+        self.closed = False
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def submit(self, audio, covers_s):
+        with self.cond:
+            if self.busy or self.job is not None:
+                return False
+            self.job = (audio, covers_s)
+            self.cond.notify_all()
+            return True
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while self.job is None and not self.closed:
+                    self.cond.wait()
+                if self.closed:
+                    return
+                audio, covers_s = self.job
+                self.job, self.busy = None, True
+            try:
+                text = self.decode(audio)
+            except Exception as e:
+                print(f"!!! [STT] Partial decode failed: {e}")
+                text = None
+            with self.cond:
+                self.busy = False
+                if text is not None:
+                    self.latest = (covers_s, text)
+                    self.partials += 1
+                self.cond.notify_all()
+            if text and self.on_partial is not None and not self.closed:
+                try:
+                    self.on_partial(text)
+                except Exception as e:
+                    print(f"!!! [STT] Partial callback error: {e}")
+
+    def covering(self, speech_end_s):
+        """Waits for the running decode, then returns its text if it heard the phrase up to `speech_end_s`."""
+        with self.cond:
+            while self.busy or self.job is not None:
+                self.cond.wait()
+            if self.latest is not None and self.latest[0] >= speech_end_s:
+                return self.latest[1]
+            return None
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+
+class StreamingSTT:
+    def __init__(self, config=None):
+        self.config = config if config is not None else load_settings("stt", DEFAULT_STT_SETTINGS)
+        from faster_whisper import WhisperModel
+
+        print(f">>> [STT] Loading faster-whisper '{self.config['model']}' ({self.config['compute_type']})...")
+        self.model = WhisperModel(self.config["model"], device="cpu", compute_type=self.config["compute_type"],
+                                  cpu_threads=int(self.config["cpu_threads"]))
+        self.lock = threading.Lock()   # One decode at a time; CTranslate2 already uses cpu_threads
+        self.final_ms = deque(maxlen=100)
+        self.counts = {"phrases": 0, "timeouts": 0, "partials": 0, "reused_partial": 0}
+        print(f"✅ [STT] Streaming STT ready (endpoint {self.config['endpoint_ms']} ms)")
+
+    def transcribe(self, samples):
+        """Text of a whole int16 buffer."""
+        audio = samples.astype(np.float32) / 32768.0
+        with self.lock:
+            segments, _ = self.model.transcribe(
+                audio, language="en", beam_size=int(self.config["beam_size"]), without_timestamps=True,
+                condition_on_previous_text=False, vad_filter=False,
+            )
+            return " ".join(segment.text.strip() for segment in segments).strip()
+
+    def listen(self, frames, timeout=7, on_partial=None, is_active=None):
+        """
+        Reads `frames` until the visitor finishes a phrase. Returns an Utterance, or
+        None if nobody spoke within `timeout` seconds (or `is_active` turned false).
+        `on_partial(text)` is called with each partial transcript.
+        """
+        config = self.config
+        endpoint_s = config["endpoint_ms"] / 1000.0
+        min_speech_s = config["min_speech_ms"] / 1000.0
+        interval_s = float(config["partial_interval_s"])
+        vad = EnergyVAD(config["vad_ratio"], config["vad_min_rms"])
+        preroll = deque(maxlen=max(1, int(PREROLL_S / FRAME_S)))
+        decoder = _PhraseDecoder(self.transcribe, on_partial)
+
+        t, count = 0.0, 0
+        phrase, speech_start, last_voice, voiced, last_submit = [], None, None, 0.0, 0.0
+        try:
+            for frame in frames:
+                count += 1
+                t = count * FRAME_S
+                speech = vad.is_speech(frame)
+                if speech_start is None:
+                    preroll.append(frame)
+                    if speech:
+                        phrase, speech_start, last_voice, voiced, last_submit = list(preroll), t, t, FRAME_S, t
+                    elif t >= timeout:
+                        break
+                    elif is_active is not None and count % 10 == 0 and not is_active():
+                        return None
+                    continue
+
+                phrase.append(frame)
+                if speech:
+                    last_voice = t
+                    voiced += FRAME_S
+                silence = t - last_voice
+                if silence >= endpoint_s:
+                    if voiced >= min_speech_s:
+                        break
+                    # Only a short burst: back to waiting, keeping the tail as pre-roll
+                    preroll.extend(phrase)
+                    speech_start, phrase = None, []
+                    continue
+                if t - speech_start >= config["max_phrase_s"]:
+                    break
+                if voiced >= min_speech_s and (t - last_submit >= interval_s or
+                                               (silence >= EARLY_FINAL_S and last_submit < last_voice)):
+                    if decoder.submit(np.concatenate(phrase), t):
+                        last_submit = t
+            if speech_start is None:
+                self.counts["timeouts"] += 1
+                return None
+
+            endpoint_at = time.perf_counter()
+            text = decoder.covering(last_voice)
+            if text is not None:
+                self.counts["reused_partial"] += 1
+            else:
+                text = self.transcribe(np.concatenate(phrase))
+            final_ms = (time.perf_counter() - endpoint_at) * 1000.0
+            self.final_ms.append(final_ms)
+            self.counts["phrases"] += 1
+            self.counts["partials"] += decoder.partials
+            return Utterance(text, speech_start - FRAME_S, last_voice, t, final_ms, decoder.partials)
+        finally:
+            decoder.close()
+            if hasattr(frames, "close"):
+                frames.close()   # Releases the microphone
+
+    def listen_microphone(self, timeout=7, on_partial=None, is_active=None):
+        return self.listen(microphone_frames(self.config.get("device")), timeout, on_partial, is_active)
+
+    def stats(self):
+        report = {"model": self.config["model"], **self.counts}
+        if self.final_ms:
+            ordered = sorted(self.final_ms)
+            report["final_ms_p50"] = ordered[len(ordered) // 2]
+            report["final_ms_max"] = ordered[-1]
+        return report
+
+
+# Global instance, created on first use (see engines.EngineRegistry)
+_stt = None
+_stt_lock = threading.Lock()
+
+
+def get_stt():
+    global _stt
+    with _stt_lock:
+        if _stt is None:
+            _stt = StreamingSTT()
+        return _stt
@@ -41,11 +41,12 @@ class TTSEngine:
         else:
             print("!!! [TTS] Engine not available.")
 
-# Global instance for easy access
-tts_engine = TTSEngine()
+def get_tts():
+    """The shared TTSEngine. The first call initializes pyttsx3 (see engines.EngineRegistry)."""
+    return TTSEngine()
 
 def speak(text):
-    tts_engine.speak(text)
+    get_tts().speak(text)
 
 if __name__ == "__main__":
     speak("Hello, this is a test of the Adorix text to speech engine.")
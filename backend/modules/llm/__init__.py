@@ -0,0 +1,6 @@
+from .brain import BrainEngine, SYSTEM_PROMPT, DEFAULT_BRAIN_SETTINGS
+from .worker import BrainProcess, CacheRelay
+from .client import BrainClient
+from .backends import GenerationBackend, TransformersBackend, LlamaCppBackend, create_backend, BACKENDS
+from .kv_cache import PrefixKVCache, kv_nbytes
+from .batching import ContinuousBatcher
@@ -0,0 +1,429 @@
+"""
+Generation backends for BrainEngine.
+Each backend turns chat messages into a prompt, keeps reusable prompt prefixes
+warm and streams generated text. Heavy libraries are imported on load(), so
+only the configured backend's dependencies need to be installed.
+
+  transformers : HF model (fp32 on CPU by default, or int8 / bf16 linear layers), prefix KV cache in PrefixKVCache
+  llama_cpp    : quantized GGUF through llama-cpp-python, prefix states in LlamaRAMCache
+"""
+
+import os
+import copy
+import time
+import queue
+import hashlib
+import warnings
+import threading
+from contextlib import nullcontext
+
+from .kv_cache import PrefixKVCache
+
+# Used when a GGUF file carries no chat template (TinyLlama chat uses the Zephyr format)
+ZEPHYR_TEMPLATE = "<|system|>\n{system}</s>\n<|user|>\n{user}</s>\n<|assistant|>\n"
+
+# The streamer wakes up this often to check that generate() is still running
+STREAM_POLL_S = 1.0
+
+# Quantized checkpoints (dtype: int8) are saved here, relative to backend/, so later starts skip quantizing
+QUANTIZED_CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                                   ".model_cache")
+
+
+def cpu_supports_bf16():
+    """True when the CPU has native bf16 matmul instructions (AVX512-BF16 or AMX); otherwise bf16 is emulated."""
+    try:
+        with open("/proc/cpuinfo", "r") as f:
+            flags = f.read()
+    except OSError:
+        return False
+    return "avx512_bf16" in flags or "amx_bf16" in flags
+
+
+class GenerationBackend:
+    """Interface shared by the backends. `stream()` must be safe to call from any thread."""
+
+    name = "base"
+
+    def __init__(self, config):
+        self.config = config
+        self.lock = threading.Lock()   # One generation at a time per model
+        # Entered by every thread while it runs the model; ResourceManager.attach_brain sets the "llm" placement
+        self.placement = nullcontext
+
+    def load(self):
+        raise NotImplementedError
+
+    def render(self, messages):
+        """Chat messages -> prompt text in the model's template."""
+        raise NotImplementedError
+
+    def prefill(self, prefix):
+        """Precomputes the model state for a prompt prefix so later prompts can skip it."""
+
+    def set_threads(self, threads):
+        """Changes the generation thread count. Backends that fix it at load time ignore this."""
+
+    def stream(self, prompt, max_new_tokens=80, prefix=None, cancel=None, deadline=None):
+        """
+        Yields generated text pieces. `prefix` names a prefilled part the prompt starts with.
+        Setting the `cancel` event (or closing the generator) stops generation at the next token,
+        as does passing the `deadline` (a time.perf_counter() value).
+        Decoding is greedy when config["greedy"] is set, sampled at low temperature otherwise.
+        """
+        raise NotImplementedError
+
+    def enable_batching(self, max_batch=8):
+        """Lets concurrent stream() calls share forward passes. Backends that cannot just keep taking turns."""
+        print(f"!!! [Brain] The {self.name} backend has no continuous batching; requests run one at a time.")
+        return None
+
+    def generate_batch(self, prompts, max_new_tokens=80):
+        """Greedy answers for several prompts (offline jobs). Backends without batching run them in turn."""
+        return ["".join(self.stream(prompt, max_new_tokens=max_new_tokens)) for prompt in prompts]
+
+    def stats(self):
+        return {"backend": self.name}
+
+
+class TransformersBackend(GenerationBackend):
+    name = "transformers"
+
+    def _resolve_dtype(self):
+        """
+        settings dtype -> float32 | float16 | bfloat16 | int8.
+        fp16 matmuls are slow (or emulated) on most CPUs, so "auto" means fp32 there.
+        int8 (dynamic quantization) is CPU-only; bf16 is only worth it with native support.
+        """
+        torch = self.torch
+        dtype = self.config.get("dtype", "auto")
+        if dtype == "auto":
+            return "float16" if torch.cuda.is_available() else "float32"
+        if dtype == "int8" and torch.cuda.is_available():
+            print("!!! [Brain] int8 dynamic quantization runs on CPU only; using float16 on the GPU.")
+            return "float16"
+        if dtype == "bfloat16" and not torch.cuda.is_available() and not cpu_supports_bf16():
+            print("!!! [Brain] This CPU has no native bf16; using float32.")
+            return "float32"
+        return dtype
+
+    def _pin_threads(self):
+        """Fixed intra-op thread count (settings threads; 0 = torch default) and no inter-op pool."""
+        torch = self.torch
+        threads = int(self.config.get("threads") or 0)
+        if threads > 0:
+            torch.set_num_threads(threads)
+        self.threads = torch.get_num_threads()
+        try:
+            torch.set_num_interop_threads(1)   # Generation is one op after another; a second pool only competes
+        except RuntimeError:
+            pass   # Already fixed once parallel work has run in this process
+
+    def set_threads(self, threads):
+        # torch's OpenMP thread count is per calling thread, so generating threads re-apply self.threads
+        if threads > 0:
+            self.threads = int(threads)
+
+    def _quantized_path(self, model_name):
+        import transformers
+        slug = model_name.strip("/").replace("/", "--")
+        return os.path.join(QUANTIZED_CACHE_DIR,
+                            f"{slug}-int8-torch{self.torch.__version__}-tf{transformers.__version__}.pt")
+
+    def _load_int8(self, model_name):
+        """
+        fp32 model with every nn.Linear dynamically quantized to int8 (weights int8,
+        activations quantized per batch). The quantized module is saved once and
+        loaded directly afterwards; the file name pins the torch/transformers versions.
+        """
+        torch = self.torch
+        path = self._quantized_path(model_name)
+        if os.path.exists(path):
+            try:
+                model = torch.load(path, weights_only=False)   # Our own file: a pickled module
+                print(f">>> [Brain] Loaded quantized checkpoint {os.path.basename(path)}")
+                return model.eval()
+            except Exception as e:
+                print(f"!!! [Brain] Ignoring unreadable quantized checkpoint: {e}")
+
+        from transformers import AutoModelForCausalLM
+        start = time.perf_counter()
+        model = AutoModelForCausalLM.from_pretrained(model_name, dtype=torch.float32, low_cpu_mem_usage=True)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")   # torch.ao.quantization deprecation notices
+            model = torch.ao.quantization.quantize_dynamic(model.eval(), {torch.nn.Linear}, dtype=torch.qint8)
+        print(f">>> [Brain] Quantized linear layers to int8 in {time.perf_counter() - start:.1f}s")
+        try:
+            os.makedirs(QUANTIZED_CACHE_DIR, exist_ok=True)
+            tmp = path + ".tmp"
+            torch.save(model, tmp)
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f"!!! [Brain] Could not save quantized checkpoint: {e}")
+        return model
+
+    def load(self):
+        import torch
+        from transformers import pipeline, AutoTokenizer
+
+        self.torch = torch
+        self._pin_threads()
+        self.dtype = self._resolve_dtype()
+        model_name = self.config.get("model", "TinyLlama/TinyLlama-1.1B-Chat-v1.0")
+        if self.dtype == "int8":
+            self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+            self.model = self._load_int8(model_name)
+        else:
+            pipe = pipeline(
+                "text-generation",
+                model=model_name,
+                model_kwargs={
+                    "dtype": getattr(torch, self.dtype),
+                    "low_cpu_mem_usage": True,
+                },
+                device_map="auto"
+            )
+            self.tokenizer = pipe.tokenizer
+            self.model = pipe.model
+        self.prefix_cache = PrefixKVCache(int(self.config.get("prefix_cache_mb", 256)) * 1024 * 1024)
+        self.prefix_lock = threading.Lock()
+        self.batcher = None
+        return self
+
+    def enable_batching(self, max_batch=8):
+        """From now on stream() calls share decode steps (see batching.py) instead of taking turns."""
+        from .batching import ContinuousBatcher
+        if self.batcher is None:
+            self.batcher = ContinuousBatcher(self, max_batch)
+        return self.batcher
+
+    def render(self, messages):
+        # Use the chat template provided by the model tokenizer
+        return self.tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
+
+    def prefill(self, prefix):
+        key = hashlib.sha256(prefix.encode("utf-8")).hexdigest()
+        with self.prefix_lock:
+            if key in self.prefix_cache:
+                return
+            start = time.perf_counter()
+            prefix_ids = self.tokenizer(prefix, return_tensors="pt").input_ids.to(self.model.device)
+            with self.placement(), self.torch.no_grad():
+                out = self.model(input_ids=prefix_ids, use_cache=True)
+            self.prefix_cache.put(key, prefix_ids, out.past_key_values)
+        print(f">>> [Brain] Prefix cached: {prefix_ids.shape[1]} tokens in {time.perf_counter() - start:.2f}s "
+              f"({self.prefix_cache.stats()['mb']:.0f} MB cached)")
+
+    def _model_inputs(self, prompt, prefix):
+        """Prompt ids plus a private copy of the cached prefix KV, when the prompt starts with it."""
+        input_ids = self.tokenizer(prompt, return_tensors="pt").input_ids.to(self.model.device)
+        if not prefix:
+            return input_ids, None
+
+        key = hashlib.sha256(prefix.encode("utf-8")).hexdigest()
+        if key not in self.prefix_cache:
+            self.prefill(prefix)
+        entry = self.prefix_cache.get(key)
+        if entry is None:
+            return input_ids, None
+        prefix_ids, past = entry
+        n = prefix_ids.shape[1]
+        # Tokenization across the prefix/question boundary must agree, or the cache is not valid
+        if input_ids.shape[1] <= n or not self.torch.equal(input_ids[0, :n], prefix_ids[0]):
+            return input_ids, None
+        # generate() appends to the cache in place, so each call gets its own copy
+        return input_ids, copy.deepcopy(past)
+
+    def stream(self, prompt, max_new_tokens=80, prefix=None, cancel=None, deadline=None):
+        if self.batcher is not None:
+            yield from self.batcher.stream(prompt, max_new_tokens, prefix, cancel, deadline)
+            return
+        from transformers import TextIteratorStreamer, StoppingCriteria, StoppingCriteriaList
+
+        torch = self.torch
+        stop = threading.Event()   # Set when the consumer goes away
+
+        class Cancelled(StoppingCriteria):
+            """Checked by generate() after every token, so cancelling really stops the compute."""
+            def __call__(self, input_ids, scores, **kwargs):
+                done = stop.is_set() or (cancel is not None and cancel.is_set()) \
+                    or (deadline is not None and time.perf_counter() >= deadline)
+                return torch.full((input_ids.shape[0],), done, dtype=torch.bool, device=input_ids.device)
+
+        input_ids, past = self._model_inputs(prompt, prefix)
+        streamer = TextIteratorStreamer(self.tokenizer, skip_prompt=True, skip_special_tokens=True,
+                                        timeout=STREAM_POLL_S)
+        sampling = {"do_sample": False} if self.config.get("greedy") else {
+            "do_sample": True,
+            "temperature": 0.1,  # Even lower for consistency
+            "top_k": 50,
+            "top_p": 0.9,
+        }
+        kwargs = dict(
+            input_ids=input_ids,
+            attention_mask=self.torch.ones_like(input_ids),
+            past_key_values=past,
+            max_new_tokens=max_new_tokens,
+            **sampling,
+            streamer=streamer,
+            stopping_criteria=StoppingCriteriaList([Cancelled()]),
+            pad_token_id=self.tokenizer.eos_token_id,
+        )
+
+        errors = []
+
+        def run():
+            try:
+                # Spawned from the caller's thread, so it inherits the caller's cores and priority until here
+                with self.placement(), self.lock, self.torch.no_grad():
+                    torch.set_num_threads(self.threads)
+                    self.model.generate(**kwargs)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                streamer.end()   # Without the end signal the consumer below would wait forever
+
+        worker = threading.Thread(target=run, daemon=True)
+        worker.start()
+        try:
+            while True:
+                try:
+                    text = next(streamer)
+                except StopIteration:
+                    break
+                except queue.Empty:
+                    if worker.is_alive():
+                        continue   # Slow step (e.g. a long prompt), still generating
+                    break
+                yield text
+        finally:
+            stop.set()
+            worker.join()
+        if errors:
+            raise errors[0]
+
+    def generate_batch(self, prompts, max_new_tokens=80):
+        tokenizer = self.tokenizer
+        with self.lock, self.torch.no_grad():
+            # Decoder-only models need left padding so every prompt ends where generation starts
+            padding_side, tokenizer.padding_side = tokenizer.padding_side, "left"
+            try:
+                if tokenizer.pad_token is None:
+                    tokenizer.pad_token = tokenizer.eos_token
+                batch = tokenizer(prompts, return_tensors="pt", padding=True).to(self.model.device)
+                out = self.model.generate(
+                    **batch,
+                    max_new_tokens=max_new_tokens,
+                    do_sample=False,
+                    pad_token_id=tokenizer.pad_token_id,
+                )
+            finally:
+                tokenizer.padding_side = padding_side
+        return tokenizer.batch_decode(out[:, batch["input_ids"].shape[1]:], skip_special_tokens=True)
+
+    def stats(self):
+        report = {"backend": self.name, "dtype": self.dtype, "threads": self.threads,
+                  "prefix_cache": self.prefix_cache.stats()}
+        if self.batcher is not None:
+            report["batching"] = self.batcher.stats()
+        return report
+
+
+class LlamaCppBackend(GenerationBackend):
+    name = "llama_cpp"
+
+    def _model_path(self):
+        """Local GGUF from `gguf_file`, else the `quantization` variant from `gguf_repo` (downloaded once)."""
+        path = self.config.get("gguf_file")
+        if path:
+            return path
+        from huggingface_hub import hf_hub_download, list_repo_files
+
+        repo = self.config.get("gguf_repo", "TheBloke/TinyLlama-1.1B-Chat-v1.0-GGUF")
+        quant = self.config.get("quantization", "Q4_K_M")
+        matches = [f for f in list_repo_files(repo) if f.endswith(f"{quant}.gguf")]
+        if not matches:
+            raise FileNotFoundError(f"No {quant} GGUF in {repo}")
+        return hf_hub_download(repo, matches[0])
+
+    def load(self):
+        from llama_cpp import Llama, LlamaRAMCache
+
+        path = self._model_path()
+        threads = int(self.config.get("threads") or 0) or None
+        self.llm = Llama(
+            model_path=path,
+            n_ctx=int(self.config.get("n_ctx", 2048)),
+            n_threads=threads,
+            verbose=False,
+        )
+        # Prompt states keyed by tokens; a prompt resumes from its longest cached prefix
+        self.llm.set_cache(LlamaRAMCache(capacity_bytes=int(self.config.get("prefix_cache_mb", 256)) * 1024 * 1024))
+        self.prefixes = set()
+        self.model_file = os.path.basename(path)
+
+        self.formatter = None
+        template = self.llm.metadata.get("tokenizer.chat_template")
+        if template:
+            from llama_cpp.llama_chat_format import Jinja2ChatFormatter
+            self.formatter = Jinja2ChatFormatter(template, eos_token="</s>", bos_token="")
+        return self
+
+    def render(self, messages):
+        if self.formatter is not None:
+            return self.formatter(messages=messages).prompt
+        system = next((m["content"] for m in messages if m["role"] == "system"), "")
+        user = next((m["content"] for m in messages if m["role"] == "user"), "")
+        return ZEPHYR_TEMPLATE.format(system=system, user=user)
+
+    def _tokens(self, text):
+        return self.llm.tokenize(text.encode("utf-8"), add_bos=True, special=True)
+
+    def prefill(self, prefix):
+        key = hashlib.sha256(prefix.encode("utf-8")).hexdigest()
+        if key in self.prefixes:
+            return
+        start = time.perf_counter()
+        tokens = self._tokens(prefix)
+        with self.placement(), self.lock:
+            self.llm.reset()
+            self.llm.eval(tokens)
+            self.llm.cache[tokens] = self.llm.save_state()
+        self.prefixes.add(key)
+        print(f">>> [Brain] Prefix cached: {len(tokens)} tokens in {time.perf_counter() - start:.2f}s")
+
+    def stream(self, prompt, max_new_tokens=80, prefix=None, cancel=None, deadline=None):
+        if prefix:
+            self.prefill(prefix)
+        # temperature 0 makes llama.cpp pick the most likely token
+        sampling = {"temperature": 0.0} if self.config.get("greedy") else {"temperature": 0.1, "top_k": 50, "top_p": 0.9}
+        # llama.cpp evaluates on the consuming thread: move it to the LLM's cores while it does
+        with self.placement(), self.lock:
+            for chunk in self.llm.create_completion(
+                prompt,
+                max_tokens=max_new_tokens,
+                stop=["</s>"],
+                stream=True,
+                **sampling,
+            ):
+                # Leaving the loop closes create_completion(), which stops evaluating tokens
+                if (cancel is not None and cancel.is_set()) or (deadline is not None and time.perf_counter() >= deadline):
+                    break
+                yield chunk["choices"][0]["text"]
+
+    def stats(self):
+        return {"backend": self.name, "model": self.model_file, "prefixes": len(self.prefixes)}
+
+
+BACKENDS = {
+    TransformersBackend.name: TransformersBackend,
+    LlamaCppBackend.name: LlamaCppBackend,
+}
+
+
+def create_backend(config):
+    """Instantiates and loads the backend named by config["backend"]."""
+    name = config.get("backend", "transformers")
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown brain backend '{name}' (choose from {', '.join(BACKENDS)})")
+    return BACKENDS[name](config).load()
@@ -0,0 +1,220 @@
+"""
+Continuous batching for the transformers backend.
+Concurrent stream() calls are decoded together: every step runs ONE forward
+pass for all active requests (one new token each). New requests are prefilled
+and join the batch between steps; finished, cancelled or timed-out requests
+leave it between steps, so nobody waits for the longest answer in a batch.
+
+The batch keeps a single left-padded KV cache plus an attention mask; explicit
+position ids keep each row's positions independent of the padding.
+"""
+
+import time
+import queue
+import threading
+
+
+def _layers(cache):
+    """[(keys, values)] per layer of a transformers KV cache (DynamicCache or legacy tuples)."""
+    return [(layer[0], layer[1]) for layer in cache]
+
+
+def _make_cache(layers, config):
+    from transformers import DynamicCache
+    if hasattr(DynamicCache, "from_legacy_cache"):
+        return DynamicCache.from_legacy_cache(tuple(layers))
+    return DynamicCache(ddp_cache_data=layers, config=config)
+
+
+class BatchRequest:
+    """One stream() call inside the batcher. The scheduler pushes text pieces (then None) onto `out`."""
+
+    def __init__(self, prompt, max_new_tokens, prefix, cancel, deadline):
+        self.prompt = prompt
+        self.prefix = prefix
+        self.max_new_tokens = max_new_tokens
+        self.cancel = cancel
+        self.abandoned = threading.Event()   # Set when the consumer stops reading
+        self.deadline = deadline
+        self.out = queue.Queue()
+        self.tokens = []
+        self.sent = 0   # Characters of the decoded answer already pushed to `out`
+
+    def stopped(self):
+        return self.abandoned.is_set() or (self.cancel is not None and self.cancel.is_set()) \
+            or (self.deadline is not None and time.perf_counter() >= self.deadline)
+
+
+class ContinuousBatcher:
+    """Runs the decode loop for a loaded TransformersBackend on one scheduler thread."""
+
+    def __init__(self, backend, max_batch=8):
+        self.backend = backend
+        self.torch = backend.torch
+        self.model = backend.model
+        self.tokenizer = backend.tokenizer
+        self.max_batch = int(max_batch)
+        self.waiting = queue.Queue()
+        self.rows = []          # Active BatchRequests, in cache row order
+        self.cache = None
+        self.mask = None        # (rows, cache length) 1 = real token, 0 = left padding
+        self.next_ids = None    # (rows, 1) token each row feeds into the next step
+        self.steps = 0
+        self.batched_tokens = 0
+        self.peak_batch = 0
+        self.completed = 0
+        threading.Thread(target=self._loop, daemon=True, name="continuous-batcher").start()
+
+    def stream(self, prompt, max_new_tokens=80, prefix=None, cancel=None, deadline=None):
+        """Same contract as GenerationBackend.stream(); closing the generator cancels the request."""
+        request = BatchRequest(prompt, max_new_tokens, prefix, cancel, deadline)
+        self.waiting.put(request)
+        try:
+            while True:
+                text = request.out.get()
+                if text is None:
+                    return
+                yield text
+        finally:
+            request.abandoned.set()
+
+    # ---------- scheduler ----------
+    def _loop(self):
+        while True:
+            if not self.rows:
+                self._admit(self.waiting.get())   # Idle: block until work arrives
+            if self.torch.get_num_threads() != self.backend.threads:
+                self.torch.set_num_threads(self.backend.threads)   # Per thread: pick up set_threads()
+            while len(self.rows) < self.max_batch:
+                try:
+                    self._admit(self.waiting.get_nowait())
+                except queue.Empty:
+                    break
+            if self.rows:
+                try:
+                    self._step()
+                except Exception as e:
+                    print(f"!!! [Batcher] Decode step failed: {e}")
+                    for request in self.rows:
+                        request.out.put(None)
+                    self.rows = []
+                    self.cache = self.mask = self.next_ids = None
+
+    def _sample(self, logits):
+        """(rows, vocab) logits -> (rows,) token ids, greedy or like the backend's sampled settings."""
+        torch = self.torch
+        if self.backend.config.get("greedy"):
+            return logits.argmax(dim=-1)
+        logits = logits / 0.1
+        top = torch.topk(logits, min(50, logits.shape[-1]), dim=-1)
+        probs = torch.softmax(top.values, dim=-1)
+        cumulative = probs.cumsum(dim=-1)
+        probs[(cumulative - probs) > 0.9] = 0.0   # top_p 0.9
+        choice = torch.multinomial(probs / probs.sum(dim=-1, keepdim=True), 1)
+        return top.indices.gather(-1, choice).squeeze(-1)
+
+    def _admit(self, request):
+        """Prefills one request (reusing its cached prefix) and adds it as a new batch row."""
+        if request.stopped():
+            request.out.put(None)
+            return
+        torch = self.torch
+        try:
+            with self.backend.lock, torch.no_grad():
+                input_ids, past = self.backend._model_inputs(request.prompt, request.prefix)
+                done = past.get_seq_length() if past is not None else 0
+                out = self.model(input_ids=input_ids[:, done:], past_key_values=past, use_cache=True)
+        except Exception as e:
+            print(f"!!! [Batcher] Prefill failed: {e}")
+            request.out.put(None)
+            return
+
+        layers = _layers(out.past_key_values)
+        mask = torch.ones((1, input_ids.shape[1]), dtype=torch.long, device=input_ids.device)
+        first = self._sample(out.logits[:, -1, :]).view(1, 1)
+        if self.cache is None:
+            self.cache, self.mask, self.next_ids = layers, mask, first
+        else:
+            # Left-pad whichever side is shorter so both caches end at the same column
+            length = max(self.mask.shape[1], mask.shape[1])
+            batch = self._pad(self.cache, self.mask, length)
+            new = self._pad(layers, mask, length)
+            self.cache = [(torch.cat([k1, k2]), torch.cat([v1, v2])) for (k1, v1), (k2, v2) in zip(batch[0], new[0])]
+            self.mask = torch.cat([batch[1], new[1]])
+            self.next_ids = torch.cat([self.next_ids, first])
+        self.rows.append(request)
+        self.peak_batch = max(self.peak_batch, len(self.rows))
+        self._emit(request, int(first[0, 0]))
+
+    def _pad(self, layers, mask, length):
+        extra = length - mask.shape[1]
+        if extra == 0:
+            return layers, mask
+        torch = self.torch
+        padded = []
+        for k, v in layers:
+            pad = k.new_zeros(k.shape[:2] + (extra,) + k.shape[3:])
+            padded.append((torch.cat([pad, k], dim=2), torch.cat([pad, v], dim=2)))
+        return padded, torch.cat([mask.new_zeros((mask.shape[0], extra)), mask], dim=1)
+
+    def _emit(self, request, token):
+        """Records a generated token and pushes any newly completed text to the consumer."""
+        request.tokens.append(token)
+        text = self.tokenizer.decode(request.tokens, skip_special_tokens=True)
+        if text.endswith("�"):
+            return   # Half of a multi-byte character; wait for the rest
+        if len(text) > request.sent:
+            request.out.put(text[request.sent:])
+            request.sent = len(text)
+
+    def _finished(self, request):
+        return request.stopped() or len(request.tokens) >= request.max_new_tokens \
+            or request.tokens[-1] == self.tokenizer.eos_token_id
+
+    def _step(self):
+        torch = self.torch
+        self._retire()
+        if not self.rows:
+            return
+        mask = torch.cat([self.mask, self.mask.new_ones((self.mask.shape[0], 1))], dim=1)
+        positions = self.mask.sum(dim=1, keepdim=True)   # Real tokens so far = index of the new one
+        with self.backend.lock, torch.no_grad():
+            out = self.model(input_ids=self.next_ids, attention_mask=mask, position_ids=positions,
+                             past_key_values=_make_cache(self.cache, self.model.config), use_cache=True)
+        self.cache, self.mask = _layers(out.past_key_values), mask
+        self.next_ids = self._sample(out.logits[:, -1, :]).view(-1, 1)
+        self.steps += 1
+        self.batched_tokens += len(self.rows)
+        for request, token in zip(self.rows, self.next_ids[:, 0].tolist()):
+            self._emit(request, token)
+        self._retire()
+
+    def _retire(self):
+        """Drops finished rows from the batch and trims padding no remaining row needs."""
+        keep = [i for i, request in enumerate(self.rows) if not self._finished(request)]
+        if len(keep) == len(self.rows):
+            return
+        for i, request in enumerate(self.rows):
+            if i not in keep:
+                request.out.put(None)
+                self.completed += 1
+        self.rows = [self.rows[i] for i in keep]
+        if not self.rows:
+            self.cache = self.mask = self.next_ids = None
+            return
+        index = self.torch.tensor(keep, device=self.mask.device)
+        self.mask, self.next_ids = self.mask[index], self.next_ids[index]
+        start = int((self.mask.sum(dim=0) > 0).nonzero()[0])
+        self.mask = self.mask[:, start:]
+        self.cache = [(k[index][:, :, start:], v[index][:, :, start:]) for k, v in self.cache]
+
+    def stats(self):
+        return {
+            "max_batch": self.max_batch,
+            "active": len(self.rows),
+            "waiting": self.waiting.qsize(),
+            "peak_batch": self.peak_batch,
+            "steps": self.steps,
+            "mean_batch": self.batched_tokens / self.steps if self.steps else 0.0,
+            "completed": self.completed,
+        }
@@ -0,0 +1,297 @@
+import json
+import os
+import re
+import time
+import hashlib
+from collections import deque
+
+from .backends import create_backend
+from modules.settings import load_settings
+
+# Used when settings.yaml has no brain: section
+DEFAULT_BRAIN_SETTINGS = {
+    "backend": "transformers",
+    "model": "TinyLlama/TinyLlama-1.1B-Chat-v1.0",
+    "dtype": "auto",
+    "threads": 0,
+    "prefix_cache_mb": 256,
+    "max_new_tokens": 80,
+    "greedy": False,
+    "deadline_s": 0,       # 0 = no deadline
+    "max_sentences": 0,    # 0 = no sentence limit
+    "isolate": False,      # True = run in a worker process (worker.BrainProcess)
+    "service_url": "",     # Shared LLM service (llm_service.py); overrides isolate
+}
+
+SYSTEM_PROMPT = (
+    "You are Adorix, a friendly AI kiosk assistant. "
+    "Use ONLY the following context to answer the user's question. "
+    "Keep your response very short (1-2 sentences), conversational, and informative. "
+    "If the answer is not in the context, say 'I'm sorry, I don't have that information'."
+)
+
+# Stand-in question used to find where the per-question part of the prompt starts
+QUESTION_SENTINEL = "@@QUESTION@@"
+
+# A sentence ends at . ! or ? followed by whitespace, except after abbreviations like "Rs."
+SENTENCE_END = re.compile(r"(?<!\bRs\.)(?<!\bMr\.)(?<!\bDr\.)(?<!\bNo\.)(?<=[.!?])\s+")
+# Labels the LLM sometimes puts in front of its answer
+ANSWER_PREFIXES = ("Answer:", "Response:", "Adorix:")
+
+# Said when the deadline passes before the model has produced anything usable
+FALLBACK_REPLY = "I'm not sure about that one, but I'd be happy to tell you more about this product!"
+# A cut-off first sentence is still spoken if it has at least this many words
+MIN_PARTIAL_WORDS = 6
+
+
+def context_key(context):
+    """Cache key for a product context (BrainEngine caches answers per context, not per product name)."""
+    return hashlib.sha256(context.encode("utf-8")).hexdigest()[:16]
+
+
+def strip_answer_prefix(text):
+    for prefix in ANSWER_PREFIXES:
+        if text.startswith(prefix):
+            return text[len(prefix):].lstrip()
+    return text
+
+
+class BrainEngine:
+    def __init__(self, config=None):
+        """
+        Initializes the AI Brain (TinyLlama for RAG) on the backend chosen in
+        settings.yaml (brain: backend = transformers | llama_cpp).
+        """
+        self.config = dict(config) if config is not None else load_settings("brain", DEFAULT_BRAIN_SETTINGS)
+        print(f"🧠 [Brain] Loading AI Engine ({self.config.get('backend', 'transformers')} backend)...")
+        self.backend = create_backend(self.config)
+        print("✅ [Brain] AI Engine loaded successfully.")
+        # Optional AnswerCache (modules/qa/answer_cache.py), keyed on the context hash
+        self.cache = None
+        self.ttft = {"reuse": deque(maxlen=100), "full": deque(maxlen=100)}
+        self.latency = deque(maxlen=200)   # Seconds per generated answer
+        self.deadline_hits = 0
+
+    @staticmethod
+    def load_context_from_json(json_filename):
+        """
+        Loads product details from ad_engine/data and builds context.
+        Needs no model, so BrainProcess reuses it in the main process.
+        """
+        # Strip extension if provided (e.g., "ad_name.mp4" -> "ad_name")
+        json_filename = os.path.splitext(json_filename)[0]
+        json_filename += ".json"
+            
+        # Path: backend/modules/ad_engine/data/{json_filename}
+        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        json_path = os.path.join(base_dir, "ad_engine", "data", json_filename)
+        
+        try:
+            with open(json_path, 'r') as f:
+                data = json.load(f)
+                
+                # If there's a dedicated 'context' field, use it
+                if "context" in data:
+                    context = data["context"]
+                else:
+                    # Otherwise, build it from product_name, description, features, and faqs
+                    name = data.get("product_name", "this product")
+                    desc = data.get("description", "")
+                    features = ", ".join(data.get("key_features", []))
+                    
+                    faqs_list = []
+                    for q, a in data.get("faqs", {}).items():
+                        faqs_list.append(f"Q: {q.replace('_', ' ')}? A: {a}")
+                    faqs_str = " ".join(faqs_list)
+                    
+                    context = f"Product: {name}. Description: {desc}. Features: {features}. FAQs: {faqs_str}"
+
+                product_name = data.get("product_name", data.get("product", "this product"))
+                print(f">>> [Brain] Loaded knowledge for: {product_name}")
+                return context
+        except FileNotFoundError:
+            print(f"!!! [Brain] Error: Knowledge file {json_path} not found.")
+            return None
+        except Exception as e:
+            print(f"!!! [Brain] Error loading JSON: {e}")
+            return None
+
+    def set_threads(self, threads):
+        """Generation thread count (the resource manager changes it with the kiosk mode)."""
+        self.backend.set_threads(threads)
+
+    # ---------- prompt ----------
+    def _render_prompt(self, context, user_question):
+        messages = [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": f"Context: {context}\n\nQuestion: {user_question}"},
+        ]
+        return self.backend.render(messages)
+
+    def _prefix_text(self, context):
+        """Everything in the prompt before the question: system prompt and product context."""
+        return self._render_prompt(context, QUESTION_SENTINEL).split(QUESTION_SENTINEL)[0]
+
+    def prepare_prefix(self, context):
+        """
+        Prefills the prompt prefix for `context` so its model state can be reused.
+        Called when a personalized ad starts, so the first question is already warm.
+        """
+        if context:
+            self.backend.prefill(self._prefix_text(context))
+
+    # ---------- generation ----------
+    def _stream(self, context, user_question, max_new_tokens, reuse=True, cancel=None, deadline=None):
+        """Yields generated text and records time to first token."""
+        prompt = self._render_prompt(context, user_question)
+        prefix = self._prefix_text(context) if reuse else None
+        start = time.perf_counter()
+        first = True
+        for text in self.backend.stream(prompt, max_new_tokens=max_new_tokens, prefix=prefix,
+                                        cancel=cancel, deadline=deadline):
+            if first and text:
+                self.ttft["reuse" if reuse else "full"].append(time.perf_counter() - start)
+                first = False
+            yield text
+
+    def _answer_stream(self, context, user_question, cache_key, cancel=None):
+        """
+        Yields the answer and caches it when complete.
+
+        In bounded mode (settings.yaml brain: deadline_s / max_sentences) the
+        answer comes out in whole sentences. Generation stops after
+        `max_sentences` sentences or at the deadline. A deadline cut keeps the
+        finished sentences, else a long enough partial one, else FALLBACK_REPLY.
+        """
+        deadline_s = float(self.config.get("deadline_s") or 0)
+        max_sentences = int(self.config.get("max_sentences") or 0)
+        bounded = deadline_s > 0 or max_sentences > 0
+        start = time.perf_counter()
+        deadline = start + deadline_s if deadline_s > 0 else None
+
+        parts, buffer, sentences, capped = [], "", 0, False
+        for text in self._stream(context, user_question, int(self.config.get("max_new_tokens", 80)),
+                                 cancel=cancel, deadline=deadline):
+            if not bounded:
+                parts.append(text)
+                yield text
+                continue
+            buffer += text
+            pieces = SENTENCE_END.split(buffer)
+            buffer = pieces.pop()
+            for sentence in pieces:
+                parts.append(sentence + " ")
+                yield sentence + " "
+                sentences += 1
+            if max_sentences and sentences >= max_sentences:
+                buffer, capped = "", True
+                break  # Closing the backend stream stops generation
+
+        if cancel is not None and cancel.is_set():
+            print(f">>> [Brain] Generation cancelled after {time.perf_counter() - start:.2f}s")
+            return
+
+        # Stopping at max_sentences is not a deadline hit, even if the clock ran out meanwhile
+        timed_out = not capped and deadline is not None and time.perf_counter() >= deadline
+        tail = buffer.strip()
+        if timed_out:
+            self.deadline_hits += 1
+            if sentences == 0:
+                # Nothing finished in time: a substantial fragment beats silence, a stub does not
+                tail = tail.rstrip(",;:") + "." if len(tail.split()) >= MIN_PARTIAL_WORDS else FALLBACK_REPLY
+            else:
+                tail = ""  # Drop the half-written sentence after the finished ones
+        if tail:
+            parts.append(tail)
+            yield tail
+
+        elapsed = time.perf_counter() - start
+        self.latency.append(elapsed)
+        answer = strip_answer_prefix("".join(parts).strip())
+        print(f">>> [Brain] Answer generated in {elapsed:.2f}s" + (" (deadline)" if timed_out else ""))
+        if answer and self.cache is not None and not (timed_out and answer == FALLBACK_REPLY):
+            self.cache.put(cache_key, user_question, cache_key, answer, "llm")
+
+    def _cached(self, context, user_question):
+        """(cache key, cached answer or None)."""
+        key = context_key(context)
+        if self.cache is None:
+            return key, None
+        cached = self.cache.get(key, user_question, key)
+        if cached is not None:
+            print(">>> [Brain] Answer served from cache")
+        return key, cached
+
+    def stream_answer(self, user_question, context, cancel=None):
+        """
+        Like generate_answer, but yields the answer text as it is generated
+        (token by token, or sentence by sentence in bounded mode) so speech and
+        subtitles can start on the first sentence.
+        Setting the `cancel` event stops generation; a cancelled answer is not cached.
+        """
+        if not context:
+            yield "I'm sorry, I don't have enough information about that right now."
+            return
+        key, cached = self._cached(context, user_question)
+        if cached is not None:
+            yield cached
+            return
+        yield from self._answer_stream(context, user_question, key, cancel=cancel)
+
+    def generate_answer(self, user_question, context):
+        """
+        Generates a concise answer based ONLY on the provided context.
+        """
+        if not context:
+            return "I'm sorry, I don't have enough information about that right now."
+        key, cached = self._cached(context, user_question)
+        if cached is not None:
+            return cached
+
+        try:
+            # Only newly generated tokens are decoded, so no prompt text can leak into the answer
+            return strip_answer_prefix("".join(self._answer_stream(context, user_question, key)).strip())
+        except Exception as e:
+            print(f"!!! [Brain] Generation error: {e}")
+            return "I'm sorry, I encountered an error while thinking about your question."
+
+    def generate_batch(self, questions, context, batch_size=8, max_new_tokens=80):
+        """
+        Answers several questions about one context, `batch_size` prompts per
+        forward pass. Used offline (build_answer_bank.py); skips the answer cache.
+        """
+        answers = []
+        for i in range(0, len(questions), batch_size):
+            prompts = [self._render_prompt(context, q) for q in questions[i:i + batch_size]]
+            for answer in self.backend.generate_batch(prompts, max_new_tokens=max_new_tokens):
+                answers.append(strip_answer_prefix(answer.strip()))
+        return answers
+
+    def measure_ttft(self, user_question, context, runs=3):
+        """Time to first token with and without prefix reuse (median of `runs`)."""
+        self.prepare_prefix(context)
+        result = {}
+        for mode, reuse in (("full", False), ("reuse", True)):
+            samples = []
+            for _ in range(runs):
+                start = time.perf_counter()
+                for _text in self._stream(context, user_question, max_new_tokens=1, reuse=reuse):
+                    break
+                samples.append(time.perf_counter() - start)
+            samples.sort()
+            result[f"{mode}_ms"] = samples[len(samples) // 2] * 1000.0
+        result["speedup"] = result["full_ms"] / result["reuse_ms"] if result["reuse_ms"] else None
+        return result
+
+    def stats(self):
+        report = self.backend.stats()
+        for mode, samples in self.ttft.items():
+            ordered = sorted(samples)
+            report[f"ttft_{mode}_p50_ms"] = ordered[len(ordered) // 2] * 1000.0 if ordered else None
+        ordered = sorted(self.latency)
+        report["answer_p50_ms"] = ordered[len(ordered) // 2] * 1000.0 if ordered else None
+        report["answer_p95_ms"] = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000.0 if ordered else None
+        report["answers"] = len(ordered)
+        report["deadline_hits"] = self.deadline_hits
+        report["deadline_s"] = float(self.config.get("deadline_s") or 0)
+        return report
@@ -0,0 +1,115 @@
+"""
+Client for the shared LLM service (backend/llm_service.py).
+BrainClient has BrainEngine's interface, so a kiosk can use the service's
+model instead of loading its own (settings.yaml brain: service_url).
+"""
+
+import json
+import uuid
+import threading
+import urllib.request
+import urllib.error
+
+from .brain import BrainEngine, context_key, strip_answer_prefix
+
+
+class BrainClient:
+    """BrainEngine stand-in that streams answers from the shared LLM service over HTTP."""
+
+    load_context_from_json = staticmethod(BrainEngine.load_context_from_json)
+
+    def __init__(self, base_url, timeout=20.0):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = float(timeout)   # Longest silence allowed between two lines of an answer
+        self.cache = None
+        self.counts = {"requests": 0, "completed": 0, "cancelled": 0, "errors": 0}
+
+    def _post(self, path, payload, timeout=None):
+        request = urllib.request.Request(
+            f"{self.base_url}{path}",
+            data=json.dumps(payload).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+        )
+        return urllib.request.urlopen(request, timeout=timeout or self.timeout)
+
+    def _cancel_when_set(self, rid, cancel, done):
+        """Forwards the caller's cancel event to the service (the answer stream can only be read, not interrupted)."""
+        while not done.is_set():
+            if cancel.wait(0.05):
+                try:
+                    self._post(f"/v1/cancel/{rid}", {}, timeout=2.0).close()
+                except (urllib.error.URLError, OSError):
+                    pass
+                return
+
+    def prepare_prefix(self, context):
+        if not context:
+            return
+        try:
+            self._post("/v1/prefill", {"context": context}).close()
+        except (urllib.error.URLError, OSError) as e:
+            print(f"!!! [Brain] LLM service prefill failed: {e}")
+
+    def stream_answer(self, user_question, context, cancel=None):
+        """Yields answer text from the service. Setting `cancel` or abandoning the iterator cancels it there."""
+        if not context:
+            yield "I'm sorry, I don't have enough information about that right now."
+            return
+        if self.cache is not None:
+            key = context_key(context)
+            cached = self.cache.get(key, user_question, key)
+            if cached is not None:
+                print(">>> [Brain] Answer served from cache")
+                yield cached
+                return
+
+        rid = uuid.uuid4().hex
+        done = threading.Event()
+        if cancel is not None:
+            threading.Thread(target=self._cancel_when_set, args=(rid, cancel, done), daemon=True).start()
+        self.counts["requests"] += 1
+        finished = False
+        try:
+            with self._post("/v1/answer", {"id": rid, "question": user_question, "context": context}) as response:
+                for line in response:   # One JSON message per line, sent as soon as it is generated
+                    message = json.loads(line)
+                    if "text" in message:
+                        yield message["text"]
+                        continue
+                    finished = True
+                    if message.get("error"):
+                        self.counts["errors"] += 1
+                        print(f"!!! [Brain] LLM service error: {message['error']}")
+                    elif message.get("cancelled"):
+                        self.counts["cancelled"] += 1
+                    else:
+                        self.counts["completed"] += 1
+                        if message.get("cache") and self.cache is not None:
+                            self.cache.put(*message["cache"])
+                    return
+        except (urllib.error.URLError, OSError, ValueError) as e:
+            finished = True
+            self.counts["errors"] += 1
+            print(f"!!! [Brain] LLM service unreachable: {e}")
+        finally:
+            done.set()
+            if not finished:
+                # Consumer stopped reading: closing the connection alone may not reach the service in time
+                self.counts["cancelled"] += 1
+                try:
+                    self._post(f"/v1/cancel/{rid}", {}, timeout=2.0).close()
+                except (urllib.error.URLError, OSError):
+                    pass
+
+    def generate_answer(self, user_question, context):
+        answer = strip_answer_prefix("".join(self.stream_answer(user_question, context)).strip())
+        return answer or "I'm sorry, I encountered an error while thinking about your question."
+
+    def stats(self):
+        report = {"service_url": self.base_url, **self.counts}
+        try:
+            with urllib.request.urlopen(f"{self.base_url}/v1/stats", timeout=2.0) as response:
+                report["service"] = json.loads(response.read())
+        except (urllib.error.URLError, OSError, ValueError) as e:
+            report["service"] = f"unreachable: {e}"
+        return report
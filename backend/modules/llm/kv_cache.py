@@ -0,0 +1,74 @@
+import threading
+from collections import OrderedDict
+
+
+def kv_nbytes(past_key_values):
+    """Bytes held by a transformers KV cache (DynamicCache or legacy tuple-of-tuples)."""
+    if past_key_values is None:
+        return 0
+    if hasattr(past_key_values, "to_legacy_cache"):
+        past_key_values = past_key_values.to_legacy_cache()
+    total = 0
+    for layer in past_key_values:
+        for tensor in layer:
+            if tensor is not None:  # Newer DynamicCache layers carry an optional third slot
+                total += tensor.numel() * tensor.element_size()
+    return total
+
+
+class PrefixKVCache:
+    """
+    LRU of precomputed prompt-prefix KV caches, bounded by memory.
+    Each entry is keyed on the prefix text hash and holds the prefix token ids
+    (to check a prompt really starts with them) plus the model's past_key_values.
+    """
+
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        self.max_bytes = int(max_bytes)
+        self.entries = OrderedDict()   # key -> (prefix_ids, past_key_values, nbytes)
+        self.bytes = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0], entry[1]
+
+    def __contains__(self, key):
+        with self.lock:
+            return key in self.entries
+
+    def put(self, key, prefix_ids, past_key_values):
+        nbytes = kv_nbytes(past_key_values)
+        if nbytes > self.max_bytes:
+            return False
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.bytes -= old[2]
+            self.entries[key] = (prefix_ids, past_key_values, nbytes)
+            self.bytes += nbytes
+            while self.bytes > self.max_bytes and len(self.entries) > 1:
+                _, (_, _, evicted) = self.entries.popitem(last=False)
+                self.bytes -= evicted
+                self.evictions += 1
+        return True
+
+    def stats(self):
+        with self.lock:
+            return {
+                "entries": len(self.entries),
+                "mb": self.bytes / (1024 * 1024),
+                "budget_mb": self.max_bytes / (1024 * 1024),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,379 @@
+"""
+BrainEngine in a separate process.
+A multi-second forward pass inside the FastAPI process competes with the
+vision thread and the asyncio broadcaster for the GIL and the CPU. BrainProcess
+keeps the same interface as BrainEngine, but the model lives in a worker
+process (worker_entry.py) that gets pickled requests on its stdin and answers
+on its stdout:
+
+  main -> worker : ("generate", id, (question, context)) | ("cancel", id, None)
+                   ("prefill", None, context) | ("threads", None, n) | ("stats", id, None) | ("stop", None, None)
+  worker -> main : (id, "piece", text) | (id, "done", {...}) | (id, "error", message)
+                   (id, "stats", {...}) | (None, "ready" | "failed", ...)
+
+A supervisor thread restarts the worker if it dies; a request that gets no
+reply within `request_timeout_s` kills the (hung) worker so it is restarted.
+Requests made while a worker is restarting wait up to `request_timeout_s` for
+it, then fail at once (the caller answers without the LLM).
+"""
+
+import os
+import sys
+import time
+import queue
+import pickle
+import itertools
+import threading
+import subprocess
+
+from .brain import BrainEngine, DEFAULT_BRAIN_SETTINGS, context_key, strip_answer_prefix
+from modules.settings import load_settings
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+# ---------- worker process ----------
+class CacheRelay:
+    """
+    Stands in for the AnswerCache where the model runs away from the kiosk's
+    cache (worker process, shared service): collects what BrainEngine would
+    have cached so it can be sent back with the answer.
+    """
+
+    def __init__(self):
+        self.pending = {}
+        self.lock = threading.Lock()
+
+    def get(self, *args):
+        return None
+
+    def put(self, product, question, version, answer, route=None):
+        with self.lock:
+            self.pending[(product, question)] = (product, question, version, answer, route)
+
+    def take(self, context, question):
+        """The cache entry generated for this question, if BrainEngine decided to cache it."""
+        with self.lock:
+            return self.pending.pop((context_key(context), question), None)
+
+
+class Channel:
+    """Sending end of a pipe between the kiosk and the worker: pickled messages, one writer at a time."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.lock = threading.Lock()
+
+    def put(self, message):
+        with self.lock:
+            pickle.dump(message, self.stream, protocol=pickle.HIGHEST_PROTOCOL)
+            self.stream.flush()
+
+
+def read_messages(stream):
+    """Messages pickled onto a pipe, until the other side closes it (or dies)."""
+    while True:
+        try:
+            yield pickle.load(stream)
+        except (EOFError, OSError, pickle.UnpicklingError):
+            return
+
+
+def run_worker(requests, responses):
+    """
+    Worker side (see worker_entry.py). The first message on `requests` is the
+    brain config; a closed pipe means the kiosk is gone, so the worker exits.
+    """
+    config = pickle.load(requests)
+    responses = Channel(responses)
+    try:
+        brain = BrainEngine(config)
+    except Exception as e:
+        responses.put((None, "failed", str(e)))
+        return
+    brain.cache = CacheRelay()
+    responses.put((None, "ready", {"pid": os.getpid()}))
+
+    jobs = queue.Queue()
+    cancels = {}   # request id -> Event, for requests queued or running
+
+    def generate_loop():
+        while True:
+            job = jobs.get()
+            if job is None:
+                return
+            kind, rid, payload = job
+            if kind == "threads":
+                brain.set_threads(payload)   # Applies from the next answer on
+                continue
+            if kind == "prefill":
+                try:
+                    brain.prepare_prefix(payload)
+                except Exception as e:
+                    print(f"!!! [Brain Worker] Prefill failed: {e}")
+                continue
+
+            cancel = cancels[rid]
+            try:
+                if cancel.is_set():
+                    responses.put((rid, "done", {"cancelled": True, "cache": None}))
+                    continue
+                question, context = payload
+                for piece in brain.stream_answer(question, context, cancel=cancel):
+                    responses.put((rid, "piece", piece))
+                responses.put((rid, "done", {"cancelled": cancel.is_set(),
+                                             "cache": brain.cache.take(context, question)}))
+            except Exception as e:
+                responses.put((rid, "error", str(e)))
+            finally:
+                cancels.pop(rid, None)
+
+    generator = threading.Thread(target=generate_loop, daemon=True)
+    generator.start()
+
+    # This thread only reads requests, so cancels and stats are handled mid-generation
+    for kind, rid, payload in read_messages(requests):
+        if kind == "stop":
+            jobs.put(None)
+            generator.join(10)
+            return
+        if kind == "cancel":
+            event = cancels.get(rid)
+            if event is not None:
+                event.set()
+        elif kind == "stats":
+            responses.put((rid, "stats", brain.stats()))
+        else:
+            if kind == "generate":
+                cancels[rid] = threading.Event()
+            jobs.put((kind, rid, payload))
+
+
+# ---------- main process ----------
+class BrainProcess:
+    """
+    Drop-in replacement for BrainEngine (stream_answer, generate_answer,
+    prepare_prefix, load_context_from_json, stats, cache) that runs the model
+    in a supervised worker process. The constructor blocks until the model is loaded.
+    """
+
+    load_context_from_json = staticmethod(BrainEngine.load_context_from_json)
+
+    def __init__(self, config=None, request_timeout_s=20.0, start_timeout_s=600.0):
+        self.config = dict(config) if config is not None else load_settings("brain", DEFAULT_BRAIN_SETTINGS)
+        self.request_timeout = float(self.config.get("request_timeout_s", request_timeout_s))
+        self.start_timeout = float(start_timeout_s)
+        self.cache = None
+        self.lock = threading.Lock()
+        self.pending = {}                    # request id -> queue.Queue of (kind, payload)
+        self.ids = itertools.count(1)
+        self.counts = {"requests": 0, "completed": 0, "cancelled": 0, "timeouts": 0, "errors": 0, "restarts": 0}
+        self.stopping = False
+        self.ready = threading.Event()       # Clear while the worker is being (re)started
+        self.process = None
+        self.pid = None
+        self.threads = None                  # Thread count set by set_threads(); re-sent after a restart
+        self.on_start = []                   # Called with this BrainProcess whenever a worker is ready
+        self._start()
+        threading.Thread(target=self._supervise, daemon=True).start()
+
+    def _start(self):
+        print(f"🧠 [Brain] Starting worker process ({self.config.get('backend', 'transformers')} backend)...")
+        # A fresh interpreter that imports only the worker: never the kiosk's main script, and no
+        # fork of a process that has torch threads running
+        env = dict(os.environ)
+        env["PYTHONPATH"] = os.pathsep.join(p for p in (BACKEND_DIR, env.get("PYTHONPATH")) if p)
+        process = subprocess.Popen([sys.executable, "-m", "modules.llm.worker_entry"],
+                                   stdin=subprocess.PIPE, stdout=subprocess.PIPE, env=env)
+        requests, responses = Channel(process.stdin), queue.Queue()
+        threading.Thread(target=self._read_replies, args=(process.stdout, responses), daemon=True).start()
+        requests.put(self.config)
+
+        deadline = time.time() + self.start_timeout
+        while True:
+            try:
+                _, kind, payload = responses.get(timeout=1.0)
+            except queue.Empty:
+                if process.poll() is not None:
+                    raise RuntimeError(f"Brain worker exited during startup (code {process.returncode})")
+                if time.time() > deadline:
+                    process.kill()
+                    raise TimeoutError("Brain worker did not load the model in time")
+                continue
+            if kind == "ready":
+                break
+            if kind == "failed":
+                self._wait(process, 5)
+                raise RuntimeError(payload)
+
+        self.requests, self.responses, self.process, self.pid = requests, responses, process, payload["pid"]
+        threading.Thread(target=self._dispatch, args=(responses,), daemon=True).start()
+        self.ready.set()
+        print(f"✅ [Brain] Worker process ready (pid {self.pid}).")
+        if self.threads:
+            self._send(("threads", None, self.threads))
+        for callback in self.on_start:
+            callback(self)
+
+    @staticmethod
+    def _read_replies(stream, responses):
+        """Moves the worker's replies off its stdout pipe (one thread per worker lifetime)."""
+        for message in read_messages(stream):
+            responses.put(message)
+
+    @staticmethod
+    def _wait(process, timeout):
+        try:
+            process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            pass
+
+    def _dispatch(self, responses):
+        """Routes worker replies to the request waiting for them (one thread per worker lifetime)."""
+        while responses is self.responses and not self.stopping:
+            try:
+                rid, kind, payload = responses.get(timeout=1.0)
+            except queue.Empty:
+                continue
+            with self.lock:
+                replies = self.pending.get(rid)
+            if replies is not None:
+                replies.put((kind, payload))
+
+    def _supervise(self):
+        backoff = 2.0
+        while not self.stopping:
+            time.sleep(1.0)
+            if self.stopping or self.process.poll() is None:
+                continue
+            print(f"!!! [Brain] Worker process died (exit code {self.process.returncode}). Restarting...")
+            with self.lock:
+                # Fail what is waiting, then stop accepting; _send registers under the same lock
+                for replies in self.pending.values():
+                    replies.put(("error", "worker died"))
+                self.ready.clear()
+            self.counts["restarts"] += 1
+            time.sleep(backoff)
+            try:
+                self._start()
+                backoff = 2.0
+            except Exception as e:
+                print(f"!!! [Brain] Worker restart failed: {e}")
+                backoff = min(backoff * 2, 60.0)
+
+    def _send(self, message, wait=True, replies=None):
+        """
+        Queues a request for the worker (and registers `replies` for its answers).
+        During a restart it waits up to request_timeout for the new worker if `wait`;
+        returns False when no worker is ready, in which case nothing was sent.
+        """
+        if wait and not self.ready.is_set():
+            self.ready.wait(self.request_timeout)
+        rid = message[1]
+        with self.lock:
+            if not self.ready.is_set():
+                return False
+            if replies is not None:
+                self.pending[rid] = replies
+            try:
+                self.requests.put(message)
+            except (ValueError, OSError) as e:
+                self.pending.pop(rid, None)
+                print(f"!!! [Brain] Could not reach the worker: {e}")
+                return False
+        return True
+
+    # ---------- BrainEngine interface ----------
+    def set_threads(self, threads):
+        self.threads = int(threads)
+        self._send(("threads", None, self.threads), wait=False)
+
+    def prepare_prefix(self, context):
+        if context:
+            self._send(("prefill", None, context), wait=False)   # Pointless during a restart
+
+    def stream_answer(self, user_question, context, cancel=None):
+        """Yields answer text from the worker. Setting `cancel` or abandoning the iterator cancels it there."""
+        if not context:
+            yield "I'm sorry, I don't have enough information about that right now."
+            return
+
+        if self.cache is not None:
+            key = context_key(context)
+            cached = self.cache.get(key, user_question, key)
+            if cached is not None:
+                print(">>> [Brain] Answer served from cache")
+                yield cached
+                return
+
+        rid = next(self.ids)
+        replies = queue.Queue()
+        self.counts["requests"] += 1
+        if not self._send(("generate", rid, (user_question, context)), replies=replies):
+            self.counts["errors"] += 1
+            print("!!! [Brain] Worker is still restarting; answering without the LLM.")
+            return
+
+        finished = False
+        last_reply = time.perf_counter()
+        try:
+            while not (cancel is not None and cancel.is_set()):
+                try:
+                    kind, payload = replies.get(timeout=0.05)
+                except queue.Empty:
+                    if time.perf_counter() - last_reply > self.request_timeout:
+                        finished = True   # Counted as a timeout, and the worker is gone: nothing to cancel
+                        self.counts["timeouts"] += 1
+                        print(f"!!! [Brain] No reply from worker in {self.request_timeout:.0f}s. Restarting it.")
+                        self.process.kill()   # The supervisor starts a fresh one
+                        return
+                    continue
+                last_reply = time.perf_counter()
+                if kind == "piece":
+                    yield payload
+                elif kind == "done":
+                    finished = True
+                    self.counts["completed"] += 1
+                    if payload["cache"] and self.cache is not None:
+                        self.cache.put(*payload["cache"])
+                    return
+                elif kind == "error":
+                    finished = True
+                    self.counts["errors"] += 1
+                    print(f"!!! [Brain] Worker error: {payload}")
+                    return
+        finally:
+            with self.lock:
+                self.pending.pop(rid, None)
+            if not finished:
+                self.counts["cancelled"] += 1
+                self._send(("cancel", rid, None), wait=False)
+
+    def generate_answer(self, user_question, context):
+        answer = strip_answer_prefix("".join(self.stream_answer(user_question, context)).strip())
+        return answer or "I'm sorry, I encountered an error while thinking about your question."
+
+    def stats(self, timeout=2.0):
+        report = {"isolated": True, "pid": self.pid, **self.counts}
+        rid = next(self.ids)
+        replies = queue.Queue()
+        if not self._send(("stats", rid, None), wait=False, replies=replies):
+            report["worker"] = "restarting"
+            return report
+        try:
+            kind, payload = replies.get(timeout=timeout)
+            if kind == "stats":
+                report.update(payload)
+        except queue.Empty:
+            report["worker"] = "no reply"
+        finally:
+            with self.lock:
+                self.pending.pop(rid, None)
+        return report
+
+    def stop(self):
+        self.stopping = True
+        self._send(("stop", None, None), wait=False)
+        self._wait(self.process, 5)
+        if self.process.poll() is None:
+            self.process.kill()
@@ -0,0 +1,23 @@
+"""
+Entry point of the LLM worker process. BrainProcess starts it as
+`python -m modules.llm.worker_entry`, so the child imports only the worker,
+never the kiosk's main script. Requests arrive pickled on stdin and replies
+leave on stdout (see worker.run_worker).
+"""
+
+import os
+import sys
+
+
+def main():
+    # stdout carries the replies; prints from the model code (and native libraries) go to stderr
+    responses = os.fdopen(os.dup(sys.stdout.fileno()), "wb")
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    sys.stdout = sys.stderr
+
+    from modules.llm.worker import run_worker
+    run_worker(sys.stdin.buffer, responses)
+
+
+if __name__ == "__main__":
+    main()
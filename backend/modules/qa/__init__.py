@@ -0,0 +1,6 @@
+from .bm25 import BM25Index, CatalogIndex, SearchHit, tokenize
+from .router import QAResult, QARouter, RouteMetrics, ROUTE_FAST, ROUTE_LLM, ROUTE_CANNED, ROUTE_CACHE, ROUTE_BANK
+from .answer_cache import AnswerCache, normalize_question
+from .answer_bank import AnswerBank, product_questions, faq_paraphrases, index_entries
+from .semantic import SemanticIndex, HashedVectorizer
+from .speculative import SpeculativeRun, SpeculationMetrics
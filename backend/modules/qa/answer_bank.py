@@ -0,0 +1,208 @@
+import os
+import json
+import time
+import threading
+
+from .bm25 import BM25Index, tokenize
+
+BANK_FORMAT = 1
+
+# Ways visitors ask about the structured fields; the first one is the canonical question
+FIELD_PARAPHRASES = {
+    "price": ["How much does it cost?", "What is the price?", "How much is it?", "Is it expensive?",
+              "What's the price range?", "How much would I pay for this?"],
+    "available_colors": ["What colors does it come in?", "Which colours are available?",
+                         "Do you have it in other colors?", "What color options are there?"],
+    "key_features": ["What are the key features?", "What can it do?", "What makes it special?",
+                     "Why should I buy this?", "What are the main benefits?"],
+    "description": ["What is this product?", "Tell me about this product.", "What is it?",
+                    "Can you describe it?"],
+    "brand": ["Which brand is it?", "Who makes it?", "What brand is this?"],
+    "category": ["What kind of product is this?", "What type of product is it?"],
+    "target_age_range": ["What age is it for?", "Who is it meant for?", "Is it for my age group?"],
+}
+
+# Rewrites of a FAQ key's opening words: "is_it_waterproof" -> "Is this waterproof?" and so on
+FAQ_OPENINGS = {
+    "is it": ["is it", "is this", "would you say it is"],
+    "are": ["are", "are the"],
+    "does it": ["does it", "does this", "will it"],
+    "can it": ["can it", "can this"],
+    "can i": ["can i", "am i able to", "is it okay to"],
+    "how to": ["how do i", "how should i", "what's the best way to"],
+    "how do i": ["how do i", "how should i", "what's the best way to"],
+    "how long": ["how long", "how much time"],
+    "when to": ["when should i", "when do i"],
+    "best for": ["what is it best for", "what is it good for", "who is it for"],
+    "best use": ["what is it best used for", "what is it good for", "what should i use it for"],
+}
+
+
+def faq_paraphrases(key):
+    """Questions for a FAQ key, starting with the key itself read as a question."""
+    base = key.replace("_", " ").strip()
+    questions = [base]
+    for opening, variants in FAQ_OPENINGS.items():
+        if base == opening or base.startswith(opening + " "):
+            rest = base[len(opening):]
+            questions.extend(v + rest for v in variants)
+            break
+    questions.append(f"tell me {base}")
+    seen, result = set(), []
+    for q in questions:
+        q = q[0].upper() + q[1:] + ("" if q.endswith("?") else "?")
+        if q.lower() not in seen:
+            seen.add(q.lower())
+            result.append(q)
+    return result
+
+
+def product_questions(product):
+    """[(field, [paraphrases])] for every field and FAQ the product JSON has."""
+    groups = [(field, list(questions)) for field, questions in FIELD_PARAPHRASES.items() if product.get(field)]
+    groups.extend((f"faqs.{key}", faq_paraphrases(key)) for key in product.get("faqs", {}))
+    return groups
+
+
+def index_entries(engine, product):
+    """Bank entries answered by the fast-path index: [{field, answer, questions}]."""
+    entries = []
+    for field, questions in product_questions(engine.product_data[product]):
+        answer = engine.answer(questions[0], product).answer
+        if answer:
+            entries.append({"field": field, "answer": answer, "questions": questions})
+    return entries
+
+
+class AnswerBank:
+    """
+    Precomputed answers for the predictable questions about each product,
+    built offline by build_answer_bank.py and matched at runtime with a small
+    BM25 index over the paraphrases (a lookup takes well under a millisecond).
+
+    The bank is one JSON file:
+        {"format": 1, "products": {product key: {"version", "built", "generator",
+                                                 "entries": [{"field", "answer", "questions"}]}}}
+    `version` is the product's content hash (ProductQAEngine.product_version);
+    entries for a product whose JSON has changed since are ignored until the
+    next rebuild.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.products = {}
+        self.indexes = {}
+        self.counts = {"hits": 0, "misses": 0, "stale": 0}
+        self.load()
+
+    def load(self):
+        products = {}
+        if self.path and os.path.exists(self.path):
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if data.get("format") == BANK_FORMAT:
+                    products = data.get("products", {})
+                else:
+                    print(f"!!! [AnswerBank] {self.path} has an old format. Rebuild it.")
+            except Exception as e:
+                print(f"!!! [AnswerBank] Could not read {self.path}: {e}")
+        indexes = {key: self._build_index(key, bank) for key, bank in products.items()}
+        with self.lock:
+            self.products, self.indexes = products, indexes
+        if products:
+            print(f">>> [AnswerBank] Loaded {sum(len(b['entries']) for b in products.values())} answers "
+                  f"for {len(products)} products")
+
+    @staticmethod
+    def _build_index(product, bank):
+        docs = []
+        for entry in bank["entries"]:
+            for question in entry["questions"]:
+                docs.append((product, entry["field"], tokenize(question), entry["answer"]))
+        return BM25Index(docs)
+
+    def version(self, product):
+        with self.lock:
+            bank = self.products.get(product)
+        return bank["version"] if bank else None
+
+    def generator(self, product):
+        with self.lock:
+            bank = self.products.get(product)
+        return bank["generator"] if bank else None
+
+    def match(self, question, product, version, min_confidence=0.8):
+        """Best SearchHit for `question` when it closely matches a banked paraphrase, else None."""
+        with self.lock:
+            bank = self.products.get(product)
+            index = self.indexes.get(product)
+        if bank is None or not question:
+            return None
+        if bank["version"] != version:
+            self._count("stale")
+            return None
+        hits = index.search(question, k=1)
+        if hits and hits[0].confidence >= min_confidence:
+            self._count("hits")
+            return hits[0]
+        self._count("misses")
+        return None
+
+    def _count(self, name):
+        # match() runs on the interaction and speculative threads at once
+        with self.lock:
+            self.counts[name] += 1
+
+    # ---------- building ----------
+    def outdated(self, versions):
+        """Products from {product: version} that are missing from the bank or have changed."""
+        with self.lock:
+            return [p for p, v in versions.items() if p not in self.products or self.products[p]["version"] != v]
+
+    def update(self, product, version, entries, generator):
+        bank = {"version": version, "built": time.time(), "generator": generator, "entries": entries}
+        index = self._build_index(product, bank)
+        with self.lock:
+            self.products[product] = bank
+            self.indexes[product] = index
+
+    def remove(self, product):
+        with self.lock:
+            self.products.pop(product, None)
+            self.indexes.pop(product, None)
+
+    def rebuild(self, versions, build, generator):
+        """
+        Incremental rebuild after a catalog change: drops products missing from
+        {product: version}, re-banks the changed ones with `build(product)` and
+        saves. Returns the rebuilt products.
+        """
+        with self.lock:
+            removed = [p for p in self.products if p not in versions]
+        for product in removed:
+            self.remove(product)
+        todo = sorted(self.outdated(versions))
+        for product in todo:
+            self.update(product, versions[product], build(product), generator)
+        if removed or todo:
+            self.save()
+        return todo
+
+    def save(self):
+        """Writes the bank atomically, so a running kiosk never reads a half-written file."""
+        with self.lock:
+            data = {"format": BANK_FORMAT, "products": self.products}
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=1, ensure_ascii=False)
+        os.replace(tmp, self.path)
+
+    def stats(self):
+        with self.lock:
+            report = dict(self.counts)
+            report["products"] = len(self.products)
+            report["entries"] = sum(len(b["entries"]) for b in self.products.values())
+        return report
@@ -0,0 +1,158 @@
+import time
+import threading
+from collections import OrderedDict
+
+from .bm25 import tokenize
+
+try:
+    import diskcache
+except ImportError:  # Persistent tier is optional; the memory tier still works
+    diskcache = None
+
+
+def normalize_question(question):
+    """
+    Order- and filler-insensitive form of a question:
+    "How much is it?" and "how much is it" and "is it how much" share a key.
+    """
+    return " ".join(sorted(set(tokenize(question))))
+
+
+def jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class AnswerCache:
+    """
+    Two-tier answer cache: an in-memory LRU in front of an optional on-disk
+    tier (diskcache), shared across restarts.
+
+    Entries are keyed on (product, normalized question) and remember the
+    product's content version. A lookup with a different version is a miss and
+    drops the stale entry, so editing a product JSON invalidates its answers.
+    With `near_duplicate` > 0, a miss falls back to the most similar cached
+    question for the same product (token-set Jaccard at or above that value).
+    """
+
+    def __init__(self, directory=None, memory_size=256, ttl_seconds=86400,
+                 near_duplicate=0.0, enabled=True):
+        self.enabled = enabled
+        self.memory_size = int(memory_size)
+        self.ttl = float(ttl_seconds)
+        self.near_duplicate = float(near_duplicate)
+        self.memory = OrderedDict()   # (product, key) -> entry dict
+        self.lock = threading.Lock()
+        self.stats_counts = {"memory_hits": 0, "near_hits": 0, "disk_hits": 0,
+                             "misses": 0, "stale": 0, "expired": 0, "puts": 0}
+
+        self.disk = None
+        if enabled and directory:
+            if diskcache is None:
+                print("!!! [AnswerCache] diskcache not installed. Using memory tier only.")
+            else:
+                try:
+                    self.disk = diskcache.Cache(directory)
+                except Exception as e:
+                    print(f"!!! [AnswerCache] Could not open {directory}: {e}")
+
+    def _count(self, name):
+        with self.lock:
+            self.stats_counts[name] += 1
+
+    def _usable(self, entry, version):
+        if entry is None:
+            return False
+        if entry["version"] != version:
+            self._count("stale")
+            return False
+        if time.time() - entry["created"] > self.ttl:
+            self._count("expired")
+            return False
+        return True
+
+    def get(self, product, question, version):
+        """Cached answer text, or None."""
+        if not self.enabled:
+            return None
+        key = (product, normalize_question(question))
+
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry is not None:
+                self.memory.move_to_end(key)
+        if self._usable(entry, version):
+            self._count("memory_hits")
+            return entry["answer"]
+        if entry is not None:
+            self._drop(key)
+
+        if self.disk is not None:
+            entry = self.disk.get("|".join(key))
+            if self._usable(entry, version):
+                self._remember(key, entry)
+                self._count("disk_hits")
+                return entry["answer"]
+            if entry is not None:
+                self._drop(key)
+
+        if self.near_duplicate > 0:
+            answer = self._near_match(key, version)
+            if answer is not None:
+                self._count("near_hits")
+                return answer
+
+        self._count("misses")
+        return None
+
+    def put(self, product, question, version, answer, route=None):
+        if not self.enabled or not answer or version is None:
+            return
+        key = (product, normalize_question(question))
+        entry = {"answer": answer, "version": version, "created": time.time(), "route": route}
+        self._remember(key, entry)
+        if self.disk is not None:
+            self.disk.set("|".join(key), entry, expire=self.ttl)
+        self._count("puts")
+
+    def clear(self):
+        with self.lock:
+            self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def _remember(self, key, entry):
+        with self.lock:
+            self.memory[key] = entry
+            self.memory.move_to_end(key)
+            while len(self.memory) > self.memory_size:
+                self.memory.popitem(last=False)
+
+    def _drop(self, key):
+        with self.lock:
+            self.memory.pop(key, None)
+        if self.disk is not None:
+            self.disk.delete("|".join(key))
+
+    def _near_match(self, key, version):
+        product, normalized = key
+        words = set(normalized.split())
+        best, best_score = None, self.near_duplicate
+        with self.lock:
+            candidates = [(k, e) for k, e in self.memory.items() if k[0] == product]
+        for (_, other), entry in candidates:
+            score = jaccard(words, set(other.split()))
+            if score >= best_score and entry["version"] == version and time.time() - entry["created"] <= self.ttl:
+                best, best_score = entry, score
+        return best["answer"] if best else None
+
+    def stats(self):
+        with self.lock:
+            counts = dict(self.stats_counts)
+            counts["memory_entries"] = len(self.memory)
+        hits = counts["memory_hits"] + counts["near_hits"] + counts["disk_hits"]
+        lookups = hits + counts["misses"]
+        counts["disk_entries"] = len(self.disk) if self.disk is not None else None
+        counts["hit_rate"] = hits / lookups if lookups else 0.0
+        return counts
@@ -0,0 +1,190 @@
+import re
+import math
+from collections import Counter, defaultdict, namedtuple
+
+# One retrievable answer: which product/field it came from, what to say, how well it matched
+SearchHit = namedtuple("SearchHit", ["product", "field", "answer", "score", "confidence"])
+
+STOPWORDS = {
+    "a", "an", "the", "is", "are", "was", "be", "it", "its", "this", "that", "these", "those",
+    "i", "me", "my", "you", "your", "we", "they", "them", "do", "does", "did", "can", "could",
+    "will", "would", "should", "to", "of", "in", "on", "for", "with", "and", "or", "at", "by",
+    "what", "which", "how", "who", "whom", "when", "where", "why", "there", "any", "about",
+    "please", "tell", "know", "want", "like", "so", "if", "from", "as", "into", "has", "have",
+    "am", "hey", "adorix", "product", "one", "some", "much", "many", "come", "comes", "get",
+    "good", "lot", "really", "very", "just", "also", "all", "take",
+}
+
+# Multi-word expressions rewritten before tokenizing ("how much" is otherwise two stopwords)
+PHRASES = {
+    "how much": "price",
+    "every day": "daily",
+    "everyday": "daily",
+}
+
+# Colloquial words mapped onto the vocabulary the product files actually use
+SYNONYMS = {
+    "cost": "price", "costs": "price", "expensive": "price", "cheap": "price", "afford": "price",
+    "pricing": "price", "rupees": "price", "money": "price",
+    "colour": "color", "colours": "color", "colors": "color", "shade": "color", "shades": "color",
+    "wash": "clean", "washing": "clean", "washable": "clean", "cleaning": "clean",
+    "features": "feature", "specs": "feature", "specifications": "feature",
+    "manufacturer": "brand", "makes": "brand",
+    "sized": "size", "sizing": "size", "fit": "size", "fits": "size", "big": "size", "large": "size",
+    "need": "require", "needs": "require",
+}
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def stem(word):
+    """
+    Tiny suffix stripper; good enough to join plural/verb forms in product copy.
+    Like Porter, a trailing y/ie becomes i so "battery"/"batteries" and "selfie"/"selfies" meet.
+    """
+    if len(word) > 4 and word.endswith("ies"):
+        word = word[:-3] + "i"
+    elif len(word) > 5 and word.endswith("ing"):
+        word = word[:-3]
+    elif len(word) > 4 and word.endswith("ed"):
+        word = word[:-2]
+    elif len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        word = word[:-1]
+    if len(word) > 4 and word.endswith("y"):
+        word = word[:-1] + "i"
+    elif len(word) > 4 and word.endswith("e"):
+        word = word[:-1]
+    return word
+
+
+def tokenize(text):
+    """Lowercase, split, drop stopwords, map synonyms and stem."""
+    text = text.lower().replace("_", " ")
+    for phrase, replacement in PHRASES.items():
+        text = text.replace(phrase, replacement)
+    tokens = []
+    for raw in TOKEN_RE.findall(text):
+        if len(raw) < 2 or raw in STOPWORDS:
+            continue
+        tokens.append(stem(SYNONYMS.get(raw, raw)))
+    return tokens
+
+
+def product_documents(product_key, product):
+    """
+    Turns one product JSON into retrievable documents.
+    Each document is (field, text to index, answer to speak). The indexed text
+    starts with a few label words, so questions about the field itself
+    ("what colors...") match even when the value does not repeat them.
+    """
+    docs = []
+    name = product.get("product_name", "this product")
+    brand = product.get("brand", "")
+    category = product.get("category", "")
+
+    if product.get("price"):
+        docs.append(("price", f"price {product['price']}",
+                     f"The price is {product['price']}."))
+    colors = product.get("available_colors", [])
+    if colors:
+        docs.append(("available_colors", "color available option " + " ".join(colors),
+                     f"It comes in {', '.join(colors)}."))
+    features = [(feature or "").strip() for feature in product.get("key_features", [])]
+    usable = [feature for feature in features if feature]
+    if usable:
+        docs.append(("key_features", "key feature include special " + " ".join(usable),
+                     f"Key features include: {', '.join(usable[:2])}."))
+    for i, feature in enumerate(features):
+        if feature:   # Empty entries are skipped; the index keeps matching the JSON position
+            docs.append((f"key_features.{i}", feature, f"It offers {feature[0].lower() + feature[1:]}."))
+    if category or brand:
+        by_brand = f" by {brand}" if brand else ""
+        docs.append(("category", f"category type kind {category} {brand}",
+                     f"This is a {category or 'great'} product{by_brand}."))
+    if brand:
+        docs.append(("brand", f"brand {brand}", f"It's made by {brand}."))
+    docs.append(("product_name", f"name called {name}", f"This is the {name}."))
+    if product.get("description"):
+        docs.append(("description", f"description about {product['description']}", product["description"]))
+    if product.get("target_age_range"):
+        docs.append(("target_age_range", f"age ages audience {product['target_age_range']}",
+                     f"It's aimed at the {product['target_age_range']} age group."))
+    for key, answer in product.get("faqs", {}).items():
+        docs.append((f"faqs.{key}", f"{key} {answer}", answer))
+
+    return [(product_key, field, tokenize(text), answer) for field, text, answer in docs]
+
+
+class BM25Index:
+    """
+    Okapi BM25 over a fixed set of short documents, with an inverted index
+    (term -> [(doc id, tf)]) built once so a query only touches matching postings.
+    """
+
+    def __init__(self, documents, k1=1.2, b=0.75):
+        # documents: [(product, field, tokens, answer)]
+        self.docs = documents
+        self.k1 = k1
+        self.b = b
+        self.postings = defaultdict(list)
+        self.doc_len = []
+        self.doc_terms = []
+        for doc_id, (_, _, tokens, _) in enumerate(documents):
+            tf = Counter(tokens)
+            self.doc_terms.append(tf)
+            self.doc_len.append(len(tokens))
+            for term, count in tf.items():
+                self.postings[term].append((doc_id, count))
+        n = len(documents)
+        self.avg_len = (sum(self.doc_len) / n) if n else 0.0
+        self.idf = {term: self._idf(len(p)) for term, p in self.postings.items()}
+        self.unseen_idf = self._idf(0)
+
+    def _idf(self, doc_freq):
+        n = len(self.docs)
+        return math.log(1.0 + (n - doc_freq + 0.5) / (doc_freq + 0.5))
+
+    def search(self, query, k=3):
+        """Top-k SearchHits. `query` is raw text or a token list."""
+        terms = tokenize(query) if isinstance(query, str) else query
+        if not terms or not self.docs:
+            return []
+
+        scores = defaultdict(float)
+        for term in set(terms):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for doc_id, tf in self.postings[term]:
+                norm = self.k1 * (1.0 - self.b + self.b * self.doc_len[doc_id] / self.avg_len)
+                scores[doc_id] += idf * tf * (self.k1 + 1.0) / (tf + norm)
+
+        # Confidence = share of the question's information (idf mass) the document covers
+        unique = set(terms)
+        total_idf = sum(self.idf.get(t, self.unseen_idf) for t in unique)
+        ranked = sorted(scores.items(), key=lambda kv: kv[1], reverse=True)[:k]
+        hits = []
+        for doc_id, score in ranked:
+            product, field, _, answer = self.docs[doc_id]
+            covered = sum(self.idf[t] for t in unique if t in self.doc_terms[doc_id])
+            hits.append(SearchHit(product, field, answer, score, covered / total_idf if total_idf else 0.0))
+        return hits
+
+
+class CatalogIndex:
+    """Per-product BM25 indexes plus one catalog-wide index, built once per catalog load."""
+
+    def __init__(self, products):
+        self.by_product = {}
+        all_docs = []
+        for key, product in products.items():
+            docs = product_documents(key, product)
+            self.by_product[key] = BM25Index(docs)
+            all_docs.extend(docs)
+        self.catalog = BM25Index(all_docs)
+
+    def search(self, query, product=None, k=3):
+        index = self.by_product.get(product) if product else self.catalog
+        if index is None:
+            return []
+        return index.search(query, k=k)
@@ -0,0 +1,226 @@
+import time
+import threading
+from collections import namedtuple, deque
+
+from .speculative import SpeculativeRun, SpeculationMetrics
+from .answer_bank import index_entries
+
+# What the QA engine knows about one question: the answer plus how sure it is
+QAResult = namedtuple("QAResult", ["answer", "score", "confidence", "source", "product"])
+
+ROUTE_FAST = "fast"      # Answer straight from the product index
+ROUTE_LLM = "llm"        # Partial match: let the LLM phrase an answer from the product context
+ROUTE_CANNED = "canned"  # Nothing relevant: polite fixed reply
+ROUTE_CACHE = "cache"    # Answered earlier (see answer_cache.AnswerCache)
+ROUTE_BANK = "bank"      # Precomputed offline (see answer_bank.AnswerBank)
+
+CANNED_REPLY = "I'm not sure about that one, but I'd be happy to tell you more about this product!"
+
+
+class RouteMetrics:
+    """Per-route counts and recent latencies (thread-safe)."""
+
+    def __init__(self, window=200):
+        self.lock = threading.Lock()
+        self.counts = {}
+        self.latencies = {}
+        self.window = window
+
+    def record(self, route, seconds):
+        with self.lock:
+            self.counts[route] = self.counts.get(route, 0) + 1
+            self.latencies.setdefault(route, deque(maxlen=self.window)).append(seconds)
+
+    def snapshot(self):
+        with self.lock:
+            total = sum(self.counts.values())
+            routes = {}
+            for route, count in self.counts.items():
+                samples = sorted(self.latencies[route])
+                routes[route] = {
+                    "count": count,
+                    "share": count / total if total else 0.0,
+                    "p50_ms": samples[len(samples) // 2] * 1000.0,
+                    "p95_ms": samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000.0,
+                    "mean_ms": sum(samples) / len(samples) * 1000.0,
+                }
+            return {"total": total, "routes": routes}
+
+
+class QARouter:
+    """
+    Chooses between the fast path, the LLM and a canned reply from the
+    retrieval confidence of ProductQAEngine.answer().
+
+    `llm` is any callable (question, product_name) -> str, or None when no LLM
+    is available; partial matches then get the canned reply as well.
+    `llm_stream` is the optional streaming form, yielding text pieces.
+    `llm_ready` is an optional callable telling whether the LLM has finished
+    loading; until then partial matches get the best index answer instead.
+    Thresholds come from `qa_benchmark.py --calibrate`.
+
+    With an AnswerCache, questions are looked up there first and LLM answers
+    are stored (fast-path answers are cheaper to recompute than to cache).
+    An AnswerBank is tried next: a close match to a banked paraphrase is
+    answered with its precomputed answer.
+
+    With `speculative`, answer_stream() starts the LLM (llm_stream, which must
+    accept a `cancel` event) before the lookups run, so a question that does
+    end up on the LLM route has a head start. The generation is cancelled as
+    soon as a cache, bank, fast or canned answer wins.
+    """
+
+    def __init__(self, qa_engine, llm=None, fast_confidence=0.4, llm_confidence=0.25, cache=None,
+                 llm_stream=None, llm_ready=None, bank=None, bank_confidence=0.8, speculative=False):
+        self.qa_engine = qa_engine
+        self.llm = llm
+        self.llm_stream = llm_stream
+        self.llm_ready = llm_ready
+        self.warmup_fallbacks = 0  # LLM-route questions answered from the index while the LLM loaded
+        self.cache = cache
+        self.bank = bank
+        self.bank_confidence = float(bank_confidence)
+        self.speculative = speculative
+        self.speculation = SpeculationMetrics()
+        self.fast_confidence = float(fast_confidence)
+        self.llm_confidence = float(llm_confidence)
+        self.metrics = RouteMetrics()
+
+    def choose(self, result):
+        if result.confidence >= self.fast_confidence:
+            return ROUTE_FAST
+        if self.llm is not None and result.confidence >= self.llm_confidence:
+            if self.llm_ready is not None and not self.llm_ready():
+                # LLM still warming up: the best index answer beats a canned reply
+                self.warmup_fallbacks += 1
+                print(">>> [QA Router] LLM not ready yet, using the fast path")
+                return ROUTE_FAST
+            return ROUTE_LLM
+        return ROUTE_CANNED
+
+    def _lookup(self, question, product_name):
+        """(product version, route, answer) from the cache or the bank; route and answer are None on a miss."""
+        version = self.qa_engine.product_version(product_name)
+        if self.cache is not None:
+            cached = self.cache.get(product_name, question, version)
+            if cached is not None:
+                return version, ROUTE_CACHE, cached
+        if self.bank is not None:
+            hit = self.bank.match(question, self.qa_engine._product_key(product_name), version,
+                                  self.bank_confidence)
+            if hit is not None:
+                return version, ROUTE_BANK, hit.answer
+        return version, None, None
+
+    def _log(self, route, start, result=None):
+        self.metrics.record(route, time.perf_counter() - start)
+        if result is None:
+            print(f">>> [QA Router] {route} hit")
+        else:
+            print(f">>> [QA Router] {route} (confidence {result.confidence:.2f}, source {result.source})")
+
+    def answer(self, question, product_name):
+        """Returns (route, answer text, QAResult). The QAResult is None for cache and bank hits."""
+        start = time.perf_counter()
+        version, route, known = self._lookup(question, product_name)
+        if known is not None:
+            self._log(route, start)
+            return route, known, None
+
+        result = self.qa_engine.answer(question, product_name)
+        route = self.choose(result)
+
+        if route == ROUTE_FAST:
+            answer = result.answer
+        elif route == ROUTE_LLM:
+            try:
+                answer = self.llm(question, product_name)
+            except Exception as e:
+                print(f"!!! [QA Router] LLM failed: {e}")
+                answer = None
+            if not answer:
+                route, answer = ROUTE_CANNED, CANNED_REPLY
+            elif self.cache is not None:
+                self.cache.put(product_name, question, version, answer, route)
+        else:
+            answer = CANNED_REPLY
+
+        self._log(route, start, result)
+        return route, answer, result
+
+    def answer_stream(self, question, product_name):
+        """
+        Streaming variant of answer(): returns (route, iterator of text pieces, QAResult).
+        Only the LLM route streams (through `llm_stream`); the others yield one piece.
+        """
+        if self.llm_stream is None:
+            route, answer, result = self.answer(question, product_name)
+            return route, iter([answer]), result
+
+        start = time.perf_counter()
+        run = None
+        if self.speculative and self.llm is not None and (self.llm_ready is None or self.llm_ready()):
+            run = SpeculativeRun(self.llm_stream, question, product_name, self.speculation)
+
+        version, route, known = self._lookup(question, product_name)
+        if known is not None:
+            if run:
+                run.cancel()
+            self._log(route, start)
+            return route, iter([known]), None
+
+        result = self.qa_engine.answer(question, product_name)
+        route = self.choose(result)
+        if route != ROUTE_LLM:
+            if run:
+                run.cancel()
+            self._log(route, start, result)
+            return route, iter([result.answer if route == ROUTE_FAST else CANNED_REPLY]), result
+        pieces = run.pieces() if run else self.llm_stream(question, product_name)
+        return route, self._stream_llm(question, product_name, version, start, result, pieces), result
+
+    def _stream_llm(self, question, product_name, version, start, result, pieces):
+        parts = []
+        try:
+            for piece in pieces:
+                parts.append(piece)
+                yield piece
+        except Exception as e:
+            print(f"!!! [QA Router] LLM failed: {e}")
+
+        answer = "".join(parts).strip()
+        route = ROUTE_LLM
+        if not answer:
+            route = ROUTE_CANNED
+            yield CANNED_REPLY
+        elif self.cache is not None:
+            self.cache.put(product_name, question, version, answer, route)
+        self._log(route, start, result)
+
+    def refresh_bank(self):
+        """
+        Call after qa_engine.reload(). Products whose JSON changed are re-banked
+        from the fast-path index, so their paraphrases keep hitting; the next
+        build_answer_bank.py run upgrades them to LLM answers.
+        """
+        if self.bank is None:
+            return []
+        engine = self.qa_engine
+        versions = {product: engine.product_version(product) for product in engine.product_data}
+        rebuilt = self.bank.rebuild(versions, lambda product: index_entries(engine, product), "index")
+        if rebuilt:
+            print(f">>> [QA Router] Re-banked {len(rebuilt)} changed products: {', '.join(rebuilt)}")
+        return rebuilt
+
+    def stats(self):
+        snapshot = self.metrics.snapshot()
+        snapshot["thresholds"] = {"fast": self.fast_confidence, "llm": self.llm_confidence,
+                                  "bank": self.bank_confidence}
+        snapshot["warmup_fallbacks"] = self.warmup_fallbacks
+        if self.cache is not None:
+            snapshot["cache"] = self.cache.stats()
+        if self.bank is not None:
+            snapshot["bank"] = self.bank.stats()
+        if self.speculative:
+            snapshot["speculation"] = self.speculation.snapshot()
+        return snapshot
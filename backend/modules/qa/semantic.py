@@ -0,0 +1,142 @@
+import os
+import json
+import zlib
+
+import numpy as np
+
+from .bm25 import SearchHit, product_documents, stem
+
+# Bump when the features below change: persisted matrices with another version are rebuilt
+VECTORIZER_VERSION = 2
+
+# Words that mean the same thing to a shopper but share no characters.
+# Every word in a group also emits the group's concept feature, so "rain" and "waterproof" meet.
+CONCEPTS = {
+    "water": ["waterproof", "water", "rain", "rainy", "wet", "splash", "shower", "swim", "resistant"],
+    "size": ["size", "fit", "small", "large", "tight", "loose", "measurement", "true"],
+    "clean": ["clean", "dirty", "stain", "care", "maintain", "maintenance", "wipe", "dishwasher"],
+    "daily": ["daily", "regular", "routine", "long", "day", "frequent", "often"],
+    "work": ["office", "work", "business", "professional", "meeting", "job", "formal"],
+    "weight": ["heavy", "light", "weight", "weigh", "lightweight", "carry"],
+    "skin": ["skin", "sensitive", "dry", "oily", "gentle", "irritate", "irritation", "rash"],
+    "smell": ["fragrance", "smell", "scent", "perfume"],
+    "battery": ["battery", "charge", "charging", "power", "last"],
+    "age": ["age", "old", "kid", "child", "teen", "adult", "senior", "year"],
+    "gift": ["gift", "present", "birthday"],
+    "travel": ["travel", "trip", "holiday", "vacation", "pack"],
+    "comfort": ["comfortable", "comfort", "breathable", "soft", "cozy"],
+    "fresh": ["fresh", "spoil", "storage", "store", "keep"],
+    "security": ["secure", "security", "safe", "safety", "privacy"],
+    "style": ["style", "trendy", "fashion", "classic", "look", "outfit"],
+}
+CONCEPT_OF = {stem(word): f"#{concept}" for concept, words in CONCEPTS.items() for word in words}
+
+# Relative weights of the feature kinds
+WORD_WEIGHT = 1.0
+CONCEPT_WEIGHT = 2.5
+CHAR_WEIGHT = 0.25
+
+
+class HashedVectorizer:
+    """
+    Stateless text -> unit vector: words, concept tags and character 3-grams,
+    hashed (crc32, signed) into `dim` buckets. Needs no vocabulary or training,
+    so documents and questions can be embedded independently.
+    """
+
+    def __init__(self, dim=4096):
+        self.dim = int(dim)
+
+    def _features(self, tokens):
+        """{feature: weight}. Presence only: a word repeated in long product copy must not drown the rest."""
+        features = {}
+        for token in set(tokens):
+            features["w:" + token] = WORD_WEIGHT
+            concept = CONCEPT_OF.get(token)
+            if concept:
+                features[concept] = CONCEPT_WEIGHT
+            padded = f"<{token}>"
+            for i in range(len(padded) - 2):
+                features["c:" + padded[i:i + 3]] = CHAR_WEIGHT
+        return features
+
+    def vector(self, tokens):
+        vec = np.zeros(self.dim, dtype=np.float32)
+        for feature, weight in self._features(tokens).items():
+            h = zlib.crc32(feature.encode("utf-8"))
+            vec[h % self.dim] += weight if h & 0x80000000 else -weight
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    def matrix(self, token_lists):
+        if not token_lists:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return np.vstack([self.vector(tokens) for tokens in token_lists])
+
+
+class SemanticIndex:
+    """
+    Cosine top-k over hashed-vector embeddings of the product documents
+    (the same documents the BM25 index uses), one matrix per product plus a
+    stacked catalog matrix.
+
+    With a `directory`, each product's matrix is saved as <product>.npz together
+    with its content hash; on the next start only products whose JSON (or the
+    vectorizer) changed are embedded again.
+    """
+
+    def __init__(self, products, versions, directory=None, dim=4096):
+        self.vectorizer = HashedVectorizer(dim)
+        self.directory = directory
+        self.by_product = {}   # product -> (matrix, [(field, answer)])
+        self.rebuilt = 0
+        for key, product in products.items():
+            self.by_product[key] = self._product_matrix(key, product, versions.get(key))
+
+        keys = sorted(self.by_product)
+        self.catalog_docs = [(key, field, answer) for key in keys for field, answer in self.by_product[key][1]]
+        matrices = [self.by_product[key][0] for key in keys]
+        self.catalog = np.vstack(matrices) if matrices else self.vectorizer.matrix([])
+
+    def _cache_path(self, key):
+        return os.path.join(self.directory, os.path.splitext(key)[0] + ".npz")
+
+    def _product_matrix(self, key, product, version):
+        signature = f"{version}:{self.vectorizer.dim}:{VECTORIZER_VERSION}"
+        path = self._cache_path(key) if self.directory else None
+        if path and os.path.exists(path):
+            try:
+                with np.load(path) as data:
+                    if str(data["signature"]) == signature:
+                        return data["matrix"], [tuple(doc) for doc in json.loads(str(data["docs"]))]
+            except Exception as e:
+                print(f"!!! [Semantic] Ignoring unreadable {path}: {e}")
+
+        documents = product_documents(key, product)
+        matrix = self.vectorizer.matrix([tokens for _, _, tokens, _ in documents])
+        docs = [(field, answer) for _, field, _, answer in documents]
+        self.rebuilt += 1
+        if path:
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                np.savez(path, matrix=matrix, docs=json.dumps(docs), signature=signature)
+            except OSError as e:
+                print(f"!!! [Semantic] Could not save {path}: {e}")
+        return matrix, docs
+
+    def search(self, tokens, product=None, k=3):
+        """Top-k SearchHits by cosine similarity (score and confidence are both the cosine)."""
+        if product:
+            if product not in self.by_product:
+                return []
+            matrix, docs = self.by_product[product]
+            docs = [(product, field, answer) for field, answer in docs]
+        else:
+            matrix, docs = self.catalog, self.catalog_docs
+        if not tokens or not len(docs):
+            return []
+
+        scores = matrix @ self.vectorizer.vector(tokens)
+        top = np.argsort(-scores)[:k] if len(scores) > k else np.argsort(-scores)
+        return [SearchHit(docs[i][0], docs[i][1], docs[i][2], float(scores[i]), float(scores[i]))
+                for i in top if scores[i] > 0]
@@ -0,0 +1,93 @@
+import time
+import queue
+import threading
+
+
+class SpeculationMetrics:
+    """What speculative LLM starts cost: how many were used or cancelled and the compute thrown away."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = {"started": 0, "used": 0, "cancelled": 0}
+        self.wasted_pieces = 0
+        self.wasted_seconds = 0.0
+        self.stop_latency = []   # Seconds from cancel() until generation had actually stopped
+
+    def record(self, name):
+        with self.lock:
+            self.counts[name] += 1
+
+    def record_waste(self, pieces, seconds, stop_latency):
+        with self.lock:
+            self.wasted_pieces += pieces
+            self.wasted_seconds += seconds
+            self.stop_latency = (self.stop_latency + [stop_latency])[-200:]
+
+    def snapshot(self):
+        with self.lock:
+            latency = sorted(self.stop_latency)
+            return {
+                **self.counts,
+                "wasted_pieces": self.wasted_pieces,
+                "wasted_seconds": self.wasted_seconds,
+                "stop_latency_p50_ms": latency[len(latency) // 2] * 1000.0 if latency else None,
+                "stop_latency_max_ms": latency[-1] * 1000.0 if latency else None,
+            }
+
+
+class SpeculativeRun:
+    """
+    An LLM answer started before the router knows whether it is needed.
+    Generation runs on its own thread into a queue; pieces() hands the queued
+    text (and everything after it) to whoever ends up using the answer, and
+    cancel() stops the model at its next token.
+
+    `stream_fn(question, product, cancel=event)` is the router's llm_stream.
+    """
+
+    def __init__(self, stream_fn, question, product, metrics):
+        self.metrics = metrics
+        self.cancel_event = threading.Event()
+        self.cancelled_at = None
+        self.queue = queue.Queue()
+        self.count = 0
+        self.started = time.perf_counter()
+        metrics.record("started")
+        self.thread = threading.Thread(target=self._run, args=(stream_fn, question, product), daemon=True)
+        self.thread.start()
+
+    def _run(self, stream_fn, question, product):
+        try:
+            for piece in stream_fn(question, product, cancel=self.cancel_event):
+                if self.cancel_event.is_set():
+                    break
+                self.count += 1
+                self.queue.put(piece)
+        except Exception as e:
+            print(f"!!! [Speculative] LLM failed: {e}")
+        finally:
+            finished = time.perf_counter()
+            if self.cancelled_at is not None:
+                self.metrics.record_waste(self.count, finished - self.started, finished - self.cancelled_at)
+            self.queue.put(None)
+
+    def cancel(self):
+        if not self.cancel_event.is_set():
+            self.cancelled_at = time.perf_counter()
+            self.cancel_event.set()
+            self.metrics.record("cancelled")
+
+    def pieces(self):
+        """Yields the generated text. Abandoning the iterator cancels the generation."""
+        self.metrics.record("used")
+        done = False
+        try:
+            while True:
+                piece = self.queue.get()
+                if piece is None:
+                    done = True   # The producer may still be alive right after its sentinel; that is not a cancel
+                    return
+                yield piece
+        finally:
+            if not done:
+                self.cancel()
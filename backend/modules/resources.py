@@ -0,0 +1,271 @@
+"""
+CPU partitioning for the kiosk's subsystems.
+Vision (OpenCV DNN), the LLM (torch) and audio (Porcupine, STT/TTS) each
+default to "all cores", so an answer being generated starves the wake-word
+loop. The ResourceManager gives every subsystem a core set, a thread count and
+a nice value, and moves cores between vision and the LLM as the kiosk mode
+(SystemState.system_id) changes:
+
+  audio, display : the reserved cores (never used by vision or the LLM), split
+                   between the two when there are at least two, else shared
+  vision, llm    : the remaining cores, split by the mode's llm share
+                   (1 Loop: mostly vision, 3 Interaction: mostly LLM)
+
+Priorities are audio > display > vision > llm (nice values, settings.yaml resources:).
+Threads join a subsystem with `run(name, fn, ...)` / `running(name)` / `attach(name)`;
+threads they start inherit its cores and priority. CPU time is accounted per subsystem.
+
+Core sets and priorities need Linux (sched_setaffinity, per-thread nice);
+elsewhere only the thread counts are applied.
+"""
+
+import os
+import time
+import threading
+from contextlib import contextmanager
+
+from modules.settings import load_settings
+
+SUBSYSTEMS = ("audio", "display", "vision", "llm")   # Highest priority first
+
+DEFAULT_RESOURCE_SETTINGS = {
+    "enabled": True,
+    "reserved_cores": 1,    # Cores kept for audio + display
+    "nice": {"audio": -5, "display": 0, "vision": 5, "llm": 10},   # Negative values need CAP_SYS_NICE
+    "llm_share": {1: 0.25, 2: 0.5, 3: 0.75},   # Share of the non-reserved cores the LLM gets per system_id
+}
+
+LINUX = hasattr(os, "sched_setaffinity") and os.path.isdir("/proc/self/task")
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+
+def _process_cpu_seconds(pid):
+    """utime + stime of a whole process (all its threads) from /proc, or None."""
+    try:
+        with open(f"/proc/{pid}/stat", "r") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def _thread_cpu_seconds(ident):
+    try:
+        return time.clock_gettime(time.pthread_getcpuclockid(ident))
+    except (AttributeError, OSError, ValueError):
+        return None
+
+
+class ResourceManager:
+    def __init__(self, config=None):
+        self.config = config if config is not None else load_settings("resources", DEFAULT_RESOURCE_SETTINGS)
+        self.enabled = bool(self.config.get("enabled", True))
+        self.lock = threading.Lock()
+        self.cores = sorted(os.sched_getaffinity(0)) if LINUX else list(range(os.cpu_count() or 1))
+        self.mode = None
+        self.plan = {}            # subsystem -> {"cores": [...], "threads": n, "nice": n}
+        self.threads = {}         # native id -> (subsystem, python ident, cpu seconds at attach)
+        self.processes = {}       # subsystem -> (pid getter, set_threads or None)
+        self.retired = {name: 0.0 for name in SUBSYSTEMS}   # CPU seconds of threads that finished or changed subsystem
+        self.nice_denied = False
+        self.last_sample = None   # (time, {subsystem: cpu seconds}) for the utilisation figures
+        self.set_mode(1)
+
+    # ---------- plan ----------
+    def _plan(self, mode):
+        nice = {**DEFAULT_RESOURCE_SETTINGS["nice"], **(self.config.get("nice") or {})}
+        shares = {int(k): float(v) for k, v in (self.config.get("llm_share") or {}).items()}
+        share = shares.get(int(mode), 0.5)
+
+        cores = self.cores
+        reserved_n = int(self.config.get("reserved_cores", 1))
+        reserved = cores[:reserved_n] if len(cores) > reserved_n else cores
+        rest = cores[len(reserved):] or cores
+        llm_n = min(len(rest), max(1, round(len(rest) * share)))
+        vision_n = max(1, len(rest) - llm_n)   # With a single spare core, vision and the LLM share it
+        # Two or more reserved cores are split between audio and display; a single one is shared
+        split = max(1, len(reserved) // 2)
+        sets = {
+            "audio": reserved[:split],
+            "display": reserved[split:] or reserved,
+            "vision": rest[:vision_n],
+            "llm": rest[-llm_n:],
+        }
+        return {name: {"cores": sets[name], "threads": len(sets[name]), "nice": int(nice.get(name, 0))}
+                for name in SUBSYSTEMS}
+
+    def set_mode(self, system_id):
+        """Re-partitions the cores for a kiosk mode (no-op when the mode did not change)."""
+        with self.lock:
+            if not self.enabled or system_id == self.mode:
+                return
+            self.mode = system_id
+            self.plan = self._plan(system_id)
+        summary = ", ".join(f"{name} {len(p['cores'])}" for name, p in self.plan.items())
+        print(f">>> [Resources] Mode {system_id}: cores {summary}")
+        self.apply()
+
+    # ---------- applying ----------
+    def _apply_task(self, tid, plan):
+        if not LINUX:
+            return
+        try:
+            os.sched_setaffinity(tid, plan["cores"])
+        except OSError:
+            return   # Thread already gone
+        try:
+            os.setpriority(os.PRIO_PROCESS, tid, plan["nice"])
+        except PermissionError:
+            if not self.nice_denied:
+                self.nice_denied = True
+                print("!!! [Resources] Not allowed to raise priorities (needs CAP_SYS_NICE); keeping nice 0 there.")
+            try:
+                os.setpriority(os.PRIO_PROCESS, tid, max(0, plan["nice"]))
+            except OSError:
+                pass
+        except OSError:
+            pass
+
+    def apply(self):
+        """Pushes the current plan to every attached thread and process, and sets the thread counts."""
+        if not self.enabled:
+            return
+        with self.lock:
+            threads = [(tid, sub) for tid, (sub, _, _) in self.threads.items()]
+            processes = dict(self.processes)
+            plan = self.plan
+        for tid, sub in threads:
+            self._apply_task(tid, plan[sub])
+
+        try:
+            import cv2
+            cv2.setNumThreads(plan["vision"]["threads"])
+        except ImportError:
+            pass
+        for sub, (get_pid, set_threads) in processes.items():
+            pid = get_pid()
+            if pid and LINUX:
+                try:
+                    tasks = os.listdir(f"/proc/{pid}/task")   # Every thread: affinity is per thread on Linux
+                except OSError:
+                    tasks = []
+                for task in tasks:
+                    self._apply_task(int(task), plan[sub])
+            if set_threads is not None:
+                set_threads(plan[sub]["threads"])
+
+    # ---------- joining ----------
+    def attach(self, subsystem):
+        """Puts the calling thread (and threads it starts later) into `subsystem`."""
+        tid = threading.get_native_id()
+        now = time.thread_time()
+        with self.lock:
+            previous = self.threads.get(tid)
+            if previous is not None:
+                self.retired[previous[0]] += now - previous[2]   # Time spent in the old subsystem so far
+            self.threads[tid] = (subsystem, threading.get_ident(), now)
+            plan = self.plan.get(subsystem)
+        if plan is not None:
+            self._apply_task(tid, plan)
+        return tid
+
+    def detach(self):
+        tid = threading.get_native_id()
+        with self.lock:
+            entry = self.threads.pop(tid, None)
+            if entry is not None:
+                self.retired[entry[0]] += time.thread_time() - entry[2]
+
+    def subsystem_of_caller(self):
+        with self.lock:
+            entry = self.threads.get(threading.get_native_id())
+        return entry[0] if entry else None
+
+    @contextmanager
+    def running(self, subsystem):
+        """Runs the block in `subsystem`; a thread that belonged to another one returns to it afterwards."""
+        previous = self.subsystem_of_caller()
+        self.attach(subsystem)
+        try:
+            yield
+        finally:
+            self.detach()
+            if previous is not None:
+                self.attach(previous)
+
+    def run(self, subsystem, fn, *args, **kwargs):
+        """Thread target wrapper: threading.Thread(target=resources.run, args=("vision", loop))."""
+        with self.running(subsystem):
+            return fn(*args, **kwargs)
+
+    def attach_process(self, subsystem, get_pid, set_threads=None):
+        """A child process (e.g. the LLM worker). `get_pid` is called on every apply, so restarts are followed."""
+        with self.lock:
+            self.processes[subsystem] = (get_pid, set_threads)
+        self.apply()
+
+    def attach_brain(self, brain):
+        """LLM placement for whichever brain get_brain() returned."""
+        if hasattr(brain, "pid"):
+            # BrainProcess: cores for the worker process, torch threads inside it
+            self.attach_process("llm", lambda: brain.pid, brain.set_threads)
+            if hasattr(brain, "on_start"):
+                brain.on_start.append(lambda _brain: self.apply())
+        elif hasattr(brain, "set_threads"):
+            # In-process BrainEngine: generation threads are started from the (audio) interaction thread,
+            # so the backend moves each thread that runs the model into "llm" explicitly
+            brain.backend.placement = lambda: self.running("llm")
+            self.attach_process("llm", lambda: None, brain.set_threads)
+
+    # ---------- accounting ----------
+    def cpu_seconds(self):
+        """{subsystem: CPU seconds so far}, plus "other" for the rest of this process."""
+        totals = dict(self.retired)
+        with self.lock:
+            threads = list(self.threads.values())
+            processes = dict(self.processes)
+        for sub, ident, start in threads:
+            now = _thread_cpu_seconds(ident)
+            if now is not None:
+                totals[sub] += max(0.0, now - start)
+        accounted = sum(totals.values())
+        for sub, (get_pid, _) in processes.items():
+            pid = get_pid()
+            seconds = _process_cpu_seconds(pid) if pid else None
+            if seconds is not None:
+                totals[sub] += seconds
+        totals["other"] = max(0.0, time.process_time() - accounted)
+        return totals
+
+    def snapshot(self):
+        now, totals = time.perf_counter(), self.cpu_seconds()
+        usage = None
+        if self.last_sample is not None:
+            elapsed = now - self.last_sample[0]
+            usage = {sub: (totals[sub] - self.last_sample[1].get(sub, 0.0)) / elapsed * 100.0
+                     for sub in totals} if elapsed > 0 else None
+        self.last_sample = (now, totals)
+        with self.lock:
+            return {
+                "enabled": self.enabled,
+                "platform_control": LINUX,
+                "mode": self.mode,
+                "cores": self.cores,
+                "plan": self.plan,
+                "threads": {sub: sum(1 for s, _, _ in self.threads.values() if s == sub) for sub in SUBSYSTEMS},
+                "cpu_seconds": totals,
+                "cpu_percent_since_last": usage,   # % of one core, per subsystem
+            }
+
+
+# Global instance, created on first use
+_resources = None
+_resources_lock = threading.Lock()
+
+
+def get_resources():
+    global _resources
+    with _resources_lock:
+        if _resources is None:
+            _resources = ResourceManager()
+        return _resources
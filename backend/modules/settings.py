@@ -0,0 +1,33 @@
+import os
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+# config/settings.yaml lives at the project root, two levels above backend/modules
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+SETTINGS_PATH = os.environ.get("ADORIX_SETTINGS", os.path.join(PROJECT_ROOT, "config", "settings.yaml"))
+
+_cache = None
+
+
+def load_settings(section=None, defaults=None):
+    """
+    Returns config/settings.yaml (or one section of it) merged over `defaults`.
+    Missing file, missing PyYAML or a broken file all fall back to the defaults.
+    """
+    global _cache
+    if _cache is None:
+        _cache = {}
+        if yaml is not None and os.path.exists(SETTINGS_PATH):
+            try:
+                with open(SETTINGS_PATH, "r", encoding="utf-8") as f:
+                    _cache = yaml.safe_load(f) or {}
+            except Exception as e:
+                print(f"!!! [Settings] Could not read {SETTINGS_PATH}: {e}")
+
+    values = _cache.get(section) if section else _cache
+    merged = dict(defaults or {})
+    merged.update(values or {})
+    return merged
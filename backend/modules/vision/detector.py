@@ -226,6 +226,21 @@ class AgeGenderDetector:
                 committed.append(t["stable"])
         return committed
 
+    def get_leading_person(self):
+        """
+        Provisional demographic of the largest track, before dwell/stability gating.
+        Used to speculatively prefetch the ad we are most likely to switch to.
+        """
+        sorted_tracks = sorted(self.tracks.items(), key=lambda kv: self._bbox_area(kv[1]["bbox"]), reverse=True)
+        for tid, t in sorted_tracks:
+            if t["stable"] is not None:
+                return t["stable"]
+            if t["gender_samples"]:
+                gender = Counter(t["gender_samples"]).most_common(1)[0][0]
+                age = self.AGE_MAP.get(self._smoothed_age_idx(t["age_idx_samples"]), "Unknown")
+                return {"id": tid, "gender": gender, "age": age}
+        return None
+
     def export_for_logic_engine(self, now_ts):
         people = self.get_committed_people(now_ts)
         payload = {
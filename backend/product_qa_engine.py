@@ -9,13 +9,14 @@ Handles user questions about products using:
 import os
 import sys
 import json
+import hashlib
 from pathlib import Path
 
 # Add the backend directory to the path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from modules.ad_engine import AdSelector
-# imports deferred to prevent circular dependency
+from modules.qa import CatalogIndex, QAResult, SemanticIndex, tokenize
 
 
 class ProductQAEngine:
@@ -23,6 +24,15 @@ class ProductQAEngine:
     Handles product Q&A with audio I/O.
     Searches through product data and provides answers via TTS.
     """
+
+    # Minimum share of the question's terms a hit must cover to be spoken as-is
+    MIN_CONFIDENCE = 0.5
+    # A second hit is appended when it scores at least this fraction of the first
+    SECOND_HIT_RATIO = 0.8
+    # Cosine a semantic match needs to stand in for a weak keyword match (max out-of-scope is ~0.24)
+    SEMANTIC_MIN_CONFIDENCE = 0.3
+    # Persisted embedding matrices, one .npz per product (see modules/qa/semantic.py)
+    SEMANTIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".semantic_index")
     
     def __init__(self):
         self.rules_path = os.path.join(
@@ -35,78 +45,117 @@ class ProductQAEngine:
         )
         self.selector = AdSelector(self.rules_path, self.ads_dir)
         self.product_data = {}
+        self.product_hashes = {}
+        self.index = CatalogIndex({})
+        self.semantic = SemanticIndex({}, {})
         self._load_all_products()
     
     def _load_all_products(self):
         """Load all product JSON files into memory."""
         print("Loading product database...")
         try:
+            products = {}
             for filename in os.listdir(self.ads_dir):
                 if filename.endswith(".json"):
                     filepath = os.path.join(self.ads_dir, filename)
                     with open(filepath, 'r', encoding='utf-8') as f:
-                        self.product_data[filename] = json.load(f)
+                        products[filename] = json.load(f)
+            index = CatalogIndex(products)
+            hashes = {name: self._content_hash(data) for name, data in products.items()}
+            semantic = SemanticIndex(products, hashes, directory=self.SEMANTIC_DIR)
+            # Swap in together so concurrent readers never see a half-loaded catalog
+            self.product_data, self.product_hashes = products, hashes
+            self.index, self.semantic = index, semantic
             print(f"✓ Loaded {len(self.product_data)} products")
         except Exception as e:
             print(f"Error loading products: {e}")
+
+    def reload(self):
+        """Hot-reload the catalog (e.g. after a content sync)."""
+        self._load_all_products()
+
+    @staticmethod
+    def _content_hash(product):
+        canonical = json.dumps(product, sort_keys=True, separators=(",", ":")).encode("utf-8")
+        return hashlib.sha256(canonical).hexdigest()[:16]
+
+    def product_version(self, product_name):
+        """Content hash of a product's data; changes whenever its JSON does."""
+        return self.product_hashes.get(self._product_key(product_name))
     
+    @staticmethod
+    def _product_key(product_name):
+        """Accepts "16-29_female", "16-29_female.mp4" or "16-29_female.json"."""
+        return os.path.splitext(product_name)[0] + ".json"
+
+    def search(self, question, product_name=None, k=3):
+        """
+        BM25 search over the prebuilt index.
+        Returns SearchHits (product, field, answer, score, confidence), best first.
+        Without a product_name the whole catalog is searched.
+        """
+        product = self._product_key(product_name) if product_name else None
+        return self.index.search(question, product=product, k=k)
+
+    def semantic_search(self, question, product_name=None, k=3):
+        """Cosine top-k over the hashed-vector index; catches paraphrases with no shared keywords."""
+        product = self._product_key(product_name) if product_name else None
+        return self.semantic.search(tokenize(question), product=product, k=k)
+
+    def _calibrated(self, cosine):
+        """
+        A usable semantic cosine (>= SEMANTIC_MIN_CONFIDENCE) on the keyword-confidence scale:
+        SEMANTIC_MIN_CONFIDENCE, just above the out-of-scope cosines, maps to MIN_CONFIDENCE and
+        1.0 to 1.0. The two scores can then be compared directly, and a usable semantic match
+        clears the same thresholds downstream.
+        """
+        span = (cosine - self.SEMANTIC_MIN_CONFIDENCE) / (1.0 - self.SEMANTIC_MIN_CONFIDENCE)
+        return self.MIN_CONFIDENCE + span * (1.0 - self.MIN_CONFIDENCE)
+
+    def answer(self, question, product_name):
+        """
+        Structured answer for the router: QAResult(answer, score, confidence, source, product).
+        `answer` is None when nothing in the product data matched.
+        The keyword and semantic hits are compared on one scale (see _calibrated) and the
+        more confident one answers.
+        """
+        product = self._product_key(product_name) if product_name else None
+        if not question or product not in self.product_data:
+            return QAResult(None, 0.0, 0.0, None, product)
+        hits = self.search(question, product)
+        similar = self.semantic_search(question, product, k=1)
+        if similar and similar[0].confidence >= self.SEMANTIC_MIN_CONFIDENCE:
+            top = similar[0]
+            confidence = self._calibrated(top.confidence)
+            if not hits or confidence > hits[0].confidence:
+                return QAResult(top.answer, top.score, confidence, top.field, product)
+        if not hits:
+            return QAResult(None, 0.0, 0.0, None, product)
+
+        top = hits[0]
+        answer = " ".join(self._top_answers(hits))[:200]  # Limit to reasonable length for TTS
+        return QAResult(answer, top.score, top.confidence, top.field, product)
+
+    def _top_answers(self, hits):
+        """Best hit, plus the runner-up when it is confident and scores almost as well."""
+        results = [hits[0].answer]
+        for hit in hits[1:2]:
+            if hit.confidence >= self.MIN_CONFIDENCE and hit.score >= hits[0].score * self.SECOND_HIT_RATIO:
+                results.append(hit.answer)
+        return results
+
     def search_product_info(self, question, product_name):
         """
         Search product data for relevant information.
-        Returns matching info from the product JSON.
+        Returns the answers of confident hits, best first.
         """
-        if product_name not in self.product_data:
+        if self._product_key(product_name) not in self.product_data:
             return None
-        
-        product = self.product_data[product_name]
-        question_lower = question.lower()
-        
-        # Search through product fields
-        searchable_fields = {
-            'product_name': product.get('product_name', ''),
-            'brand': product.get('brand', ''),
-            'category': product.get('category', ''),
-            'price': product.get('price', ''),
-            'description': product.get('description', ''),
-            'key_features': ' '.join(product.get('key_features', [])),
-            'faqs': self._format_faqs(product.get('faqs', {}))
-        }
-        
-        results = []
-        
-        # Check for price-related questions
-        if any(word in question_lower for word in ['price', 'cost', 'how much', 'expense', 'afford']):
-            results.append(f"The price is {product.get('price', 'not available')}.")
-        
-        # Check for feature/benefit questions
-        if any(word in question_lower for word in ['feature', 'what', 'include', 'have', 'comes with']):
-            features = product.get('key_features', [])
-            if features:
-                results.append(f"Key features include: {', '.join(features[:2])}.")
-        
-        # Check for category/type questions
-        if any(word in question_lower for word in ['what is', 'category', 'type', 'what kind']):
-            category = product.get('category', '')
-            if category:
-                results.append(f"This is a {category} product by {product.get('brand', 'brand')}.")
-        
-        # Check for FAQ matches
-        faqs = product.get('faqs', {})
-        for faq_key, faq_value in faqs.items():
-            if any(word in question_lower for word in faq_key.lower().split('_')):
-                results.append(faq_value)
-        
-        # Generic description fallback
-        if not results:
-            desc = product.get('description', '')
-            if desc:
-                results.append(desc)
-        
-        return results
-    
-    def _format_faqs(self, faqs_dict):
-        """Convert FAQ dict to searchable string."""
-        return ' '.join([f"{k}: {v}" for k, v in faqs_dict.items()])
+
+        hits = self.search(question, product_name)
+        if not hits or hits[0].confidence < self.MIN_CONFIDENCE:
+            return []
+        return self._top_answers(hits)
     
     def get_answer(self, question, product_name):
         """
@@ -115,12 +164,10 @@ class ProductQAEngine:
         if not question or not product_name:
             return "I didn't catch that. Could you repeat your question?"
         
-        results = self.search_product_info(question, product_name)
+        result = self.answer(question, product_name)
         
-        if results:
-            # Combine top 2 results for comprehensive answer
-            answer = " ".join(results[:2])
-            return answer[:200]  # Limit to reasonable length for TTS
+        if result.answer and result.confidence >= self.MIN_CONFIDENCE:
+            return result.answer
         else:
             return f"I don't have specific information about that, but I'd be happy to tell you more about our products!"
     
@@ -0,0 +1,595 @@
+"""
+QA Benchmark
+Runs the labeled question set in modules/qa/data/qa_eval.json through the
+product QA fast path and reports accuracy and latency.
+
+An answer counts as correct when it contains the text of the expected field
+(e.g. the FAQ answer or the price). Questions labeled with no expected field
+are out of scope; the correct behavior there is to decline.
+
+Cases may carry a "set" label (e.g. "paraphrase": questions sharing few
+words with the product data); accuracy is also reported per set.
+
+`--router` runs the full QARouter headless (answer cache, an answer bank built
+from index answers, thresholds from settings.yaml) for two passes and reports
+per-route counts, latency percentiles, correctness and cache/bank hit rates.
+`--router-backend NAME` gives the router a real LLM; without one, LLM-route
+questions take the warm-up fallback.
+
+`--calibrate` sweeps the router's confidence thresholds over the same set.
+
+`--backends transformers,llama_cpp` benchmarks the LLM generation backends
+(settings.yaml brain:) on the in-scope questions; `backend:dtype` picks a
+precision, e.g. transformers:float32,transformers:int8,transformers:bfloat16.
+Each backend runs in its own process so its RSS is measured cleanly. The report covers load time, RSS,
+latency, time to first token and answer agreement with the first backend.
+
+`--responsiveness` measures what LLM generation does to the rest of the
+kiosk: a 30 fps frame loop (stand-in for the vision thread) and an asyncio
+broadcast tick (stand-in for the websocket) run while the brain answers
+questions, first with no generation, then with BrainEngine in this process,
+then with BrainProcess (worker process). Reported: achieved fps, frame
+interval p95 and broadcast lag p50/p95/max.
+
+`--kiosks 1,2,4,8` simulates that many kiosks asking questions at once
+against one loaded model: serially (one answer at a time, as before the
+shared service) and with continuous batching. Reported per kiosk count:
+answers/s and per-request latency p50/p95. `--kiosk-service URL` runs the
+batched pass through a running llm_service.py instead of in this process.
+
+`--json PATH` writes everything measured (plus git revision, corpus and
+memory) as one JSON report, so runs can be diffed to catch regressions.
+
+Usage: python qa_benchmark.py [--repeat N] [--router] [--calibrate] [--backends a,b] [--responsiveness]
+                       [--kiosks 1,2,4,8] [--json PATH]
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import threading
+import subprocess
+
+backend_dir = os.path.dirname(os.path.abspath(__file__))
+if backend_dir not in sys.path:
+    sys.path.append(backend_dir)
+
+from product_qa_engine import ProductQAEngine
+from modules.qa import tokenize, QARouter, RouteMetrics, AnswerCache, AnswerBank, ROUTE_CANNED
+from modules.settings import load_settings
+
+EVAL_PATH = os.path.join(backend_dir, "modules", "qa", "data", "qa_eval.json")
+NO_ANSWER = "I don't have specific information"
+
+
+def legacy_search(product, question):
+    """The keyword matcher ProductQAEngine used before the BM25 index (kept as the baseline)."""
+    question_lower = question.lower()
+    results = []
+    if any(word in question_lower for word in ['price', 'cost', 'how much', 'expense', 'afford']):
+        results.append(f"The price is {product.get('price', 'not available')}.")
+    if any(word in question_lower for word in ['feature', 'what', 'include', 'have', 'comes with']):
+        features = product.get('key_features', [])
+        if features:
+            results.append(f"Key features include: {', '.join(features[:2])}.")
+    if any(word in question_lower for word in ['what is', 'category', 'type', 'what kind']):
+        category = product.get('category', '')
+        if category:
+            results.append(f"This is a {category} product by {product.get('brand', 'brand')}.")
+    for faq_key, faq_value in product.get('faqs', {}).items():
+        if any(word in question_lower for word in faq_key.lower().split('_')):
+            results.append(faq_value)
+    if not results and product.get('description'):
+        results.append(product['description'])
+    return results
+
+
+def semantic_answer(engine, question, product_name):
+    """Hashed-vector cosine alone, without the BM25 index (for comparison)."""
+    hits = engine.semantic_search(question, product_name, k=1)
+    if hits and hits[0].confidence >= engine.SEMANTIC_MIN_CONFIDENCE:
+        return hits[0].answer
+    return f"{NO_ANSWER} about that, but I'd be happy to tell you more about our products!"
+
+
+def legacy_answer(engine, question, product_name):
+    results = legacy_search(engine.product_data[product_name], question)
+    if results:
+        return " ".join(results[:2])[:200]
+    return f"{NO_ANSWER} about that, but I'd be happy to tell you more about our products!"
+
+
+def expected_text(product, field):
+    """Text that must appear in a correct answer for `field`."""
+    if field.startswith("faqs."):
+        return product["faqs"][field[5:]]
+    if field.startswith("key_features."):
+        return product["key_features"][int(field.split(".")[1])][1:]
+    if field == "available_colors":
+        return product["available_colors"][0]
+    return product[field]
+
+
+def is_correct(answer, product, field):
+    if field is None:
+        return answer.startswith(NO_ANSWER)
+    return expected_text(product, field).lower() in answer.lower()
+
+
+def accuracy_by_set(cases, outcomes):
+    """{set label: accuracy} from per-case booleans; unlabeled cases are "core"."""
+    totals = {}
+    for case, ok in zip(cases, outcomes):
+        label = case.get("set", "core")
+        hits, count = totals.get(label, (0, 0))
+        totals[label] = (hits + ok, count + 1)
+    return {label: hits / count for label, (hits, count) in sorted(totals.items())}
+
+
+def run(name, answer_fn, engine, cases, repeat):
+    correct, in_scope_ok, declined_ok, timings, misses, outcomes = 0, 0, 0, [], [], []
+    for case in cases:
+        product_name, question, field = case["product"], case["question"], case["expected"]
+        start = time.perf_counter()
+        for _ in range(repeat):
+            answer = answer_fn(engine, question, product_name)
+        timings.append((time.perf_counter() - start) / repeat)
+        outcomes.append(is_correct(answer, engine.product_data[product_name], field))
+        if outcomes[-1]:
+            correct += 1
+            if field is None:
+                declined_ok += 1
+            else:
+                in_scope_ok += 1
+        else:
+            misses.append((question, field, answer))
+
+    timings.sort()
+    in_scope = sum(1 for c in cases if c["expected"] is not None)
+    result = {
+        "name": name,
+        "accuracy": correct / len(cases),
+        "in_scope_accuracy": in_scope_ok / in_scope if in_scope else None,
+        "declined_out_of_scope": f"{declined_ok}/{len(cases) - in_scope}",
+        "by_set": accuracy_by_set(cases, outcomes),
+        "p50_us": timings[len(timings) // 2] * 1e6,
+        "p95_us": timings[min(len(timings) - 1, int(len(timings) * 0.95))] * 1e6,
+        "mean_us": sum(timings) / len(timings) * 1e6,
+    }
+    return result, misses
+
+
+def index_bank(engine, directory):
+    """An answer bank built from index answers, so router runs are reproducible without an LLM."""
+    from build_answer_bank import build_product
+    bank = AnswerBank(os.path.join(directory, "bank.json"))
+    for product in engine.product_data:
+        bank.update(product, engine.product_version(product), build_product(engine, None, product, 0), "index")
+    return bank
+
+
+def run_router(engine, cases, backend=None, passes=2):
+    """
+    Every case through QARouter, `passes` times (the first pass fills the cache).
+    Returns per-pass route counts/latency/correctness plus cache and bank stats.
+    """
+    brain = None
+    if backend:
+        from modules.llm import BrainEngine
+        from modules.llm.brain import DEFAULT_BRAIN_SETTINGS
+        brain = BrainEngine({**load_settings("brain", DEFAULT_BRAIN_SETTINGS), "backend": backend})
+
+    def ask(question, product_name):
+        return brain.generate_answer(question, brain.load_context_from_json(product_name))
+
+    settings = load_settings("qa", {"fast_confidence": 0.4, "llm_confidence": 0.25, "bank_confidence": 0.8})
+    with tempfile.TemporaryDirectory() as directory:
+        router = QARouter(
+            engine, llm=ask, llm_ready=lambda: brain is not None,
+            cache=AnswerCache(memory_size=1024), bank=index_bank(engine, directory),
+            fast_confidence=settings["fast_confidence"], llm_confidence=settings["llm_confidence"],
+            bank_confidence=settings["bank_confidence"],
+        )
+        results = []
+        for number in range(1, passes + 1):
+            router.metrics = RouteMetrics()   # Fresh latency stats per pass
+            correct = {}
+            outcomes = []
+            for case in cases:
+                route, answer, _ = router.answer(case["question"], case["product"])
+                if case["expected"] is None:
+                    ok = route == ROUTE_CANNED
+                else:
+                    product = engine.product_data[engine._product_key(case["product"])]
+                    ok = is_correct(answer, product, case["expected"])
+                outcomes.append(ok)
+                hits, count = correct.get(route, (0, 0))
+                correct[route] = (hits + ok, count + 1)
+            stats = router.stats()
+            for route, (hits, count) in correct.items():
+                stats["routes"][route]["accuracy"] = hits / count
+            stats["pass"] = number
+            stats["accuracy"] = sum(outcomes) / len(outcomes)
+            stats["by_set"] = accuracy_by_set(cases, outcomes)
+            results.append(stats)
+    return {"llm_backend": backend, "passes": results}
+
+
+def print_router(report):
+    print(f"\n--- Router ({report['llm_backend'] or 'no LLM: warm-up fallback'}) ---")
+    for result in report["passes"]:
+        print(f"pass {result['pass']}: accuracy {result['accuracy']:.1%}  "
+              f"cache hit rate {result['cache']['hit_rate']:.1%}  bank hits {result['bank']['hits']}")
+        for route, r in sorted(result["routes"].items()):
+            print(f"    {route:7s} {r['count']:3d} ({r['share']:5.1%})  accuracy {r['accuracy']:6.1%}  "
+                  f"p50 {r['p50_ms'] * 1000:7.1f}us  p95 {r['p95_ms'] * 1000:7.1f}us")
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=backend_dir,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def calibrate(engine, cases):
+    """
+    For each candidate threshold: how many in-scope questions the fast path
+    answers (coverage), how many of those are right (precision) and how many
+    out-of-scope questions slip through as confident answers.
+    """
+    scored = []
+    for case in cases:
+        result = engine.answer(case["question"], case["product"])
+        product = engine.product_data[engine._product_key(case["product"])]
+        ok = result.answer is not None and case["expected"] is not None \
+            and is_correct(result.answer, product, case["expected"])
+        scored.append((result.confidence, case["expected"] is not None, ok))
+
+    in_scope = sum(1 for _, scoped, _ in scored if scoped)
+    out_scope = len(scored) - in_scope
+    print(f"\n--- Threshold sweep ({in_scope} in scope, {out_scope} out of scope) ---")
+    print("threshold  coverage  precision  oos_leaked")
+    for step in range(1, 10):
+        threshold = step / 10.0
+        fast = [(scoped, ok) for conf, scoped, ok in scored if conf >= threshold]
+        correct = sum(1 for _, ok in fast if ok)
+        answered = sum(1 for scoped, _ in fast if scoped)
+        leaked = sum(1 for scoped, _ in fast if not scoped)
+        precision = correct / len(fast) if fast else 0.0
+        print(f"   {threshold:.1f}     {answered / in_scope:6.1%}    {precision:6.1%}      {leaked}/{out_scope}")
+
+    print("\nConfidence of out-of-scope questions: "
+          + ", ".join(f"{conf:.2f}" for conf, scoped, _ in scored if not scoped))
+
+
+def rss_mb():
+    """Current resident set size of this process in MB."""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / (1024 * 1024)
+    except ImportError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0  # Peak, on Linux in KB
+
+
+def token_overlap(a, b):
+    a, b = set(tokenize(a)), set(tokenize(b))
+    return len(a & b) / len(a | b) if a and b else 0.0
+
+
+def run_llm_worker(backend, cases, limit):
+    """Runs inside a child process: loads one backend[:dtype], answers the questions, prints a JSON report."""
+    from modules.llm import BrainEngine
+    from modules.settings import load_settings
+    from modules.llm.brain import DEFAULT_BRAIN_SETTINGS
+
+    config = load_settings("brain", DEFAULT_BRAIN_SETTINGS)
+    config["backend"], _, dtype = backend.partition(":")
+    if dtype:
+        config["dtype"] = dtype
+    rss_before = rss_mb()
+    start = time.perf_counter()
+    brain = BrainEngine(config)
+    load_s = time.perf_counter() - start
+
+    engine = ProductQAEngine()
+    answers, latencies, recall = [], [], []
+    for case in [c for c in cases if c["expected"] is not None][:limit]:
+        context = brain.load_context_from_json(case["product"])
+        start = time.perf_counter()
+        answer = brain.generate_answer(case["question"], context)
+        latencies.append(time.perf_counter() - start)
+        answers.append(answer)
+        # Share of the expected field's words the generated answer contains
+        product = engine.product_data[engine._product_key(case["product"])]
+        expected = set(tokenize(expected_text(product, case["expected"])))
+        recall.append(len(expected & set(tokenize(answer))) / len(expected) if expected else 0.0)
+
+    latencies.sort()
+    stats = brain.stats()
+    print("BENCH_JSON " + json.dumps({
+        "backend": backend,
+        "load_s": load_s,
+        "rss_mb": rss_mb(),
+        "model_rss_mb": rss_mb() - rss_before,
+        "p50_ms": latencies[len(latencies) // 2] * 1000.0,
+        "p95_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000.0,
+        "ttft_ms": stats.get("ttft_reuse_p50_ms") or stats.get("ttft_full_p50_ms"),
+        "fact_recall": sum(recall) / len(recall),
+        "deadline_hits": stats.get("deadline_hits", 0),
+        "answers": answers,
+    }))
+
+
+def compare_backends(backends, limit):
+    reports = []
+    for backend in backends:
+        print(f"\n>>> [Bench] Running {backend} backend on {limit} questions...")
+        proc = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--llm-worker", backend, "--llm-questions", str(limit)],
+            capture_output=True, text=True,
+        )
+        lines = [l for l in proc.stdout.splitlines() if l.startswith("BENCH_JSON ")]
+        if proc.returncode != 0 or not lines:
+            print(f"!!! [Bench] {backend} failed: {proc.stderr.strip()[-400:]}")
+            continue
+        reports.append(json.loads(lines[-1][len("BENCH_JSON "):]))
+
+    if not reports:
+        return reports
+    reference = reports[0]
+    print(f"\n--- LLM backends ({limit} questions, agreement vs {reference['backend']}) ---")
+    print("backend                 load_s   rss_mb  p50_ms   p95_ms  ttft_ms  fact_recall  agreement  deadline_hits")
+    for report in reports:
+        agreement = sum(token_overlap(a, b) for a, b in zip(report["answers"], reference["answers"])) \
+            / max(1, len(report["answers"]))
+        ttft = f"{report['ttft_ms']:7.0f}" if report["ttft_ms"] else "    n/a"
+        print(f"{report['backend']:22s} {report['load_s']:6.1f}  {report['rss_mb']:7.0f}  {report['p50_ms']:6.0f}  "
+              f"{report['p95_ms']:7.0f}  {ttft}  {report['fact_recall']:10.1%}  {agreement:9.1%}  "
+              f"{report['deadline_hits']:13d}")
+        report["agreement"] = agreement
+    for report in reports:
+        del report["answers"]  # Kept out of the JSON report
+    return reports
+
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))] if ordered else 0.0
+
+
+def measure_main_loop(work, target_fps=30, tick_s=0.05):
+    """
+    Runs a frame loop and an asyncio broadcast tick on threads while `work()`
+    runs; returns fps, frame interval p95 and broadcast lag percentiles.
+    """
+    import cv2
+    import numpy as np
+
+    frame = np.random.randint(0, 255, (480, 640, 3), dtype=np.uint8)
+    stop = threading.Event()
+    frame_times, lags = [], []
+
+    def vision():
+        period = 1.0 / target_fps
+        while not stop.is_set():
+            start = time.perf_counter()
+            gray = cv2.cvtColor(cv2.resize(frame, (320, 240)), cv2.COLOR_BGR2GRAY)
+            cv2.GaussianBlur(gray, (5, 5), 0)
+            frame_times.append(time.perf_counter())
+            time.sleep(max(0.0, period - (time.perf_counter() - start)))
+
+    async def broadcast():
+        while not stop.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(tick_s)
+            json.dumps({"type": "STATE", "payload": {"faces": [[0, 0, 10, 10]] * 4}})
+            lags.append(time.perf_counter() - start - tick_s)
+
+    threads = [threading.Thread(target=vision), threading.Thread(target=lambda: asyncio.run(broadcast()))]
+    for t in threads:
+        t.start()
+    start = time.perf_counter()
+    work()
+    elapsed = time.perf_counter() - start
+    stop.set()
+    for t in threads:
+        t.join()
+
+    intervals = [b - a for a, b in zip(frame_times, frame_times[1:])]
+    return {
+        "seconds": elapsed,
+        "fps": len(frame_times) / elapsed,
+        "frame_interval_p95_ms": percentile(intervals, 0.95) * 1000.0,
+        "broadcast_lag_p50_ms": percentile(lags, 0.5) * 1000.0,
+        "broadcast_lag_p95_ms": percentile(lags, 0.95) * 1000.0,
+        "broadcast_lag_max_ms": max(lags) * 1000.0 if lags else 0.0,
+    }
+
+
+def measure_responsiveness(cases, limit):
+    """Main-loop health with no generation, in-process generation and worker-process generation."""
+    from modules.llm import BrainEngine, BrainProcess
+    from modules.llm.brain import DEFAULT_BRAIN_SETTINGS
+
+    config = load_settings("brain", DEFAULT_BRAIN_SETTINGS)
+    questions = [c for c in cases if c["expected"] is not None][:limit]
+    contexts = {c["product"]: BrainEngine.load_context_from_json(c["product"]) for c in questions}
+
+    def answer_all(brain):
+        for case in questions:
+            brain.generate_answer(case["question"], contexts[case["product"]])
+
+    reports = []
+    for mode in ("idle", "in_process", "worker"):
+        brain = None
+        if mode == "in_process":
+            brain = BrainEngine(config)
+        elif mode == "worker":
+            brain = BrainProcess(config)
+        print(f"\n>>> [Bench] Main loop with {mode} brain ({len(questions)} questions)...")
+        report = measure_main_loop(lambda: answer_all(brain) if brain else time.sleep(3.0))
+        if mode == "worker":
+            brain.stop()
+        reports.append({"mode": mode, **report})
+
+    print(f"\n--- Responsiveness during generation ({len(questions)} answers) ---")
+    print("mode          seconds    fps  frame_p95_ms  lag_p50_ms  lag_p95_ms  lag_max_ms")
+    for r in reports:
+        print(f"{r['mode']:12s} {r['seconds']:8.1f} {r['fps']:6.1f} {r['frame_interval_p95_ms']:13.1f} "
+              f"{r['broadcast_lag_p50_ms']:11.1f} {r['broadcast_lag_p95_ms']:11.1f} {r['broadcast_lag_max_ms']:11.1f}")
+    return reports
+
+
+def run_kiosks(brain, questions, kiosks, per_kiosk):
+    """`kiosks` threads each ask `per_kiosk` questions back to back; returns throughput and latency."""
+    latencies = []
+    lock = threading.Lock()
+
+    def kiosk(offset):
+        for i in range(per_kiosk):
+            question, context = questions[(offset + i) % len(questions)]
+            start = time.perf_counter()
+            brain.generate_answer(question, context)
+            with lock:
+                latencies.append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=kiosk, args=(k * per_kiosk,)) for k in range(kiosks)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    return {
+        "kiosks": kiosks,
+        "answers": len(latencies),
+        "answers_per_s": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 0.5) * 1000.0,
+        "p95_ms": percentile(latencies, 0.95) * 1000.0,
+    }
+
+
+def measure_kiosks(cases, counts, per_kiosk, service_url=None):
+    """Serial vs continuously batched generation at each kiosk count."""
+    from modules.llm import BrainEngine, BrainClient
+    from modules.llm.brain import DEFAULT_BRAIN_SETTINGS
+
+    contexts = {}
+    questions = []
+    for case in cases:
+        if case["expected"] is not None:
+            if case["product"] not in contexts:
+                contexts[case["product"]] = BrainEngine.load_context_from_json(case["product"])
+            questions.append((case["question"], contexts[case["product"]]))
+
+    reports = []
+    if service_url:
+        modes = [("service", BrainClient(service_url))]
+    else:
+        brain = BrainEngine(load_settings("brain", DEFAULT_BRAIN_SETTINGS))
+        for context in contexts.values():
+            brain.prepare_prefix(context)
+        modes = [("serial", brain), ("batched", brain)]
+    for mode, brain in modes:
+        if mode == "batched":
+            brain.backend.enable_batching(max(counts))
+        for kiosks in counts:
+            print(f"\n>>> [Bench] {kiosks} kiosk(s), {mode}...")
+            reports.append({"mode": mode, **run_kiosks(brain, questions, kiosks, per_kiosk)})
+
+    print(f"\n--- Concurrent kiosks ({per_kiosk} questions each) ---")
+    print("mode       kiosks  answers/s   p50_ms   p95_ms")
+    for r in reports:
+        print(f"{r['mode']:9s} {r['kiosks']:7d} {r['answers_per_s']:10.2f} {r['p50_ms']:8.0f} {r['p95_ms']:8.0f}")
+    return reports
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the product QA fast path")
+    parser.add_argument("--repeat", type=int, default=200, help="Timed repetitions per question")
+    parser.add_argument("--show-misses", action="store_true")
+    parser.add_argument("--calibrate", action="store_true", help="Sweep router confidence thresholds")
+    parser.add_argument("--backends", help="Comma-separated LLM backends to compare, e.g. transformers,llama_cpp")
+    parser.add_argument("--llm-questions", type=int, default=20, help="In-scope questions per LLM backend")
+    parser.add_argument("--router", action="store_true", help="Run the full router headless (two passes)")
+    parser.add_argument("--router-backend", help="LLM backend for the router run (default: none)")
+    parser.add_argument("--responsiveness", action="store_true",
+                        help="Measure vision fps / broadcast lag during in-process vs worker generation")
+    parser.add_argument("--kiosks", help="Comma-separated concurrent kiosk counts, e.g. 1,2,4,8")
+    parser.add_argument("--kiosk-service", help="Run the kiosk benchmark against this llm_service.py URL")
+    parser.add_argument("--json", help="Write the full report to this file ('-' for stdout)")
+    parser.add_argument("--llm-worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    with open(EVAL_PATH, "r", encoding="utf-8") as f:
+        cases = json.load(f)
+    if args.llm_worker:
+        run_llm_worker(args.llm_worker, cases, args.llm_questions)
+        return
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "revision": git_revision(),
+        "corpus": {
+            "questions": len(cases),
+            "products": len({c["product"] for c in cases}),
+            "out_of_scope": sum(1 for c in cases if c["expected"] is None),
+            "sets": {label: sum(1 for c in cases if c.get("set", "core") == label)
+                     for label in sorted({c.get("set", "core") for c in cases})},
+        },
+        "memory_mb": {"start": rss_mb()},
+    }
+    engine = ProductQAEngine()
+    report["memory_mb"]["engine_loaded"] = rss_mb()
+
+    print(f"\n--- QA Benchmark: {len(cases)} questions, {args.repeat} runs each ---")
+    report["fast_path"] = []
+    for name, fn in (("legacy keywords", legacy_answer), ("semantic only", semantic_answer),
+                     ("bm25 + semantic", ProductQAEngine.get_answer)):
+        result, misses = run(name, fn, engine, cases, args.repeat)
+        report["fast_path"].append(result)
+        print(f"{name:16s} accuracy {result['accuracy']:.1%} (in scope {result['in_scope_accuracy']:.1%}, "
+              f"declined {result['declined_out_of_scope']})  "
+              f"p50 {result['p50_us']:.1f}us  p95 {result['p95_us']:.1f}us  mean {result['mean_us']:.1f}us")
+        print(" " * 17 + "by set: " + ", ".join(f"{k} {v:.1%}" for k, v in result["by_set"].items()))
+        if args.show_misses:
+            for question, field, answer in misses:
+                print(f"    [MISS] {question!r} expected {field}: {answer[:90]!r}")
+
+    if args.router or args.router_backend:
+        report["router"] = run_router(engine, cases, args.router_backend)
+        report["memory_mb"]["after_router"] = rss_mb()
+        print_router(report["router"])
+
+    if args.calibrate:
+        calibrate(engine, cases)
+
+    if args.backends:
+        report["llm_backends"] = compare_backends(
+            [b.strip() for b in args.backends.split(",") if b.strip()], args.llm_questions)
+
+    if args.responsiveness:
+        report["responsiveness"] = measure_responsiveness(cases, args.llm_questions)
+
+    if args.kiosks:
+        report["kiosks"] = measure_kiosks(cases, [int(n) for n in args.kiosks.split(",")],
+                                          args.llm_questions, args.kiosk_service)
+
+    if args.json:
+        text = json.dumps(report, indent=2)
+        if args.json == "-":
+            print(text)
+        else:
+            with open(args.json, "w", encoding="utf-8") as f:
+                f.write(text)
+            print(f"\n>>> [Bench] Report written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
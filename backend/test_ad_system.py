@@ -9,7 +9,7 @@ if backend_dir not in sys.path:
 
 # Import Ad Selector
 from modules.ad_engine.selector import AdSelector
-from modules.interaction.brain_engine import adorix_brain
+from modules.interaction.brain_engine import get_brain
 
 def test_ad_selector_and_context():
     print("\n--- Testing Ad Selector & Knowledge Loading (Real Data) ---")
@@ -49,7 +49,7 @@ def test_ad_selector_and_context():
 
         # Verification: Check if brain_engine can load knowledge using this result (stripping .mp4)
         print(f"   -> Loading knowledge for: {result}...")
-        context = adorix_brain.load_context_from_json(result)
+        context = get_brain().load_context_from_json(result)
         if context:
             print(f"      ✅ Knowledge context loaded.")
         else:
@@ -0,0 +1,125 @@
+import os
+import sys
+import json
+import shutil
+import tempfile
+
+# Add backend directory to sys.path
+backend_dir = os.path.dirname(os.path.abspath(__file__))
+if backend_dir not in sys.path:
+    sys.path.append(backend_dir)
+
+from content_sync import ContentSyncClient, serve, sha256_file
+
+KEY = "adorix-test-key"
+PORT = 8091
+
+
+def check(name, condition):
+    print(f"{'[PASS]' if condition else '[FAIL]'} {name}")
+    return condition
+
+
+def run_test():
+    print("\n--- Testing Content Sync against a local stand-in server ---")
+    work = tempfile.mkdtemp(prefix="adorix_sync_")
+    server_ads = os.path.join(work, "server", "ads")
+    server_data = os.path.join(work, "server", "data")
+    kiosk_ads = os.path.join(work, "kiosk", "ads")
+    kiosk_data = os.path.join(work, "kiosk", "data")
+    for d in (server_ads, server_data, kiosk_ads, kiosk_data):
+        os.makedirs(d)
+
+    with open(os.path.join(server_ads, "16-29_male.mp4"), "wb") as f:
+        f.write(os.urandom(300_000))
+    with open(os.path.join(server_data, "16-29_male.json"), "w") as f:
+        json.dump({"product_name": "Sneaker", "price": "Rs. 42,000"}, f)
+
+    server = serve({"ads": server_ads, "data": server_data}, KEY, port=PORT)
+    reloaded = []
+    client = ContentSyncClient(
+        f"http://127.0.0.1:{PORT}", KEY,
+        targets={"ads": kiosk_ads, "data": kiosk_data},
+        staging_dir=os.path.join(work, "kiosk", ".sync_staging"),
+    )
+    client.on_update(reloaded.append)
+
+    passed = 0
+    try:
+        # 1. First sync copies everything
+        summary = client.sync_once()
+        passed += check("Initial sync downloads both files", len(summary["changed"]) == 2)
+        passed += check("Reload callback fired", len(reloaded) == 1)
+
+        # 2. Nothing changed -> nothing downloaded
+        before = client.stats["bytes_downloaded"]
+        summary = client.sync_once()
+        passed += check("No-op sync downloads nothing", not summary["changed"] and client.stats["bytes_downloaded"] == before)
+
+        # 3. Only the changed product file is pulled
+        with open(os.path.join(server_data, "16-29_male.json"), "w") as f:
+            json.dump({"product_name": "Sneaker", "price": "Rs. 39,000"}, f)
+        summary = client.sync_once()
+        passed += check("Delta sync pulls only the changed blob", summary["changed"] == ["data/16-29_male.json"])
+
+        # 4. Interrupted transfer resumes from the .part file
+        with open(os.path.join(server_ads, "16-29_male.mp4"), "wb") as f:
+            f.write(os.urandom(300_000))
+        src = os.path.join(server_ads, "16-29_male.mp4")
+        digest = sha256_file(src)
+        with open(src, "rb") as f, open(os.path.join(client.staging_dir, digest + ".part"), "wb") as part:
+            part.write(f.read(100_000))
+        resumed_before = client.stats["bytes_resumed"]
+        summary = client.sync_once()
+        passed += check("Interrupted download resumes",
+                        client.stats["bytes_resumed"] - resumed_before == 100_000
+                        and sha256_file(os.path.join(kiosk_ads, "16-29_male.mp4")) == digest)
+
+        # 5. A .part file that is already complete is verified, not re-requested (a real server answers 416)
+        with open(src, "wb") as f:
+            f.write(os.urandom(200_000))
+        digest = sha256_file(src)
+        shutil.copyfile(src, os.path.join(client.staging_dir, digest + ".part"))
+        downloaded_before = client.stats["bytes_downloaded"]
+        summary = client.sync_once()
+        passed += check("Complete .part file is installed without downloading",
+                        summary["error"] is None and client.stats["bytes_downloaded"] == downloaded_before
+                        and sha256_file(os.path.join(kiosk_ads, "16-29_male.mp4")) == digest)
+        partial = os.path.join(client.staging_dir, "x.part")
+        with open(partial, "wb") as f:
+            f.write(b"abc")
+        client._fetch(digest, partial, 200_000)   # Range past the end -> 416
+        passed += check("416 on a finished range is not an error", os.path.getsize(partial) == 3)
+
+        # 6. A client with the wrong key refuses the manifest
+        rogue = ContentSyncClient(f"http://127.0.0.1:{PORT}", "wrong-key",
+                                  targets={"ads": kiosk_ads}, staging_dir=client.staging_dir)
+        summary = rogue.sync_once()
+        passed += check("Bad signature is rejected", summary["error"] is not None and not summary["changed"])
+
+        # 7. Without a key nothing is trusted (an empty HMAC key is forgeable by anyone)
+        keyless = ContentSyncClient(f"http://127.0.0.1:{PORT}", "",
+                                    targets={"ads": kiosk_ads}, staging_dir=client.staging_dir)
+        summary = keyless.sync_once()
+        passed += check("Empty key is refused", summary["error"] is not None and not summary["changed"])
+
+        # 8. Byte-identical files share one staged blob; every copy is installed in one sync
+        clip = os.urandom(50_000)
+        for name in ("furniture.mp4", "gaming.mp4", "puppy.mp4"):
+            with open(os.path.join(server_ads, name), "wb") as f:
+                f.write(clip)
+        reloaded.clear()
+        summary = client.sync_once()
+        passed += check("Identical files are all installed",
+                        summary["error"] is None and len(summary["changed"]) == 3 and len(reloaded) == 1
+                        and all(os.path.exists(os.path.join(kiosk_ads, n))
+                                for n in ("furniture.mp4", "gaming.mp4", "puppy.mp4")))
+    finally:
+        server.shutdown()
+        shutil.rmtree(work, ignore_errors=True)
+
+    print(f"\nFinal Results: {passed}/10 checks passed.")
+
+
+if __name__ == "__main__":
+    run_test()
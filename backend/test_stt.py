@@ -0,0 +1,94 @@
+"""
+Streaming STT test: feeds WAV files through the same path as the microphone
+(modules/interaction/streaming_stt.py) and prints the partial transcripts, the
+final transcript and how long after the end of speech it was ready.
+
+A file.txt next to file.wav holds the expected transcript; when it exists the
+word error rate is reported too.
+
+Usage: python test_stt.py recordings/*.wav [--realtime] [--model tiny.en] [--endpoint-ms 400]
+  --realtime  feeds frames at microphone speed (latencies as on the kiosk);
+              otherwise files are read as fast as the decoder allows
+"""
+
+import os
+import re
+import sys
+import time
+import argparse
+
+from modules.interaction.streaming_stt import StreamingSTT, DEFAULT_STT_SETTINGS, wav_frames
+from modules.settings import load_settings
+
+
+def words(text):
+    return re.findall(r"[a-z0-9']+", (text or "").lower())
+
+
+def word_error_rate(expected, heard):
+    """Word-level edit distance / number of expected words."""
+    ref, hyp = words(expected), words(heard)
+    row = list(range(len(hyp) + 1))
+    for i, r in enumerate(ref, 1):
+        prev, row[0] = row[0], i
+        for j, h in enumerate(hyp, 1):
+            prev, row[j] = row[j], min(row[j] + 1, row[j - 1] + 1, prev + (r != h))
+    return row[-1] / max(1, len(ref))
+
+
+def run_file(stt, path, realtime):
+    print(f"\n--- {os.path.basename(path)} ---")
+    started = time.perf_counter()
+
+    def on_partial(text):
+        print(f"  [{time.perf_counter() - started:6.2f}s] partial: {text}")
+
+    utterance = stt.listen(wav_frames(path, realtime=realtime), timeout=30, on_partial=on_partial)
+    if utterance is None:
+        print("  No speech detected")
+        return None
+    endpoint_ms = (utterance.endpoint_s - utterance.speech_end_s) * 1000.0
+    print(f"  final: {utterance.text}")
+    print(f"  speech {utterance.speech_start_s:.2f}s-{utterance.speech_end_s:.2f}s, "
+          f"endpoint after {endpoint_ms:.0f} ms of silence, final +{utterance.final_ms:.0f} ms "
+          f"=> {endpoint_ms + utterance.final_ms:.0f} ms after end of speech ({utterance.partials} partials)")
+
+    expected_path = os.path.splitext(path)[0] + ".txt"
+    wer = None
+    if os.path.exists(expected_path):
+        with open(expected_path, "r", encoding="utf-8") as f:
+            wer = word_error_rate(f.read(), utterance.text)
+        print(f"  WER: {wer:.2%}")
+    return endpoint_ms + utterance.final_ms, wer
+
+
+def main():
+    config = load_settings("stt", DEFAULT_STT_SETTINGS)
+    parser = argparse.ArgumentParser(description="Feed WAV files through the streaming STT")
+    parser.add_argument("wavs", nargs="+")
+    parser.add_argument("--realtime", action="store_true", help="Pace frames like a live microphone")
+    parser.add_argument("--model", default=config["model"])
+    parser.add_argument("--endpoint-ms", type=int, default=config["endpoint_ms"])
+    args = parser.parse_args()
+    config.update(model=args.model, endpoint_ms=args.endpoint_ms)
+
+    try:
+        stt = StreamingSTT(config)
+    except ImportError:
+        print("[ERROR] faster-whisper is not installed (pip install faster-whisper)")
+        sys.exit(1)
+
+    results = [r for r in (run_file(stt, path, args.realtime) for path in args.wavs) if r is not None]
+    if results:
+        latencies = sorted(r[0] for r in results)
+        wers = [r[1] for r in results if r[1] is not None]
+        print("\n--------------------------------------------------")
+        print(f"Files: {len(args.wavs)}, phrases: {len(results)}")
+        print(f"End of speech -> final: p50 {latencies[len(latencies) // 2]:.0f} ms, max {latencies[-1]:.0f} ms")
+        if wers:
+            print(f"Mean WER: {sum(wers) / len(wers):.2%}")
+        print(f"Stats: {stt.stats()}")
+
+
+if __name__ == "__main__":
+    main()
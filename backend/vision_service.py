@@ -5,9 +5,10 @@ import os
 import numpy as np
 from collections import Counter # <-- NEW: For calculating the majority vote
 from modules.ad_engine.selector import AdSelector
+from modules.resources import get_resources
 
 class AdorixVision:
-    def __init__(self, broadcast_callback):
+    def __init__(self, broadcast_callback, transcoder=None):
         self.broadcast = broadcast_callback
         self.last_analysis = 0
         self.is_analyzing = False
@@ -16,11 +17,16 @@ class AdorixVision:
         current_dir = os.path.dirname(os.path.abspath(__file__))
         rules_path = os.path.join(current_dir, "modules", "ad_engine", "rules.json")
         ads_dir = os.path.join(current_dir, "ads") # Or wherever your ads are stored
-        self.selector = AdSelector(rules_path, ads_dir)
+        self.selector = AdSelector(rules_path, ads_dir, transcoder=transcoder)
         
         # --- NEW: BUFFER STATE VARIABLES ---
         self.detection_buffer = []      # Holds all predictions made in the 2-second window
         self.buffer_start_time = None   # Tracks when the timer started
+
+        # --- PREFETCH HINTS: tell the frontend about a provisional winner early ---
+        self.PREFETCH_MIN_SAMPLES = 2   # Predictions needed before a leader is trusted
+        self.PREFETCH_MIN_SHARE = 0.6   # Leader's share of the buffer votes
+        self.hinted_demographic = None  # Last leader we sent a hint for (one hint per leader)
         
         # Load Models
         current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -141,6 +147,23 @@ class AdorixVision:
         finally: 
             self.is_analyzing = False
 
+    def maybe_hint_prefetch(self):
+        """Sends a low-priority PREFETCH hint as soon as a provisional leader emerges in the buffer."""
+        votes = list(self.detection_buffer)
+        if len(votes) < self.PREFETCH_MIN_SAMPLES:
+            return
+        leader, count = Counter(votes).most_common(1)[0]
+        if count / len(votes) < self.PREFETCH_MIN_SHARE or leader == self.hinted_demographic:
+            return
+        self.hinted_demographic = leader
+        ad_name = self.selector.get_personalized_ad(leader)
+        print(f"[PREFETCH] Provisional leader: {leader} -> {ad_name}")
+        self.broadcast({
+            "type": "PREFETCH",
+            "ad_url": ad_name,
+            "demographics": [leader]
+        })
+
     def start(self):
         print("[VISION] Starting camera capture...")
         cap = cv2.VideoCapture(0)
@@ -165,7 +188,11 @@ class AdorixVision:
                             
                         # 2. COLLECT DATA (Fire thread continuously without blocking)
                         if not self.is_analyzing:
-                            threading.Thread(target=self.analyze, args=(frame.copy(),), daemon=True).start()
+                            threading.Thread(target=get_resources().run, args=("vision", self.analyze, frame.copy()),
+                                             daemon=True).start()
+
+                        # 2b. EARLY HINT (lets the frontend start buffering before the vote closes)
+                        self.maybe_hint_prefetch()
                             
                         # 3. THE 2-SECOND EVALUATION
                         if time.time() - self.buffer_start_time >= 2.0:
@@ -194,6 +221,7 @@ class AdorixVision:
                         # No one is in the frame -> Wipe the buffer
                         self.buffer_start_time = None
                         self.detection_buffer = []
+                        self.hinted_demographic = None
                         
                         # Revert to generic Loop Mode (Rate limited)
                         if time.time() - self.last_analysis > 1.0:
@@ -1,5 +1,6 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { useSocket } from './hooks/useSocket';
+import { useAdManifest } from './hooks/useAdManifest';
 import { AVATAR_STATES } from './avatar/avatarStates';
 import LoopView from './views/LoopView';
 import PersonalizedView from './views/PersonalizedView';
@@ -9,28 +10,71 @@ export default function App() {
   const [systemId, setSystemId] = useState(1);
   const [activeAd, setActiveAd] = useState('10-15_female.mp4');
   const [avatarState, setAvatarState] = useState(AVATAR_STATES.HIDDEN);
+  const [subtitle, setSubtitle] = useState('');
+  const [prefetchAds, setPrefetchAds] = useState([]);
+  const [engines, setEngines] = useState({});
+  const prefetchStartRef = useRef({});
   const { lastMessage, sendJsonMessage } = useSocket('ws://localhost:8001/ws');
+  const [contentVersion, setContentVersion] = useState(0);
+  const adSrc = useAdManifest(contentVersion);
 
   useEffect(() => {
     if (lastMessage) {
+      // PREFETCH hints are low priority: start buffering the likely ad, change nothing else
+      if (lastMessage.type === 'PREFETCH') {
+        const ad = lastMessage.ad_url;
+        if (ad && !prefetchStartRef.current[ad]) {
+          prefetchStartRef.current[ad] = performance.now();
+          setPrefetchAds((prev) => [ad, ...prev.filter((a) => a !== ad)].slice(0, 2));
+        }
+        return;
+      }
+      // A content sync swapped in new ads: re-read the manifest for their new URLs
+      if (lastMessage.type === 'CONTENT_UPDATED') {
+        setContentVersion((v) => v + 1);
+        return;
+      }
+      // Backend engines load in the background after startup
+      if (lastMessage.type === 'ENGINE_STATUS') {
+        setEngines(lastMessage.engines || {});
+        return;
+      }
       if (lastMessage.system_id) setSystemId(lastMessage.system_id);
       if (lastMessage.ad_url) setActiveAd(lastMessage.ad_url);
       if (lastMessage.avatar_state) setAvatarState(lastMessage.avatar_state);
+      // Answers stream in: each update carries the full text spoken so far
+      if (lastMessage.subtitle !== undefined) setSubtitle(lastMessage.subtitle);
     }
   }, [lastMessage]);
 
+  const handlePrefetchReady = (ad) => {
+    const started = prefetchStartRef.current[ad];
+    if (started === undefined) return;
+    delete prefetchStartRef.current[ad];
+    sendJsonMessage({ type: 'PREFETCH_READY', ad_url: ad, buffer_ms: Math.round(performance.now() - started) });
+  };
+
+  const warming = Object.entries(engines).filter(([, e]) => e.state !== 'ready');
+
   return (
     <div className="w-screen h-screen bg-black overflow-hidden relative">
+      {/* Small status badge while the assistant is still loading (or an engine failed) */}
+      {warming.length > 0 && (
+        <div className="absolute top-4 right-4 z-50 px-3 py-1 rounded-full bg-black/60 text-white/80 text-xs font-mono">
+          {warming.map(([name, e]) => `${name}: ${e.state}`).join(' · ')}
+        </div>
+      )}
+
       {/* 1. Dynamic Stage Rendering */}
       {systemId === 1 && <LoopView />}
       {systemId === 2 && (
         <PersonalizedView 
-            systemState={{ ad: activeAd }} 
+            systemState={{ ad: activeAd, src: adSrc(activeAd) }} 
             isConnected={!!lastMessage} 
             sendJsonMessage={sendJsonMessage}
         />
       )}
-      {systemId === 3 && <InteractionView adUrl={activeAd} avatarState={avatarState} />}
+      {systemId === 3 && <InteractionView adUrl={activeAd} adSrc={adSrc(activeAd)} avatarState={avatarState} subtitle={subtitle} />}
 
       {/* 2. PRELOADING ENGINE: Forces browser to cache all .webm and .mp4 assets */}
       <div className="hidden opacity-0 pointer-events-none absolute -z-50">
@@ -39,6 +83,9 @@ export default function App() {
         <video src="/avatar/talking.webm" preload="auto" muted />
         <video src="/ads/10-15_female.mp4" preload="auto" muted />
         {/* Add all other critical ads here to prevent lag */}
+        {prefetchAds.map((ad) => (
+          <video key={ad} src={adSrc(ad)} preload="auto" muted onCanPlayThrough={() => handlePrefetchReady(ad)} />
+        ))}
       </div>
     </div>
   );
@@ -0,0 +1,24 @@
+import { useCallback, useEffect, useState } from 'react';
+
+const BACKEND_URL = 'http://localhost:8001';
+
+// Resolves ad filenames to content-hashed backend URLs. Hashed URLs are served
+// with immutable cache headers, so each clip is downloaded once per version.
+// Ads missing from the manifest fall back to the frontend's own /ads copy.
+export const useAdManifest = (refreshKey = 0) => {
+  const [urls, setUrls] = useState({});
+
+  useEffect(() => {
+    let cancelled = false;
+    fetch(`${BACKEND_URL}/ads/manifest`, { cache: 'no-cache' })
+      .then((res) => (res.ok ? res.json() : null))
+      .then((data) => {
+        if (cancelled || !data) return;
+        setUrls(Object.fromEntries(data.ads.map((ad) => [ad.name, `${BACKEND_URL}${ad.url}`])));
+      })
+      .catch((err) => console.warn('[Manifest] Falling back to static ads:', err));
+    return () => { cancelled = true; };
+  }, [refreshKey]);
+
+  return useCallback((name) => (name ? urls[name] || `/ads/${name}` : ''), [urls]);
+};
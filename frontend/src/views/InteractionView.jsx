@@ -3,7 +3,7 @@ import AvatarOverlay from '../avatar/AvatarOverlay';
 import { Mic } from 'lucide-react';
 import { AVATAR_STATES } from '../avatar/avatarStates';
 
-export default function InteractionView({ adUrl, avatarState, setAvatarState }) {
+export default function InteractionView({ adUrl, adSrc, avatarState, setAvatarState, subtitle }) {
   // Determine if the AI is actively listening to the user
   // (If she is IDLE, it means she is waiting for the user to speak)
   const isListening = avatarState === AVATAR_STATES.IDLE;
@@ -18,7 +18,7 @@ export default function InteractionView({ adUrl, avatarState, setAvatarState })
         // We continue playing the targeted ad, but we blur and dim it 
         // so the user's focus shifts entirely to the Avatar.
         className="absolute inset-0 w-full h-full object-cover opacity-30 blur-sm transition-all duration-1000 ease-in-out" 
-        src={`/ads/${adUrl}`} 
+        src={adSrc || `/ads/${adUrl}`} 
         autoPlay 
         loop 
         muted 
@@ -42,7 +42,17 @@ export default function InteractionView({ adUrl, avatarState, setAvatarState })
       </div>
 
       {/* ========================================== */}
-      {/* 3. THE 2D AVATAR OVERLAY */}
+      {/* 3. LIVE SUBTITLES */}
+      {/* ========================================== */}
+      {/* The answer text grows as the backend streams it, ahead of the speech */}
+      <div className={`absolute bottom-[42%] left-1/2 -translate-x-1/2 w-[85%] z-40 transition-opacity duration-300 ${subtitle ? 'opacity-100' : 'opacity-0'}`}>
+        <p className="text-white text-2xl font-medium text-center leading-relaxed bg-black/50 rounded-2xl px-6 py-4 backdrop-blur-sm">
+          {subtitle}
+        </p>
+      </div>
+
+      {/* ========================================== */}
+      {/* 4. THE 2D AVATAR OVERLAY */}
       {/* ========================================== */}
       {/* We pass the avatarState down so the Avatar overlay knows which preloaded video to play */}
       <div className="relative z-50 w-full flex justify-center pb-0">
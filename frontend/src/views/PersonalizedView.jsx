@@ -37,7 +37,7 @@ export default function PersonalizedView({ systemState, isConnected, sendJsonMes
 
       {/* Renders the ad and triggers the next one in the playlist when finished */}
       <AdPlayer
-        src={systemState.ad ? `/ads/${systemState.ad}` : ""}
+        src={systemState.src || (systemState.ad ? `/ads/${systemState.ad}` : "")}
         show={true}
         onEnded={handleAdEnd}
       />